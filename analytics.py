@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Sequence
+
+from database import Database
+
+OFFER_GROUPS = ('property_type', 'city', 'realtor_id')
+CLOSE_TIME_GROUPS = ('month', 'property_type', 'realtor_id')
+
+
+class Analytics:
+    # Все отчеты читают сводные таблицы rollup_*, которые поддерживаются триггерами
+    # при каждой записи, поэтому время построения зависит от числа групп, а не строк.
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def _group_columns(group_by: Sequence[str], allowed: Sequence[str]) -> List[str]:
+        columns = list(group_by)
+        for column in columns:
+            if column not in allowed:
+                raise ValueError(f"Группировка по {column} не поддерживается, допустимо: {', '.join(allowed)}")
+        return columns
+
+    @staticmethod
+    def _select_groups(columns: List[str]) -> str:
+        return "".join(f"{column}, " for column in columns)
+
+    @staticmethod
+    def _group_clause(columns: List[str]) -> str:
+        return f"GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ""
+
+    def rebuild(self):
+        self.db.rebuild_rollups()
+
+    def deals_per_realtor_month(self, month_from: Optional[str] = None, month_to: Optional[str] = None,
+                                realtor_id: Optional[int] = None) -> List[Dict]:
+        conditions, params = [], []
+        if month_from:
+            conditions.append("rm.month >= ?")
+            params.append(month_from)
+        if month_to:
+            conditions.append("rm.month <= ?")
+            params.append(month_to)
+        if realtor_id is not None:
+            conditions.append("rm.realtor_id = ?")
+            params.append(realtor_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"""
+            SELECT rm.realtor_id,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   rm.month,
+                   SUM(CASE WHEN rm.side = 'seller' THEN rm.deals_count ELSE 0 END) as seller_deals,
+                   SUM(CASE WHEN rm.side = 'buyer' THEN rm.deals_count ELSE 0 END) as buyer_deals,
+                   SUM(rm.deals_count) as deals_count,
+                   ROUND(SUM(rm.payout_sum), 2) as payout
+            FROM rollup_realtor_month rm
+            LEFT JOIN realtors r ON r.id = rm.realtor_id
+            {where}
+            GROUP BY rm.realtor_id, rm.month
+            HAVING SUM(rm.deals_count) > 0
+            ORDER BY rm.month, rm.realtor_id
+        """, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def average_rent(self, group_by: Sequence[str] = ('city', 'property_type')) -> List[Dict]:
+        columns = self._group_columns(group_by, OFFER_GROUPS)
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"""
+            SELECT {self._select_groups(columns)}
+                   SUM(offers_count) as offers_count,
+                   ROUND(CAST(SUM(price_sum) AS REAL) / SUM(offers_count), 2) as average_price
+            FROM rollup_offer_stats
+            WHERE offers_count > 0
+            {self._group_clause(columns)}
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def conversion(self, group_by: Sequence[str] = ('property_type',)) -> List[Dict]:
+        columns = self._group_columns(group_by, OFFER_GROUPS)
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"""
+            SELECT {self._select_groups(columns)}
+                   SUM(offers_count) as offers_count,
+                   SUM(deals_count) as deals_count,
+                   ROUND(CAST(SUM(deals_count) AS REAL) / SUM(offers_count), 4) as conversion
+            FROM rollup_offer_stats
+            WHERE offers_count > 0
+            {self._group_clause(columns)}
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def time_to_close(self, group_by: Sequence[str] = ('month',)) -> List[Dict]:
+        # Сторона продавца — дни от размещения предложения до сделки,
+        # сторона покупателя — дни от регистрации потребности до сделки
+        columns = self._group_columns(group_by, CLOSE_TIME_GROUPS)
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"""
+            SELECT {self._select_groups(columns)}
+                   SUM(CASE WHEN side = 'seller' THEN deals_count ELSE 0 END) as seller_deals,
+                   SUM(CASE WHEN side = 'buyer' THEN deals_count ELSE 0 END) as buyer_deals,
+                   ROUND(SUM(CASE WHEN side = 'seller' THEN close_days_sum ELSE 0 END) /
+                         NULLIF(SUM(CASE WHEN side = 'seller' THEN close_days_count ELSE 0 END), 0), 2)
+                       as offer_days_to_close,
+                   ROUND(SUM(CASE WHEN side = 'buyer' THEN close_days_sum ELSE 0 END) /
+                         NULLIF(SUM(CASE WHEN side = 'buyer' THEN close_days_count ELSE 0 END), 0), 2)
+                       as demand_days_to_close
+            FROM rollup_realtor_month
+            {self._group_clause(columns)}
+        """)
+        return [dict(row) for row in cursor.fetchall() if row['seller_deals'] or row['buyer_deals']]
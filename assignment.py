@@ -0,0 +1,240 @@
+import heapq
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from commission_calculator import CommissionCalculator
+from database import BulkResult, Database
+
+OBJECTIVES = ('commission', 'count')
+
+# Двудольный граф совместимости в сжатом виде (CSR): вершины слева — предложения,
+# справа — потребности; соседи предложения u — targets[offsets[u]:offsets[u + 1]]
+Graph = Tuple[List[int], List[int], List[int], List[int]]
+
+
+def build_graph(pairs: Iterable[Tuple[int, int]]) -> Graph:
+    """Граф из пар (offer_id, demand_id), упорядоченных по offer_id.
+
+    Возвращает id предложений, id потребностей (индексы вершин — позиции в этих
+    списках), offsets и targets.
+    """
+    offer_ids: List[int] = []
+    demand_ids: List[int] = []
+    demand_index: Dict[int, int] = {}
+    offsets = [0]
+    targets: List[int] = []
+    for offer_id, demand_id in pairs:
+        if not offer_ids or offer_ids[-1] != offer_id:
+            if offer_ids:
+                offsets.append(len(targets))
+            offer_ids.append(offer_id)
+        v = demand_index.get(demand_id)
+        if v is None:
+            v = demand_index[demand_id] = len(demand_ids)
+            demand_ids.append(demand_id)
+        targets.append(v)
+    if offer_ids:
+        offsets.append(len(targets))
+    return offer_ids, demand_ids, offsets, targets
+
+
+def _greedy_start(offsets: List[int], targets: List[int], order: Iterable[int],
+                  match_left: List[int], match_right: List[int]):
+    # Начальное паросочетание: предложение берет первую свободную потребность
+    for u in order:
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            if match_right[v] < 0:
+                match_left[u] = v
+                match_right[v] = u
+                break
+
+
+def hopcroft_karp(offsets: List[int], targets: List[int], right_count: int) -> List[int]:
+    """Паросочетание наибольшего размера (Хопкрофт — Карп), O(E * sqrt(V)).
+
+    Возвращает для каждого предложения индекс потребности или -1. Обход в глубину
+    итеративный, поэтому длина увеличивающих путей не ограничена глубиной рекурсии.
+    """
+    left_count = len(offsets) - 1
+    match_left = [-1] * left_count
+    match_right = [-1] * right_count
+    _greedy_start(offsets, targets, range(left_count), match_left, match_right)
+    unreached = left_count + 1
+
+    while True:
+        # Поиск в ширину: слои предложений по длине чередующегося пути от свободных
+        free = [u for u in range(left_count) if match_left[u] < 0]
+        dist = [unreached] * left_count
+        for u in free:
+            dist[u] = 0
+        queue = list(free)
+        found = False
+        for u in queue:
+            for k in range(offsets[u], offsets[u + 1]):
+                w = match_right[targets[k]]
+                if w < 0:
+                    found = True
+                elif dist[w] == unreached:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            return match_left
+
+        # Обход в глубину по слоям: непересекающиеся увеличивающие пути за одну фазу
+        pointer = offsets[:-1]
+        for root in free:
+            stack = [root]
+            while stack:
+                u = stack[-1]
+                end = offsets[u + 1]
+                while pointer[u] < end:
+                    w = match_right[targets[pointer[u]]]
+                    if w < 0:
+                        for x in stack:
+                            v = targets[pointer[x]]
+                            match_left[x] = v
+                            match_right[v] = x
+                            dist[x] = unreached
+                        stack = []
+                        break
+                    if dist[w] == dist[u] + 1:
+                        stack.append(w)
+                        break
+                    pointer[u] += 1
+                else:
+                    dist[u] = unreached
+                    stack.pop()
+                    if stack:
+                        pointer[stack[-1]] += 1
+
+
+def max_weight_matching(offsets: List[int], targets: List[int], right_count: int,
+                        weights: Sequence[float]) -> List[int]:
+    """Паросочетание наибольшего веса при положительных весах на предложениях.
+
+    Множества предложений, которые можно покрыть паросочетанием, образуют
+    трансверсальный матроид, поэтому оптимум — база наибольшего веса; при
+    положительных весах она же имеет наибольший размер. База строится алгоритмом
+    Хопкрофта — Карпа, затем улучшается обменами: свободные предложения по убыванию
+    веса ищут чередующимся путем покрытое предложение меньшего веса и занимают его
+    место (вытесненное снова становится свободным). База оптимальна, когда обменов
+    не осталось — это критерий оптимальности базы матроида.
+    """
+    match_left = hopcroft_karp(offsets, targets, right_count)
+    match_right = [-1] * right_count
+    for u, v in enumerate(match_left):
+        if v >= 0:
+            match_right[v] = u
+    free = [(-weights[u], u) for u, v in enumerate(match_left) if v < 0]
+    heapq.heapify(free)
+    # Потребности из неудачного поиска помечаются навсегда: все покрытые предложения,
+    # достижимые через них, не легче текущего, а следующие свободные предложения не
+    # тяжелее — и обменный путь через эти потребности не проходит
+    dead = [False] * right_count
+    visited = [0] * right_count
+    stamp = 0
+    while free:
+        weight, root = heapq.heappop(free)
+        weight = -weight
+        stamp += 1
+        # Поиск в ширину: покрытое предложение -> (предыдущее предложение, потребность между ними)
+        parent: Dict[int, Tuple[int, int]] = {}
+        queue = [root]
+        seen = []
+        lighter = -1
+        for u in queue:
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                if dead[v] or visited[v] == stamp:
+                    continue
+                visited[v] = stamp
+                seen.append(v)
+                # Паросочетание наибольшее, поэтому достижимая потребность всегда занята
+                w = match_right[v]
+                parent[w] = (u, v)
+                if weights[w] < weight:
+                    lighter = w
+                    break
+                queue.append(w)
+            if lighter >= 0:
+                break
+        if lighter < 0:
+            for v in seen:
+                dead[v] = True
+            continue
+        match_left[lighter] = -1
+        u = lighter
+        while u != root:
+            u, v = parent[u]
+            match_left[u] = v
+            match_right[v] = u
+        heapq.heappush(free, (-weights[lighter], lighter))
+    return match_left
+
+
+class DealAssignment:
+    # Подбор пакета сделок по таблице matches: каждое предложение и каждая потребность
+    # входят не более чем в одну сделку (UNIQUE в deals), поэтому нужен не жадный выбор
+    # пар, а паросочетание в двудольном графе совместимости.
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def load_graph(self) -> Tuple[Graph, Dict[int, Tuple[str, int]]]:
+        # Пары совместимости открытых предложений и потребностей и тип/цена предложений
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            SELECT m.offer_id, m.demand_id, p.type, o.price
+            FROM matches m
+            JOIN offers o ON o.id = m.offer_id
+            JOIN properties p ON p.id = o.property_id
+            WHERE NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = m.offer_id)
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = m.demand_id)
+            ORDER BY m.offer_id, m.demand_id
+        """)
+        offers: Dict[int, Tuple[str, int]] = {}
+
+        def pairs():
+            for offer_id, demand_id, property_type, price in cursor:
+                offers[offer_id] = (property_type, price)
+                yield offer_id, demand_id
+
+        return build_graph(pairs()), offers
+
+    @staticmethod
+    def deal_commission(property_type: str, price: float) -> float:
+        # Комиссия агентства с обеих сторон сделки зависит только от предложения
+        return round(CommissionCalculator.calculate_commission_for_seller(property_type, price)
+                     + CommissionCalculator.calculate_commission_for_buyer(price), 2)
+
+    def propose(self, objective: str = 'commission', rebuild: bool = False) -> List[Dict]:
+        """Предлагаемые сделки: наибольшая суммарная комиссия или наибольшее число сделок.
+
+        rebuild — сначала пересчитать таблицу matches (rebuild_matches).
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Цель подбора {objective} не поддерживается, допустимо: {', '.join(OBJECTIVES)}")
+        if rebuild:
+            self.db.rebuild_matches()
+        (offer_ids, demand_ids, offsets, targets), offers = self.load_graph()
+        if not offer_ids:
+            return []
+        commissions = [self.deal_commission(*offers[offer_id]) for offer_id in offer_ids]
+        if objective == 'commission':
+            match_left = max_weight_matching(offsets, targets, len(demand_ids), commissions)
+        else:
+            match_left = hopcroft_karp(offsets, targets, len(demand_ids))
+        return [
+            {
+                'demand_id': demand_ids[v],
+                'offer_id': offer_id,
+                'property_type': offers[offer_id][0],
+                'price': offers[offer_id][1],
+                'commission': commission,
+            }
+            for offer_id, v, commission in zip(offer_ids, match_left, commissions) if v >= 0
+        ]
+
+    def apply(self, proposals: Iterable[Dict], commit: bool = True) -> BulkResult:
+        return self.db.add_deals_bulk(proposals, commit)
+
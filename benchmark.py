@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from database import Database
+
+LEGACY_PROFILE = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+    'foreign_keys': False,
+}
+
+TUNED_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'foreign_keys': True,
+}
+
+PROFILES = {'legacy': LEGACY_PROFILE, 'tuned': TUNED_PROFILE}
+
+# Регрессионный порог времени до первого окна на базе из STARTUP_ROWS предложений
+STARTUP_ROWS = 1_000_000
+STARTUP_TARGET_SECONDS = 1.5
+
+
+def benchmark_profile(profile: Dict, rows: int, directory: str, name: str = 'bench',
+                      list_repeats: int = 3) -> Dict[str, float]:
+    path = os.path.join(directory, f"{name}.db")
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db = Database(path, **profile)
+    try:
+        realtor_id = db.add_realtor('Бенчмарков', 'Тест', 'Тестович')
+        client_id = db.add_client('Клиентов', 'Тест', None, '+70000000000', None)
+
+        start = time.perf_counter()
+        for i in range(rows):
+            property_id = db.add_property('apartment', city='Москва', street=f"Улица {i % 100}",
+                                          house_number=str(i % 50 + 1), floor=i % 20 + 1,
+                                          rooms=i % 4 + 1, area=30.0 + i % 70)
+            db.add_offer(client_id, realtor_id, property_id, 20000 + (i % 50) * 1000, 6 + i % 12)
+        insert_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        listed = 0
+        for _ in range(list_repeats):
+            listed += len(db.get_properties())
+            listed += len(db.get_offers())
+        list_seconds = time.perf_counter() - start
+    finally:
+        db.close()
+
+    return {
+        'rows': rows,
+        'insert_seconds': insert_seconds,
+        'insert_rows_per_sec': (rows * 2) / insert_seconds if insert_seconds else 0.0,
+        'list_seconds': list_seconds,
+        'list_rows_per_sec': listed / list_seconds if list_seconds else 0.0,
+    }
+
+
+def run_connection_benchmark(rows: int = 2000, directory: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        for name, profile in PROFILES.items():
+            results[name] = benchmark_profile(profile, rows, tmp_dir, name)
+    return results
+
+
+def format_results(results: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'Профиль':<10} {'Вставка, строк/с':>18} {'Чтение, строк/с':>18}"]
+    for name, result in results.items():
+        lines.append(f"{name:<10} {result['insert_rows_per_sec']:>18.0f} {result['list_rows_per_sec']:>18.0f}")
+    if 'legacy' in results and 'tuned' in results and results['legacy']['insert_rows_per_sec']:
+        speedup = results['tuned']['insert_rows_per_sec'] / results['legacy']['insert_rows_per_sec']
+        lines.append(f"Ускорение вставки: x{speedup:.1f}")
+    return "\n".join(lines)
+
+
+def build_startup_database(path: str, rows: int = STARTUP_ROWS, chunk_size: int = 50000) -> int:
+    # Объекты и предложения добавляются пакетами; уже заполненная база дополняется до rows
+    db = Database(path)
+    try:
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM offers")
+        existing = cursor.fetchone()[0]
+        if existing >= rows:
+            return existing
+        cursor.execute("SELECT id FROM realtors")
+        realtor_ids = [row[0] for row in cursor.fetchall()]
+        for i in range(len(realtor_ids), 100):
+            realtor_ids.append(db.add_realtor('Бенчмарков', f"Риэлтор {i}", 'Тестович'))
+        cursor.execute("SELECT id FROM clients")
+        client_ids = [row[0] for row in cursor.fetchall()]
+        for i in range(len(client_ids), 1000):
+            client_ids.append(db.add_client('Клиентов', f"Клиент {i}", None, f"+7{i:010d}", None))
+
+        for start in range(existing, rows, chunk_size):
+            numbers = range(start, min(start + chunk_size, rows))
+            property_ids, _ = db.add_properties_bulk(
+                {'property_type': 'apartment', 'city': 'Москва', 'street': f"Улица {i % 100}",
+                 'house_number': str(i % 50 + 1), 'floor': i % 20 + 1, 'rooms': i % 4 + 1,
+                 'area': 30.0 + i % 70}
+                for i in numbers)
+            db.add_offers_bulk(
+                {'client_id': client_ids[i % len(client_ids)], 'realtor_id': realtor_ids[i % len(realtor_ids)],
+                 'property_id': property_id, 'price': 20000 + (i % 50) * 1000, 'rental_period': 6 + i % 12}
+                for i, property_id in zip(numbers, property_ids))
+        return rows
+    finally:
+        db.close()
+
+
+def measure_startup(db_path: str, runs: int = 3, timeout: float = 120.0) -> Dict[str, float]:
+    # Каждый запуск — отдельный процесс, чтобы учитывалось время импорта модулей.
+    # process — полное время процесса от запуска интерпретатора до выхода.
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    reports: List[Dict[str, float]] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, main_path, '--db', db_path, '--startup-report', 'json', '--quit-after-startup'],
+            env=env, capture_output=True, text=True, timeout=timeout)
+        elapsed = time.perf_counter() - started
+        lines = [line for line in completed.stderr.splitlines() if line.startswith('{')]
+        if completed.returncode != 0 or not lines:
+            raise RuntimeError(f"Приложение завершилось с кодом {completed.returncode}: {completed.stderr.strip()}")
+        report = json.loads(lines[-1])
+        report['process'] = elapsed
+        reports.append(report)
+    return {key: statistics.median(report[key] for report in reports) for key in reports[0]}
+
+
+def run_startup_benchmark(rows: int = STARTUP_ROWS, db_path: Optional[str] = None, runs: int = 3,
+                          target_seconds: float = STARTUP_TARGET_SECONDS,
+                          directory: Optional[str] = None) -> Dict[str, float]:
+    # db_path позволяет переиспользовать сгенерированную базу между запусками
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        path = db_path or os.path.join(tmp_dir, 'startup.db')
+        build_startup_database(path, rows)
+        result = measure_startup(path, runs)
+    result['rows'] = rows
+    result['target_seconds'] = target_seconds
+    result['passed'] = result['time_to_first_window'] <= target_seconds
+    return result
+
+
+def format_startup_results(result: Dict[str, float]) -> str:
+    from startup import format_startup_report
+
+    lines = [f"Запуск на базе из {result['rows']} предложений (медиана)", format_startup_report(result),
+             f"{'Процесс целиком':<28} {result['process'] * 1000:>10.1f}",
+             f"Цель: до первого окна не более {result['target_seconds'] * 1000:.0f} мс — "
+             f"{'выполнено' if result['passed'] else 'ПРЕВЫШЕНО'}"]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение профилей подключения SQLite")
+    parser.add_argument('--rows', type=int, default=None,
+                        help=f"Количество объектов и предложений (по умолчанию 2000, для --startup {STARTUP_ROWS})")
+    parser.add_argument('--dir', default=None, help="Каталог для временных баз данных")
+    parser.add_argument('--startup', action='store_true', help="Замерить время запуска приложения")
+    parser.add_argument('--startup-db', default=None, help="База для замера запуска (создается и дополняется)")
+    parser.add_argument('--runs', type=int, default=3, help="Количество запусков приложения")
+    parser.add_argument('--target', type=float, default=STARTUP_TARGET_SECONDS,
+                        help="Допустимое время до первого окна, с")
+    args = parser.parse_args(argv)
+    if args.startup:
+        result = run_startup_benchmark(args.rows or STARTUP_ROWS, args.startup_db, args.runs, args.target, args.dir)
+        print(format_startup_results(result))
+        return 0 if result['passed'] else 1
+    print(format_results(run_connection_benchmark(args.rows or 2000, args.dir)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import sys
+
+
+def print_progress(stats):
+    print(f"\r{stats['kind']}: строк {stats['skipped'] + stats['rows']}, добавлено {stats['inserted']}, "
+          f"ошибок {stats['errors']}, {stats['rows_per_sec']:.0f} строк/с", end='', file=sys.stderr, flush=True)
+
+
+def cmd_import(args, db):
+    from importer import DataImporter
+
+    importer = DataImporter(db, chunk_size=args.chunk_size, progress=None if args.quiet else print_progress)
+    stats = importer.import_file(args.kind, args.path, resume=not args.restart, errors_path=args.errors)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Импорт {stats['kind']}: обработано {stats['rows']} строк (пропущено ранее импортированных: "
+          f"{stats['skipped']}), добавлено {stats['inserted']}, ошибок {stats['errors']}, "
+          f"{stats['seconds']:.1f} с, {stats['rows_per_sec']:.0f} строк/с")
+    return 1 if stats['errors'] and args.strict else 0
+
+
+def cmd_export(args, db):
+    from exporter import export
+
+    count = export(db, args.name, args.path, args.format, args.batch_size)
+    print(f"Экспорт {args.name}: {count} строк -> {args.path}")
+    return 0
+
+
+def cmd_match(args, db):
+    if args.rebuild:
+        count = db.rebuild_matches()
+        print(f"Совпадений после пересчета: {count}")
+    if args.demand is not None:
+        if not db.get_demand(args.demand):
+            print(f"Потребность {args.demand} не найдена", file=sys.stderr)
+            return 1
+        if args.ranked:
+            from database import MATCH_SCORE_LIMIT, RANKED_OFFERS_LIMIT
+            offers = db.get_ranked_offers(args.demand, args.limit or RANKED_OFFERS_LIMIT,
+                                          MATCH_SCORE_LIMIT if args.max_score is None else args.max_score)
+        else:
+            offers = db.get_matched_offers(args.demand)
+        for offer in offers:
+            score = f", отклонение {offer['score']:.2f}" if args.ranked else ""
+            print(f"Предложение #{offer['id']}: {offer['property_type']}, цена {offer['price']}, "
+                  f"срок {offer['rental_period']} мес., риэлтор {offer['realtor_name'].strip()}{score}")
+        print(f"Подходящих предложений: {len(offers)}")
+    elif args.offer is not None:
+        if not db.get_offer(args.offer):
+            print(f"Предложение {args.offer} не найдено", file=sys.stderr)
+            return 1
+        demands = db.get_matching_demands(args.offer)
+        for demand in demands:
+            print(f"Потребность #{demand['id']}: {demand['property_type']}, цена {demand['min_price']}-"
+                  f"{demand['max_price']}, клиент {(demand['client_name'] or '').strip()}")
+        print(f"Подходящих потребностей: {len(demands)}")
+    elif not args.rebuild:
+        matches = db.get_matches()
+        for match in matches:
+            print(f"{match['demand_id']}\t{match['offer_id']}")
+        print(f"Совпадений: {len(matches)}", file=sys.stderr)
+    return 0
+
+
+def cmd_assign(args, db):
+    from assignment import DealAssignment
+
+    assignment = DealAssignment(db)
+    proposals = assignment.propose(args.objective, args.rebuild)
+    for proposal in proposals:
+        print(f"{proposal['demand_id']}\t{proposal['offer_id']}\t{proposal['commission']:.2f}")
+    total = sum(proposal['commission'] for proposal in proposals)
+    print(f"Предложено сделок: {len(proposals)}, комиссия {total:.2f}", file=sys.stderr)
+    if args.apply:
+        ids, errors = assignment.apply(proposals)
+        for index, message in errors:
+            print(f"{proposals[index]['demand_id']}\t{proposals[index]['offer_id']}\t{message}", file=sys.stderr)
+        print(f"Создано сделок: {len(ids) - len(errors)}", file=sys.stderr)
+        return 1 if errors else 0
+    return 0
+
+
+def cmd_near(args, db):
+    properties = db.find_properties_near(args.lat, args.lon, args.radius, args.type, args.limit)
+    for prop in properties:
+        address = ", ".join(part for part in (prop['city'], prop['street'], prop['house_number']) if part)
+        print(f"Объект #{prop['id']}: {prop['type']}, {address or 'адрес не указан'}, "
+              f"{prop['distance_km']:.2f} км")
+    print(f"Найдено объектов: {len(properties)}")
+    return 0
+
+
+def cmd_commission(args, db):
+    if args.deals:
+        from exporter import iter_export
+
+        columns, rows = iter_export(db, 'deal_commissions')
+        for row in rows:
+            deal = dict(zip(columns, row))
+            if args.realtor is not None and args.realtor not in (deal['seller_realtor_id'], deal['buyer_realtor_id']):
+                continue
+            if (args.date_from and deal['created_at'] < args.date_from) or \
+                    (args.date_to and deal['created_at'] >= args.date_to):
+                continue
+            print(f"Сделка #{deal['deal_id']}: {deal['property_type']}, цена {deal['price']}, "
+                  f"продавцу {deal['seller_commission']:.2f}, покупателю {deal['buyer_commission']:.2f}, "
+                  f"компании {deal['company_share']:.2f}")
+
+    payouts = db.get_realtor_payouts(args.date_from, args.date_to, by_month=args.by_month)
+    if args.realtor is not None:
+        payouts = [payout for payout in payouts if payout['realtor_id'] == args.realtor]
+
+    print(f"{'Месяц':<8} {'Риэлтор':<40} {'Сделок':>8} {'Вознаграждение':>16}")
+    for payout in payouts:
+        print(f"{payout['month'] or '':<8} {(payout['realtor_name'] or '').strip():<40} "
+              f"{payout['deals_count']:>8} {payout['payout']:>16.2f}")
+    if args.realtor is None:
+        print(f"{'':<8} {'Доход компании':<40} {'':>8} "
+              f"{db.get_company_income(args.date_from, args.date_to):>16.2f}")
+    return 0
+
+
+def cmd_backfill_commissions(args, db):
+    count = db.backfill_deal_commissions()
+    print(f"Комиссии пересчитаны для {count} сделок")
+    return 0
+
+
+def print_rows(rows):
+    if not rows:
+        print("Нет данных")
+        return
+    columns = list(rows[0])
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join('' if row[column] is None else str(row[column]) for column in columns))
+
+
+def cmd_analytics(args, db):
+    from analytics import Analytics
+
+    analytics = Analytics(db)
+    if args.rebuild:
+        analytics.rebuild()
+    group_by = args.group_by.split(',') if args.group_by else None
+    if args.report == 'realtors':
+        rows = analytics.deals_per_realtor_month(args.month_from, args.month_to, args.realtor)
+    elif args.report == 'rent':
+        rows = analytics.average_rent(group_by) if group_by else analytics.average_rent()
+    elif args.report == 'conversion':
+        rows = analytics.conversion(group_by) if group_by else analytics.conversion()
+    else:
+        rows = analytics.time_to_close(group_by) if group_by else analytics.time_to_close()
+    print_rows(rows)
+    return 0
+
+
+def cmd_vacuum(args, db):
+    db.vacuum()
+    if args.analyze:
+        db.analyze()
+    print("Сжатие базы данных выполнено")
+    return 0
+
+
+def cmd_analyze(args, db):
+    db.analyze()
+    print("Статистика для планировщика запросов обновлена")
+    return 0
+
+
+def cmd_benchmark(args, db):
+    from benchmark import format_results, run_connection_benchmark
+
+    print(format_results(run_connection_benchmark(args.rows, args.dir)))
+    return 0
+
+
+def cmd_benchmark_startup(args, db):
+    from benchmark import STARTUP_ROWS, STARTUP_TARGET_SECONDS, format_startup_results, run_startup_benchmark
+
+    result = run_startup_benchmark(args.rows or STARTUP_ROWS, args.startup_db, args.runs,
+                                   args.target or STARTUP_TARGET_SECONDS, args.dir)
+    print(format_startup_results(result))
+    return 0 if result['passed'] else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m cli',
+                                     description="Пакетные операции информационной системы агентства недвижимости")
+    parser.add_argument('--db', default='real_estate.db', help="Путь к базе данных")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Потоковый импорт из CSV или JSONL")
+    import_parser.add_argument('kind', choices=('properties', 'offers', 'demands'))
+    import_parser.add_argument('path', help="Файл .csv, .jsonl или .ndjson")
+    import_parser.add_argument('--chunk-size', type=int, default=5000, help="Строк в одной транзакции")
+    import_parser.add_argument('--restart', action='store_true', help="Игнорировать сохраненную позицию импорта")
+    import_parser.add_argument('--errors', help="Файл JSONL для строк с ошибками")
+    import_parser.add_argument('--strict', action='store_true', help="Код возврата 1 при наличии ошибок")
+    import_parser.add_argument('--quiet', action='store_true', help="Не выводить прогресс")
+    import_parser.set_defaults(handler=cmd_import)
+
+    export_parser = subparsers.add_parser('export', help="Потоковый экспорт таблицы или отчета")
+    export_parser.add_argument('name', choices=('clients', 'realtors', 'properties', 'offers',
+                                                'demands', 'deals', 'deal_commissions', 'matches'))
+    export_parser.add_argument('path', help="Файл .csv, .jsonl или .rcol (колоночный формат)")
+    export_parser.add_argument('--format', choices=('csv', 'jsonl', 'rcol'),
+                               help="Формат файла (по умолчанию по расширению)")
+    export_parser.add_argument('--batch-size', type=int, default=10000, help="Строк на одно чтение из базы")
+    export_parser.set_defaults(handler=cmd_export)
+
+    match_parser = subparsers.add_parser('match', help="Совпадения потребностей и предложений")
+    match_parser.add_argument('--rebuild', action='store_true', help="Пересчитать таблицу совпадений")
+    match_parser.add_argument('--demand', type=int, help="Показать предложения для потребности")
+    match_parser.add_argument('--offer', type=int, help="Показать открытые потребности для предложения")
+    match_parser.add_argument('--ranked', action='store_true',
+                              help="Лучшие предложения по оценке отклонения, включая почти подходящие")
+    match_parser.add_argument('--limit', type=int, help="Число предложений в ранжированном подборе (по умолчанию 10)")
+    match_parser.add_argument('--max-score', type=float,
+                              help="Наибольшая допустимая оценка отклонения (по умолчанию 1.0)")
+    match_parser.set_defaults(handler=cmd_match)
+
+    assign_parser = subparsers.add_parser('assign', help="Пакет сделок: паросочетание открытых потребностей и предложений")
+    assign_parser.add_argument('--objective', choices=('commission', 'count'), default='commission',
+                               help="Наибольшая суммарная комиссия или наибольшее число сделок")
+    assign_parser.add_argument('--rebuild', action='store_true', help="Сначала пересчитать совпадения")
+    assign_parser.add_argument('--apply', action='store_true', help="Создать предложенные сделки")
+    assign_parser.set_defaults(handler=cmd_assign)
+
+    near_parser = subparsers.add_parser('near', help="Объекты в радиусе от точки, по возрастанию расстояния")
+    near_parser.add_argument('lat', type=float, help="Широта центра")
+    near_parser.add_argument('lon', type=float, help="Долгота центра")
+    near_parser.add_argument('--radius', type=float, default=3.0, help="Радиус, км")
+    near_parser.add_argument('--type', choices=('apartment', 'house', 'land'), help="Только объекты этого типа")
+    near_parser.add_argument('--limit', type=int, help="Не больше указанного числа ближайших объектов")
+    near_parser.set_defaults(handler=cmd_near)
+
+    commission_parser = subparsers.add_parser('commission', help="Отчет по комиссиям риэлторов")
+    commission_parser.add_argument('--realtor', type=int, help="Только указанный риэлтор")
+    commission_parser.add_argument('--deals', action='store_true', help="Вывести комиссии по каждой сделке")
+    commission_parser.add_argument('--from', dest='date_from', help="Начало периода (ГГГГ-ММ-ДД)")
+    commission_parser.add_argument('--to', dest='date_to', help="Конец периода, не включая (ГГГГ-ММ-ДД)")
+    commission_parser.add_argument('--by-month', action='store_true', help="Разбить выплаты по месяцам")
+    commission_parser.set_defaults(handler=cmd_commission)
+
+    backfill_parser = subparsers.add_parser('backfill-commissions',
+                                            help="Пересчитать журнал комиссий по всем сделкам")
+    backfill_parser.set_defaults(handler=cmd_backfill_commissions)
+
+    analytics_parser = subparsers.add_parser('analytics', help="Сводная аналитика по сделкам и предложениям")
+    analytics_parser.add_argument('report', choices=('realtors', 'rent', 'conversion', 'close-time'))
+    analytics_parser.add_argument('--group-by', help="Колонки группировки через запятую, например city,property_type")
+    analytics_parser.add_argument('--from', dest='month_from', help="Первый месяц (ГГГГ-ММ) для отчета realtors")
+    analytics_parser.add_argument('--to', dest='month_to', help="Последний месяц (ГГГГ-ММ) для отчета realtors")
+    analytics_parser.add_argument('--realtor', type=int, help="Только указанный риэлтор (отчет realtors)")
+    analytics_parser.add_argument('--rebuild', action='store_true', help="Пересчитать сводные таблицы перед отчетом")
+    analytics_parser.set_defaults(handler=cmd_analytics)
+
+    vacuum_parser = subparsers.add_parser('vacuum', help="Сжать файл базы данных")
+    vacuum_parser.add_argument('--analyze', action='store_true', help="После сжатия обновить статистику")
+    vacuum_parser.set_defaults(handler=cmd_vacuum)
+
+    analyze_parser = subparsers.add_parser('analyze', help="Обновить статистику планировщика запросов")
+    analyze_parser.set_defaults(handler=cmd_analyze)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help="Сравнить профили подключения SQLite")
+    benchmark_parser.add_argument('--rows', type=int, default=2000, help="Количество объектов и предложений")
+    benchmark_parser.add_argument('--dir', default=None, help="Каталог для временных баз данных")
+    benchmark_parser.set_defaults(handler=cmd_benchmark, needs_db=False)
+
+    startup_parser = subparsers.add_parser('benchmark-startup',
+                                           help="Регрессионный замер времени до первого окна приложения")
+    startup_parser.add_argument('--rows', type=int, help="Количество предложений в базе (по умолчанию 1000000)")
+    startup_parser.add_argument('--startup-db', default=None,
+                                help="Файл базы для замера (создается и дополняется до --rows, чтобы не генерировать заново)")
+    startup_parser.add_argument('--runs', type=int, default=3, help="Количество запусков приложения")
+    startup_parser.add_argument('--target', type=float,
+                                help="Допустимое время до первого окна, с (по умолчанию 1.5); при превышении код возврата 1")
+    startup_parser.add_argument('--dir', default=None, help="Каталог для временной базы данных")
+    startup_parser.set_defaults(handler=cmd_benchmark_startup, needs_db=False)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not getattr(args, 'needs_db', True):
+        return args.handler(args, None)
+
+    from database import Database
+
+    db = Database(args.db)
+    try:
+        return args.handler(args, db)
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,19 @@
-from typing import Dict, Optional
-from database import Database
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from database import Database
+
+COMMISSION_FIELDS = ('seller_commission', 'buyer_commission', 'seller_realtor_share',
+                     'buyer_realtor_share', 'company_share')
+
+
+def _load_numpy():
+    # NumPy необязателен и загружается только для пакетного расчета
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
 class CommissionCalculator:
     
@@ -20,7 +34,7 @@ class CommissionCalculator:
         return monthly_price * 0.10
     
     @staticmethod
-    def calculate_deal_commissions(deal: Dict, db: Database) -> Dict[str, float]:
+    def calculate_deal_commissions(deal: Dict, db: 'Database') -> Dict[str, float]:
         if not deal or 'offer' not in deal:
             return {
                 'seller_commission': 0.0,
@@ -35,20 +49,31 @@ class CommissionCalculator:
         property_type = property_data.get('type', 'apartment')
         monthly_price = float(offer.get('price', 0))
         
-        seller_commission = CommissionCalculator.calculate_commission_for_seller(property_type, monthly_price)
-        buyer_commission = CommissionCalculator.calculate_commission_for_buyer(monthly_price)
-        
         seller_realtor_id = offer.get('realtor_id')
         buyer_realtor_id = deal.get('demand', {}).get('realtor_id')
         
         seller_realtor = db.get_realtor(seller_realtor_id) if seller_realtor_id else None
         buyer_realtor = db.get_realtor(buyer_realtor_id) if buyer_realtor_id else None
         
-        seller_share = (seller_realtor.get('commission_share') or 45.0) / 100.0 if seller_realtor else 0.45
-        buyer_share = (buyer_realtor.get('commission_share') or 45.0) / 100.0 if buyer_realtor else 0.45
+        return CommissionCalculator.calculate_commissions(
+            property_type, monthly_price,
+            seller_realtor.get('commission_share') if seller_realtor else None,
+            buyer_realtor.get('commission_share') if buyer_realtor else None
+        )
+    
+    @staticmethod
+    def realtor_share_rate(commission_share: Optional[float]) -> float:
+        return (commission_share or 45.0) / 100.0
+    
+    @staticmethod
+    def calculate_commissions(property_type: str, monthly_price: float,
+                              seller_commission_share: Optional[float] = None,
+                              buyer_commission_share: Optional[float] = None) -> Dict[str, float]:
+        seller_commission = CommissionCalculator.calculate_commission_for_seller(property_type, monthly_price)
+        buyer_commission = CommissionCalculator.calculate_commission_for_buyer(monthly_price)
         
-        seller_realtor_share = seller_commission * seller_share
-        buyer_realtor_share = buyer_commission * buyer_share
+        seller_realtor_share = seller_commission * CommissionCalculator.realtor_share_rate(seller_commission_share)
+        buyer_realtor_share = buyer_commission * CommissionCalculator.realtor_share_rate(buyer_commission_share)
         
         company_share = (seller_commission - seller_realtor_share) + (buyer_commission - buyer_realtor_share)
         
@@ -59,4 +84,70 @@ class CommissionCalculator:
             'buyer_realtor_share': round(buyer_realtor_share, 2),
             'company_share': round(company_share, 2)
         }
-
+    
+    @staticmethod
+    def calculate_commissions_batch(property_types: Sequence[str], prices: Sequence[Optional[float]],
+                                    seller_commission_shares: Sequence[Optional[float]],
+                                    buyer_commission_shares: Sequence[Optional[float]],
+                                    use_numpy: Optional[bool] = None) -> Dict[str, List[float]]:
+        # Строки без цены (сделка без предложения) получают нулевые комиссии
+        np = _load_numpy() if use_numpy is not False else None
+        if use_numpy and np is None:
+            raise ImportError("Для расчета через NumPy необходимо установить numpy")
+        
+        count = len(prices)
+        if np is None or count == 0:
+            result = {field: [0.0] * count for field in COMMISSION_FIELDS}
+            for index in range(count):
+                if prices[index] is None:
+                    continue
+                commissions = CommissionCalculator.calculate_commissions(
+                    property_types[index], float(prices[index]),
+                    seller_commission_shares[index], buyer_commission_shares[index]
+                )
+                for field in COMMISSION_FIELDS:
+                    result[field][index] = commissions[field]
+            return result
+        
+        missing = np.fromiter((price is None for price in prices), dtype=bool, count=count)
+        price = np.fromiter((0.0 if p is None else float(p) for p in prices), dtype=np.float64, count=count)
+        types = np.asarray(property_types, dtype=object)
+        
+        seller_commission = np.zeros(count)
+        mask = types == 'apartment'
+        seller_commission[mask] = 3000 + price[mask]
+        mask = types == 'land'
+        seller_commission[mask] = 5000 + (price[mask] * 12) * 0.05
+        mask = types == 'house'
+        seller_commission[mask] = 5000 + price[mask] * 0.25
+        buyer_commission = price * 0.10
+        
+        seller_rate = np.fromiter((share or 45.0 for share in seller_commission_shares),
+                                  dtype=np.float64, count=count) / 100.0
+        buyer_rate = np.fromiter((share or 45.0 for share in buyer_commission_shares),
+                                 dtype=np.float64, count=count) / 100.0
+        seller_realtor_share = seller_commission * seller_rate
+        buyer_realtor_share = buyer_commission * buyer_rate
+        company_share = (seller_commission - seller_realtor_share) + (buyer_commission - buyer_realtor_share)
+        
+        columns = (seller_commission, buyer_commission, seller_realtor_share, buyer_realtor_share, company_share)
+        result = {}
+        for field, values in zip(COMMISSION_FIELDS, columns):
+            values[missing] = 0.0
+            # numpy.round округляет иначе, чем round(), поэтому округление поэлементное
+            result[field] = [round(value, 2) for value in values.tolist()]
+        return result
+    
+    @staticmethod
+    def calculate_all_deal_commissions(db: 'Database', use_numpy: Optional[bool] = None) -> Dict[str, List]:
+        inputs = db.get_deal_commission_inputs()
+        result = {
+            'deal_id': inputs['deal_id'],
+            'seller_realtor_id': inputs['seller_realtor_id'],
+            'buyer_realtor_id': inputs['buyer_realtor_id'],
+        }
+        result.update(CommissionCalculator.calculate_commissions_batch(
+            inputs['property_type'], inputs['price'],
+            inputs['seller_commission_share'], inputs['buyer_commission_share'], use_numpy
+        ))
+        return result
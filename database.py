@@ -1,19 +1,695 @@
+import heapq
+import json
+import math
+import re
 import sqlite3
-from typing import Optional, List, Dict, Any
+from bisect import bisect_left, bisect_right
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple
 from datetime import datetime
 import logging
 
+from commission_calculator import COMMISSION_FIELDS, CommissionCalculator
+
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+PROPERTY_DETAIL_TABLES = {'apartment': 'apartments', 'house': 'houses', 'land': 'lands'}
+DEMAND_DETAIL_TABLES = {'apartment': 'apartment_demands', 'house': 'house_demands', 'land': 'land_demands'}
+PROPERTY_DETAIL_COLUMNS = {
+    'apartment': ('floor', 'rooms', 'area'),
+    'house': ('floors', 'rooms', 'area'),
+    'land': ('area',),
+}
+DEMAND_DETAIL_COLUMNS = {
+    'apartment': ('min_area', 'max_area', 'min_rooms', 'max_rooms', 'min_floor', 'max_floor'),
+    'house': ('min_area', 'max_area', 'min_rooms', 'max_rooms', 'min_floors', 'max_floors'),
+    'land': ('min_area', 'max_area'),
+}
+
+BulkResult = Tuple[List[Optional[int]], List[Tuple[int, str]]]
+# Слушатель изменений: сущность (имя таблицы) и id измененных строк
+ChangeListener = Callable[[str, List[int]], None]
+
+
+def _offer_stats_delta(row: str, sign: str) -> str:
+    # Вклад одного предложения в группу (тип объекта, город, риэлтор)
+    return f"""
+        INSERT INTO rollup_offer_stats (property_type, city, realtor_id, offers_count, price_sum, deals_count)
+        SELECT p.type, COALESCE(p.city, ''), {row}.realtor_id, {sign}1, {sign}{row}.price,
+               {sign}EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = {row}.id)
+        FROM properties p WHERE p.id = {row}.property_id
+        ON CONFLICT (property_type, city, realtor_id) DO UPDATE SET
+            offers_count = offers_count + excluded.offers_count,
+            price_sum = price_sum + excluded.price_sum,
+            deals_count = deals_count + excluded.deals_count;"""
+
+
+def _offer_deals_delta(offer_id: str, sign: str) -> str:
+    return f"""
+        INSERT INTO rollup_offer_stats (property_type, city, realtor_id, offers_count, price_sum, deals_count)
+        SELECT p.type, COALESCE(p.city, ''), o.realtor_id, 0, 0, {sign}1
+        FROM offers o JOIN properties p ON p.id = o.property_id WHERE o.id = {offer_id}
+        ON CONFLICT (property_type, city, realtor_id) DO UPDATE SET
+            deals_count = deals_count + excluded.deals_count;"""
+
+
+def _property_offers_delta(row: str, sign: str) -> str:
+    return f"""
+        INSERT INTO rollup_offer_stats (property_type, city, realtor_id, offers_count, price_sum, deals_count)
+        SELECT {row}.type, COALESCE({row}.city, ''), o.realtor_id, {sign}COUNT(*), {sign}SUM(o.price),
+               {sign}SUM(EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id))
+        FROM offers o WHERE o.property_id = {row}.id
+        GROUP BY o.realtor_id
+        ON CONFLICT (property_type, city, realtor_id) DO UPDATE SET
+            offers_count = offers_count + excluded.offers_count,
+            price_sum = price_sum + excluded.price_sum,
+            deals_count = deals_count + excluded.deals_count;"""
+
+
+def _realtor_month_delta(row: str, sign: str) -> str:
+    statements = []
+    for side, days in (('seller', 'offer_days_to_close'), ('buyer', 'demand_days_to_close')):
+        statements.append(f"""
+        INSERT INTO rollup_realtor_month (realtor_id, month, side, property_type, deals_count, price_sum,
+                                          payout_sum, close_days_sum, close_days_count)
+        SELECT {row}.{side}_realtor_id, strftime('%Y-%m', {row}.created_at), '{side}', {row}.property_type,
+               {sign}1, {sign}COALESCE({row}.price, 0), {sign}{row}.{side}_realtor_share,
+               {sign}COALESCE({row}.{days}, 0), {sign}({row}.{days} IS NOT NULL)
+        WHERE {row}.{side}_realtor_id IS NOT NULL
+        ON CONFLICT (realtor_id, month, side, property_type) DO UPDATE SET
+            deals_count = deals_count + excluded.deals_count,
+            price_sum = price_sum + excluded.price_sum,
+            payout_sum = payout_sum + excluded.payout_sum,
+            close_days_sum = close_days_sum + excluded.close_days_sum,
+            close_days_count = close_days_count + excluded.close_days_count;""")
+    return "".join(statements)
+
+
+# Суффиксы длиной от 3 цифр для 11-значного номера
+PHONE_SUFFIX_TOKENS = 9
+FTS_RANKED_PREFIX_LENGTH = 3
+
+
+def _fold_yo(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _full_name(row: str) -> str:
+    return _fold_yo(f"COALESCE({row}.surname, '') || ' ' || COALESCE({row}.name, '') || ' ' || "
+                    f"COALESCE({row}.patronymic, '')")
+
+
+# Ключ алфавитного порядка клиентов и риэлторов: фамилия, имя, отчество и id, который делает его
+# уникальным для постраничной выборки. Выражения совпадают с индексами *_full_name миграции 10
+PERSON_ORDER_SQL = ("COALESCE({prefix}surname, ''), COALESCE({prefix}name, ''), "
+                    "COALESCE({prefix}patronymic, ''), {prefix}id")
+# Ключ «до первой строки»: меньше ключа любой строки
+FIRST_PERSON_KEY = ('', '', '', 0)
+
+
+def person_sort_key(row: Dict) -> Tuple[str, str, str, int]:
+    # Тот же ключ для строки выборки; порядок строк Python совпадает с BINARY-сравнением SQLite
+    return row.get('surname') or '', row.get('name') or '', row.get('patronymic') or '', row['id']
+
+
+def _phone_tokens(row: str) -> str:
+    # Все суффиксы цифр телефона: префиксный поиск по ним находит любую подстроку номера
+    digits = f"COALESCE({row}.phone, '')"
+    for char in (' ', '+', '(', ')', '-', '.'):
+        digits = f"replace({digits}, '{char}', '')"
+    return " || ' ' || ".join(f"substr({digits}, {start})" for start in range(1, PHONE_SUFFIX_TOKENS + 1))
+
+
+def _fts_match_expression(search: str, text_columns: Tuple[str, ...],
+                          phone_column: Optional[str] = None) -> Tuple[Optional[str], bool]:
+    # Возвращает выражение MATCH и признак, имеет ли смысл сортировка по релевантности:
+    # для префиксов из 1-2 символов bm25 пришлось бы считать по огромному числу строк
+    terms = []
+    shortest = None
+    for word in search.split():
+        digits = re.sub(r'\D', '', word)
+        if phone_column and digits and re.fullmatch(r'[\d+()\-.]+', word):
+            variants = [digits]
+            # +7 916 и 8 916 хранятся одинаково, поэтому код страны можно не учитывать
+            if len(digits) >= 4 and (word.startswith('+7') or digits.startswith('8')):
+                variants.append(digits[1:])
+            terms.append("(" + " OR ".join(f'{phone_column} : "{variant}"*' for variant in variants) + ")")
+            shortest = min(len(digits), shortest or len(digits))
+            continue
+        for token in re.findall(r'[^\W_]+', word.lower().replace('ё', 'е')):
+            terms.append(f'{{{" ".join(text_columns)}}} : "{token}"*')
+            shortest = min(len(token), shortest or len(token))
+    if not terms:
+        return None, False
+    return " AND ".join(terms), shortest >= FTS_RANKED_PREFIX_LENGTH
+
+
+ROLLUP_REBUILD_SQL = [
+    "DELETE FROM rollup_offer_stats",
+    """INSERT INTO rollup_offer_stats (property_type, city, realtor_id, offers_count, price_sum, deals_count)
+       SELECT p.type, COALESCE(p.city, ''), o.realtor_id, COUNT(*), SUM(o.price),
+              SUM(EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id))
+       FROM offers o JOIN properties p ON p.id = o.property_id
+       GROUP BY p.type, COALESCE(p.city, ''), o.realtor_id""",
+    "DELETE FROM rollup_realtor_month",
+    """INSERT INTO rollup_realtor_month (realtor_id, month, side, property_type, deals_count, price_sum,
+                                        payout_sum, close_days_sum, close_days_count)
+       SELECT realtor_id, month, side, property_type, COUNT(*), SUM(price), SUM(share),
+              SUM(COALESCE(days, 0)), COUNT(days)
+       FROM (
+           SELECT seller_realtor_id as realtor_id, strftime('%Y-%m', created_at) as month, 'seller' as side,
+                  property_type, COALESCE(price, 0) as price, seller_realtor_share as share,
+                  offer_days_to_close as days
+           FROM deal_commissions WHERE seller_realtor_id IS NOT NULL
+           UNION ALL
+           SELECT buyer_realtor_id, strftime('%Y-%m', created_at), 'buyer', property_type,
+                  COALESCE(price, 0), buyer_realtor_share, demand_days_to_close
+           FROM deal_commissions WHERE buyer_realtor_id IS NOT NULL
+       )
+       GROUP BY realtor_id, month, side, property_type""",
+]
+
+# Граница «без ограничения» для диапазонов потребностей в R*Tree demands_ranges
+DEMAND_RANGE_UNBOUNDED = 1e30
+
+
+def _demand_range_bounds(min_expr: str, max_expr: str) -> str:
+    # Отрезок R*Tree для диапазона потребности с семантикой _range_condition:
+    # без минимума ограничения нет, без максимума диапазон открыт сверху
+    return (f"COALESCE({min_expr}, -{DEMAND_RANGE_UNBOUNDED}), "
+            f"CASE WHEN {min_expr} IS NULL OR {max_expr} IS NULL THEN {DEMAND_RANGE_UNBOUNDED} ELSE {max_expr} END")
+
+
+def _demand_ranges_insert(where: str) -> str:
+    return f"""
+        INSERT INTO demands_ranges (id, min_price, max_price, min_period, max_period,
+                                    min_area, max_area, min_rooms, max_rooms, min_floor, max_floor)
+        SELECT d.id, d.min_price, d.max_price, d.min_rental_period, d.max_rental_period,
+               {_demand_range_bounds('COALESCE(ad.min_area, hd.min_area, ld.min_area)',
+                                     'COALESCE(ad.max_area, hd.max_area, ld.max_area)')},
+               {_demand_range_bounds('COALESCE(ad.min_rooms, hd.min_rooms)', 'COALESCE(ad.max_rooms, hd.max_rooms)')},
+               {_demand_range_bounds('COALESCE(ad.min_floor, hd.min_floors)', 'COALESCE(ad.max_floor, hd.max_floors)')}
+        FROM demands d
+        LEFT JOIN apartment_demands ad ON ad.demand_id = d.id AND d.property_type = 'apartment'
+        LEFT JOIN house_demands hd ON hd.demand_id = d.id AND d.property_type = 'house'
+        LEFT JOIN land_demands ld ON ld.demand_id = d.id AND d.property_type = 'land'
+        {where}"""
+
+
+def _demand_ranges_refresh(demand_id: str) -> str:
+    return f"""
+        DELETE FROM demands_ranges WHERE id = {demand_id};
+        {_demand_ranges_insert(f"WHERE d.id = {demand_id}")};"""
+
+
+SCHEMA_MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_offers_client ON offers(client_id)",
+        "CREATE INDEX IF NOT EXISTS idx_offers_realtor ON offers(realtor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_offers_property_price ON offers(property_id, price)",
+        "CREATE INDEX IF NOT EXISTS idx_offers_price_period ON offers(price, rental_period)",
+        "CREATE INDEX IF NOT EXISTS idx_demands_client ON demands(client_id)",
+        "CREATE INDEX IF NOT EXISTS idx_demands_realtor ON demands(realtor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_demands_type_price ON demands(property_type, min_price, max_price)",
+        "CREATE INDEX IF NOT EXISTS idx_properties_type_city_street ON properties(type, city, street)",
+    ]),
+    (2, [
+        """CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ]),
+    (3, [
+        """CREATE TABLE IF NOT EXISTS deal_commissions (
+            deal_id INTEGER PRIMARY KEY,
+            created_at TIMESTAMP,
+            property_type TEXT,
+            price INTEGER,
+            seller_realtor_id INTEGER,
+            buyer_realtor_id INTEGER,
+            seller_commission REAL NOT NULL DEFAULT 0,
+            buyer_commission REAL NOT NULL DEFAULT 0,
+            seller_realtor_share REAL NOT NULL DEFAULT 0,
+            buyer_realtor_share REAL NOT NULL DEFAULT 0,
+            company_share REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (deal_id) REFERENCES deals(id) ON DELETE CASCADE
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_deal_commissions_seller ON deal_commissions(seller_realtor_id, created_at, seller_realtor_share)",
+        "CREATE INDEX IF NOT EXISTS idx_deal_commissions_buyer ON deal_commissions(buyer_realtor_id, created_at, buyer_realtor_share)",
+        "CREATE INDEX IF NOT EXISTS idx_deal_commissions_created ON deal_commissions(created_at)",
+    ]),
+    (4, [
+        "ALTER TABLE offers ADD COLUMN created_at TIMESTAMP",
+        "ALTER TABLE demands ADD COLUMN created_at TIMESTAMP",
+        "ALTER TABLE deal_commissions ADD COLUMN offer_days_to_close REAL",
+        "ALTER TABLE deal_commissions ADD COLUMN demand_days_to_close REAL",
+        """CREATE TABLE IF NOT EXISTS rollup_offer_stats (
+            property_type TEXT NOT NULL,
+            city TEXT NOT NULL,
+            realtor_id INTEGER NOT NULL,
+            offers_count INTEGER NOT NULL DEFAULT 0,
+            price_sum INTEGER NOT NULL DEFAULT 0,
+            deals_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (property_type, city, realtor_id)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_realtor_month (
+            realtor_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            side TEXT NOT NULL,
+            property_type TEXT NOT NULL,
+            deals_count INTEGER NOT NULL DEFAULT 0,
+            price_sum INTEGER NOT NULL DEFAULT 0,
+            payout_sum REAL NOT NULL DEFAULT 0,
+            close_days_sum REAL NOT NULL DEFAULT 0,
+            close_days_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (realtor_id, month, side, property_type)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_rollup_realtor_month_month ON rollup_realtor_month(month)",
+        f"CREATE TRIGGER IF NOT EXISTS rollup_offers_insert AFTER INSERT ON offers BEGIN {_offer_stats_delta('NEW', '')} END",
+        f"CREATE TRIGGER IF NOT EXISTS rollup_offers_delete AFTER DELETE ON offers BEGIN {_offer_stats_delta('OLD', '-')} END",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_offers_update AFTER UPDATE OF property_id, price, realtor_id ON offers
+            BEGIN {_offer_stats_delta('OLD', '-')} {_offer_stats_delta('NEW', '')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_properties_update AFTER UPDATE OF type, city ON properties
+            WHEN OLD.type IS NOT NEW.type OR OLD.city IS NOT NEW.city
+            BEGIN {_property_offers_delta('OLD', '-')} {_property_offers_delta('NEW', '')} END""",
+        f"CREATE TRIGGER IF NOT EXISTS rollup_deals_insert AFTER INSERT ON deals BEGIN {_offer_deals_delta('NEW.offer_id', '')} END",
+        f"CREATE TRIGGER IF NOT EXISTS rollup_deals_delete AFTER DELETE ON deals BEGIN {_offer_deals_delta('OLD.offer_id', '-')} END",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_deals_update AFTER UPDATE OF offer_id ON deals
+            BEGIN {_offer_deals_delta('OLD.offer_id', '-')} {_offer_deals_delta('NEW.offer_id', '')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_deal_commissions_insert AFTER INSERT ON deal_commissions
+            BEGIN {_realtor_month_delta('NEW', '')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_deal_commissions_delete AFTER DELETE ON deal_commissions
+            BEGIN {_realtor_month_delta('OLD', '-')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_deal_commissions_update AFTER UPDATE ON deal_commissions
+            BEGIN {_realtor_month_delta('OLD', '-')} {_realtor_month_delta('NEW', '')} END""",
+    ] + ROLLUP_REBUILD_SQL),
+    (5, [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+            full_name, email, phone, tokenize = 'unicode61', prefix = '2 3'
+        )""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS realtors_fts USING fts5(
+            full_name, tokenize = 'unicode61', prefix = '2 3'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS clients_fts_insert AFTER INSERT ON clients BEGIN
+            INSERT INTO clients_fts (rowid, full_name, email, phone)
+            VALUES (NEW.id, {_full_name('NEW')}, COALESCE(NEW.email, ''), {_phone_tokens('NEW')});
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS clients_fts_delete AFTER DELETE ON clients BEGIN
+            DELETE FROM clients_fts WHERE rowid = OLD.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS clients_fts_update
+            AFTER UPDATE OF surname, name, patronymic, phone, email ON clients BEGIN
+            UPDATE clients_fts SET full_name = {_full_name('NEW')}, email = COALESCE(NEW.email, ''),
+                                   phone = {_phone_tokens('NEW')}
+            WHERE rowid = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS realtors_fts_insert AFTER INSERT ON realtors BEGIN
+            INSERT INTO realtors_fts (rowid, full_name) VALUES (NEW.id, {_full_name('NEW')});
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS realtors_fts_delete AFTER DELETE ON realtors BEGIN
+            DELETE FROM realtors_fts WHERE rowid = OLD.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS realtors_fts_update AFTER UPDATE OF surname, name, patronymic ON realtors BEGIN
+            UPDATE realtors_fts SET full_name = {_full_name('NEW')} WHERE rowid = NEW.id;
+        END""",
+        "DELETE FROM clients_fts",
+        f"""INSERT INTO clients_fts (rowid, full_name, email, phone)
+            SELECT c.id, {_full_name('c')}, COALESCE(c.email, ''), {_phone_tokens('c')} FROM clients c""",
+        "DELETE FROM realtors_fts",
+        f"INSERT INTO realtors_fts (rowid, full_name) SELECT r.id, {_full_name('r')} FROM realtors r",
+    ]),
+    (6, [
+        # Точки объектов как вырожденные прямоугольники; R*Tree хранит 32-битные координаты
+        # с округлением наружу, поэтому точные расстояния считаются по properties
+        """CREATE VIRTUAL TABLE IF NOT EXISTS properties_geo USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS properties_geo_insert AFTER INSERT ON properties
+            WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN
+            INSERT INTO properties_geo (id, min_lat, max_lat, min_lon, max_lon)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS properties_geo_delete AFTER DELETE ON properties BEGIN
+            DELETE FROM properties_geo WHERE id = OLD.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS properties_geo_update AFTER UPDATE OF latitude, longitude ON properties BEGIN
+            DELETE FROM properties_geo WHERE id = OLD.id;
+            INSERT INTO properties_geo (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END""",
+        "DELETE FROM properties_geo",
+        """INSERT INTO properties_geo (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT id, latitude, latitude, longitude, longitude FROM properties
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL""",
+    ]),
+    (7, [
+        # Район поиска потребности: центр и радиус заменяют точное совпадение адреса
+        "ALTER TABLE demands ADD COLUMN latitude REAL",
+        "ALTER TABLE demands ADD COLUMN longitude REAL",
+        "ALTER TABLE demands ADD COLUMN radius_km REAL",
+    ]),
+    (8, [
+        # Диапазоны потребностей (цена, срок, площадь, комнаты, этаж или этажность) как
+        # прямоугольники R*Tree: потребности, которым подходит предложение, — те, чьи
+        # прямоугольники содержат точку предложения. Тип объекта и адрес проверяются отдельно
+        """CREATE VIRTUAL TABLE IF NOT EXISTS demands_ranges USING rtree(
+            id, min_price, max_price, min_period, max_period,
+            min_area, max_area, min_rooms, max_rooms, min_floor, max_floor
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS demands_ranges_insert AFTER INSERT ON demands BEGIN
+            {_demand_ranges_insert('WHERE d.id = NEW.id')};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS demands_ranges_update
+            AFTER UPDATE OF property_type, min_price, max_price, min_rental_period, max_rental_period ON demands BEGIN
+            {_demand_ranges_refresh('NEW.id')}
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS demands_ranges_delete AFTER DELETE ON demands BEGIN
+            DELETE FROM demands_ranges WHERE id = OLD.id;
+        END""",
+    ] + [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ranges_{event.lower()} AFTER {event} ON {table} BEGIN
+            {_demand_ranges_refresh(f"{row}.demand_id")}
+        END"""
+        for table in DEMAND_DETAIL_TABLES.values()
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'))
+    ] + [
+        "DELETE FROM demands_ranges",
+        _demand_ranges_insert(""),
+    ]),
+    (9, [
+        # Отпечаток файла импорта: позиция из контрольной точки действует только для того же файла
+        "ALTER TABLE import_checkpoints ADD COLUMN fingerprint TEXT",
+    ]),
+    (10, [
+        # Алфавитные списки клиентов и риэлторов постранично по ключу PERSON_ORDER_SQL
+        f"CREATE INDEX IF NOT EXISTS idx_clients_full_name ON clients({PERSON_ORDER_SQL.format(prefix='')})",
+        f"CREATE INDEX IF NOT EXISTS idx_realtors_full_name ON realtors({PERSON_ORDER_SQL.format(prefix='')})",
+    ]),
+]
+
+DEAL_COMMISSIONS_VERSION = 3
+
+MATCH_FROM_SQL = """
+    FROM demands dm
+    JOIN properties p ON p.type = dm.property_type
+    JOIN offers o ON o.property_id = p.id
+    LEFT JOIN apartments a ON a.property_id = p.id AND p.type = 'apartment'
+    LEFT JOIN houses h ON h.property_id = p.id AND p.type = 'house'
+    LEFT JOIN lands l ON l.property_id = p.id AND p.type = 'land'
+    LEFT JOIN apartment_demands ad ON ad.demand_id = dm.id AND dm.property_type = 'apartment'
+    LEFT JOIN house_demands hd ON hd.demand_id = dm.id AND dm.property_type = 'house'
+    LEFT JOIN land_demands ld ON ld.demand_id = dm.id AND dm.property_type = 'land'
+"""
+
+
+def _range_condition(demand_alias: str, min_col: str, max_col: str, prop_expr: str) -> str:
+    # Та же семантика, что и в check_match: без минимума ограничение не действует,
+    # без максимума диапазон открыт сверху.
+    return (f"({demand_alias}.{min_col} IS NULL OR {prop_expr} IS NULL OR "
+            f"({prop_expr} >= {demand_alias}.{min_col} AND "
+            f"({demand_alias}.{max_col} IS NULL OR {prop_expr} <= {demand_alias}.{max_col})))")
+
+
+MATCH_ADDRESS_SQL = " AND ".join([
+    "(dm.city IS NULL OR dm.city = '' OR p.city = dm.city)",
+    "(dm.street IS NULL OR dm.street = '' OR p.street = dm.street)",
+    "(dm.house_number IS NULL OR dm.house_number = '' OR p.house_number = dm.house_number)",
+    "(dm.apartment_number IS NULL OR dm.apartment_number = '' OR p.apartment_number = dm.apartment_number)",
+])
+
+# Расстояние от центра района потребности до объекта (NULL без района или координат объекта)
+MATCH_DISTANCE_SQL = "haversine_km(dm.latitude, dm.longitude, p.latitude, p.longitude)"
+
+MATCH_CONDITIONS_SQL = " AND ".join([
+    f"(CASE WHEN dm.radius_km IS NULL THEN {MATCH_ADDRESS_SQL} ELSE {MATCH_DISTANCE_SQL} <= dm.radius_km END)",
+    "o.price BETWEEN dm.min_price AND dm.max_price",
+    "o.rental_period BETWEEN dm.min_rental_period AND dm.max_rental_period",
+    _range_condition('ad', 'min_floor', 'max_floor', 'a.floor'),
+    _range_condition('ad', 'min_rooms', 'max_rooms', 'a.rooms'),
+    _range_condition('ad', 'min_area', 'max_area', 'a.area'),
+    _range_condition('hd', 'min_floors', 'max_floors', 'h.floors'),
+    _range_condition('hd', 'min_rooms', 'max_rooms', 'h.rooms'),
+    _range_condition('hd', 'min_area', 'max_area', 'h.area'),
+    _range_condition('ld', 'min_area', 'max_area', 'l.area'),
+])
+
+# Веса отклонений при ранжированном подборе (score_match, get_ranked_offers): оценка 0 —
+# полное соответствие, 1.0 — например, цена на 10% выше максимума, срок на 2 месяца
+# вне диапазона или на две комнаты меньше
+MATCH_SCORE_WEIGHTS = {
+    'price': 10.0,           # за долю от границы диапазона цены
+    'period': 0.5,           # за месяц
+    'area': 5.0,             # за долю от границы диапазона площади
+    'rooms': 0.5,            # за комнату
+    'floor': 0.25,           # за этаж (для дома — за этаж этажности)
+    'distance': 2.0,         # за долю радиуса сверх радиуса района
+    'city': 5.0,             # за несовпадение частей адреса
+    'street': 1.0,
+    'house_number': 0.5,
+    'apartment_number': 0.25,
+}
+MATCH_SCORE_LIMIT = 1.0
+RANKED_OFFERS_LIMIT = 10
+# Число колец цен вокруг диапазона потребности при поиске лучших предложений
+PRICE_BAND_STEPS = 4
+
+
+def _range_penalty_sql(demand_alias: str, min_col: str, max_col: str, prop_expr: str,
+                       weight: float, relative: bool = False) -> str:
+    # Штраф за выход значения из диапазона; NULL-семантика та же, что у _range_condition
+    low, high = f"{demand_alias}.{min_col}", f"{demand_alias}.{max_col}"
+    below = f"({low} - {prop_expr})" + (f" / MAX({low}, 1)" if relative else "")
+    above = f"({prop_expr} - {high})" + (f" / MAX({high}, 1)" if relative else "")
+    return (f"(CASE WHEN {low} IS NULL OR {prop_expr} IS NULL THEN 0.0 "
+            f"WHEN {prop_expr} < {low} THEN {float(weight)!r} * {below} "
+            f"WHEN {high} IS NOT NULL AND {prop_expr} > {high} THEN {float(weight)!r} * {above} "
+            f"ELSE 0.0 END)")
+
+
+MATCH_ADDRESS_PENALTY_SQL = " + ".join(
+    f"(CASE WHEN dm.{col} IS NULL OR dm.{col} = '' OR p.{col} = dm.{col} THEN 0.0 "
+    f"ELSE {MATCH_SCORE_WEIGHTS[col]!r} END)"
+    for col in ('city', 'street', 'house_number', 'apartment_number')
+)
+
+# Оценка отклонения предложения от потребности; NULL — предложение не подходит вовсе
+# (у потребности с районом объект без координат)
+MATCH_SCORE_SQL = " + ".join([
+    f"(CASE WHEN dm.radius_km IS NULL THEN {MATCH_ADDRESS_PENALTY_SQL} "
+    f"WHEN {MATCH_DISTANCE_SQL} <= dm.radius_km THEN 0.0 "
+    f"ELSE {MATCH_SCORE_WEIGHTS['distance']!r} * ({MATCH_DISTANCE_SQL} - dm.radius_km) / dm.radius_km END)",
+    _range_penalty_sql('dm', 'min_price', 'max_price', 'o.price', MATCH_SCORE_WEIGHTS['price'], relative=True),
+    _range_penalty_sql('dm', 'min_rental_period', 'max_rental_period', 'o.rental_period',
+                       MATCH_SCORE_WEIGHTS['period']),
+    _range_penalty_sql('ad', 'min_floor', 'max_floor', 'a.floor', MATCH_SCORE_WEIGHTS['floor']),
+    _range_penalty_sql('ad', 'min_rooms', 'max_rooms', 'a.rooms', MATCH_SCORE_WEIGHTS['rooms']),
+    _range_penalty_sql('ad', 'min_area', 'max_area', 'a.area', MATCH_SCORE_WEIGHTS['area'], relative=True),
+    _range_penalty_sql('hd', 'min_floors', 'max_floors', 'h.floors', MATCH_SCORE_WEIGHTS['floor']),
+    _range_penalty_sql('hd', 'min_rooms', 'max_rooms', 'h.rooms', MATCH_SCORE_WEIGHTS['rooms']),
+    _range_penalty_sql('hd', 'min_area', 'max_area', 'h.area', MATCH_SCORE_WEIGHTS['area'], relative=True),
+    _range_penalty_sql('ld', 'min_area', 'max_area', 'l.area', MATCH_SCORE_WEIGHTS['area'], relative=True),
+])
+
+# Обратный подбор (потребности для предложений): от предложения к прямоугольникам
+# demands_ranges, содержащим его точку; CROSS JOIN закрепляет этот порядок соединения
+OFFER_MATCH_FROM_SQL = f"""
+    FROM offers o
+    CROSS JOIN properties p ON p.id = o.property_id
+    LEFT JOIN apartments a ON a.property_id = p.id AND p.type = 'apartment'
+    LEFT JOIN houses h ON h.property_id = p.id AND p.type = 'house'
+    LEFT JOIN lands l ON l.property_id = p.id AND p.type = 'land'
+    CROSS JOIN demands_ranges dr ON
+        dr.min_price <= o.price AND dr.max_price >= o.price
+        AND dr.min_period <= o.rental_period AND dr.max_period >= o.rental_period
+        AND dr.min_area <= COALESCE(a.area, h.area, l.area, {DEMAND_RANGE_UNBOUNDED})
+        AND dr.max_area >= COALESCE(a.area, h.area, l.area, -{DEMAND_RANGE_UNBOUNDED})
+        AND dr.min_rooms <= COALESCE(a.rooms, h.rooms, {DEMAND_RANGE_UNBOUNDED})
+        AND dr.max_rooms >= COALESCE(a.rooms, h.rooms, -{DEMAND_RANGE_UNBOUNDED})
+        AND dr.min_floor <= COALESCE(a.floor, h.floors, {DEMAND_RANGE_UNBOUNDED})
+        AND dr.max_floor >= COALESCE(a.floor, h.floors, -{DEMAND_RANGE_UNBOUNDED})
+    CROSS JOIN demands dm ON dm.id = dr.id AND dm.property_type = p.type
+    LEFT JOIN apartment_demands ad ON ad.demand_id = dm.id AND dm.property_type = 'apartment'
+    LEFT JOIN house_demands hd ON hd.demand_id = dm.id AND dm.property_type = 'house'
+    LEFT JOIN land_demands ld ON ld.demand_id = dm.id AND dm.property_type = 'land'
+"""
+
+# Ранжированный подбор для одной потребности: предложения идут первыми, чтобы
+# выборку вели индексы offers (по цене или по объектам-кандидатам), а не все объекты типа
+RANKED_FROM_SQL = """
+    FROM demands dm
+    CROSS JOIN offers o
+    CROSS JOIN properties p ON p.id = o.property_id AND p.type = dm.property_type
+    LEFT JOIN apartments a ON a.property_id = p.id AND p.type = 'apartment'
+    LEFT JOIN houses h ON h.property_id = p.id AND p.type = 'house'
+    LEFT JOIN lands l ON l.property_id = p.id AND p.type = 'land'
+    LEFT JOIN apartment_demands ad ON ad.demand_id = dm.id AND dm.property_type = 'apartment'
+    LEFT JOIN house_demands hd ON hd.demand_id = dm.id AND dm.property_type = 'house'
+    LEFT JOIN land_demands ld ON ld.demand_id = dm.id AND dm.property_type = 'land'
+"""
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _sql_haversine_km(lat1: Optional[float], lon1: Optional[float],
+                      lat2: Optional[float], lon2: Optional[float]) -> Optional[float]:
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return None
+    return haversine_km(lat1, lon1, lat2, lon2)
+
+
+def _range_penalty(value: Optional[float], low: Optional[float], high: Optional[float],
+                   weight: float, relative: bool = False) -> float:
+    # То же, что _range_penalty_sql, для одной пары в Python
+    if low is None or value is None:
+        return 0.0
+    if value < low:
+        return weight * (low - value) / (max(low, 1) if relative else 1)
+    if high is not None and value > high:
+        return weight * (value - high) / (max(high, 1) if relative else 1)
+    return 0.0
+
+
+def _price_bands(min_price: int, max_price: int, max_score: float) -> List[Tuple[float, str, Tuple[float, float]]]:
+    # Полосы цен по возрастанию нижней границы штрафа за цену: сначала диапазон потребности,
+    # затем кольца ниже и выше него до цены, штраф за которую равен max_score
+    weight = MATCH_SCORE_WEIGHTS['price']
+    bands = [(0.0, "o.price BETWEEN ? AND ?", (min_price, max_price))]
+    levels = [max_score * step / PRICE_BAND_STEPS for step in range(PRICE_BAND_STEPS + 1)]
+    for inner, outer in zip(levels, levels[1:]):
+        bands.append((inner, "o.price >= ? AND o.price < ?",
+                      (min_price * (1 - outer / weight), min_price * (1 - inner / weight))))
+        bands.append((inner, "o.price > ? AND o.price <= ?",
+                      (max_price * (1 + inner / weight), max_price * (1 + outer / weight))))
+    return bands
+
+
+def _radius_boxes(lat: float, lon: float, radius_km: float) -> List[Tuple[float, float, float, float]]:
+    # Описанный вокруг круга прямоугольник (min_lat, max_lat, min_lon, max_lon);
+    # у полюса берется вся долгота, через 180-й меридиан — два прямоугольника
+    d_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - d_lat), min(90.0, lat + d_lat)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    # Наибольшая долготная полуширина круга — на широте asin(sin(lat) / cos(d))
+    d_lon = math.degrees(math.asin(min(1.0, math.sin(math.radians(d_lat)) / math.cos(math.radians(lat)))))
+    if d_lon >= 180.0:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    min_lon, max_lon = lon - d_lon, lon + d_lon
+    if min_lon < -180.0:
+        return [(min_lat, max_lat, min_lon + 360.0, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180.0:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360.0)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+TEMP_STORE_MODES = ('DEFAULT', 'FILE', 'MEMORY')
+
+LOOKUP_LIMIT = 50
+REFERENCE_CACHE_SIZE = 256
+# Сущности, от которых зависят справочные выборки lookup(); запись в любую из них
+# меняет версию и делает закэшированную выборку устаревшей
+LOOKUP_DEPENDENCIES = {
+    'clients': ('clients',),
+    'realtors': ('realtors',),
+    'properties': ('properties',),
+    'demands': ('demands', 'clients', 'deals'),
+    'offers': ('offers', 'properties', 'deals'),
+}
+
 class Database:
     
-    def __init__(self, db_path: str = "real_estate.db"):
+    def __init__(self, db_path: str = "real_estate.db", journal_mode: str = 'WAL',
+                 synchronous: str = 'NORMAL', cache_size: int = -64000,
+                 mmap_size: int = 256 * 1024 * 1024, temp_store: str = 'MEMORY',
+                 foreign_keys: bool = True):
         self.db_path = db_path
+        self._listeners: List[ChangeListener] = []
+        # Версии сущностей растут при каждой записи (_notify) и служат ключом справочного кэша
+        self._versions: Dict[str, int] = {}
+        self._reference_cache: Dict[Tuple, Tuple[Tuple[int, ...], Any]] = {}
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self.conn.create_function('haversine_km', 4, _sql_haversine_km)
+        self.configure_connection(journal_mode, synchronous, cache_size, mmap_size, temp_store, foreign_keys)
         self.create_tables()
     
+    def configure_connection(self, journal_mode: str, synchronous: str, cache_size: int,
+                             mmap_size: int, temp_store: str, foreign_keys: bool):
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        temp_store = temp_store.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Некорректный режим журнала: {journal_mode}")
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Некорректный режим synchronous: {synchronous}")
+        if temp_store not in TEMP_STORE_MODES:
+            raise ValueError(f"Некорректный режим temp_store: {temp_store}")
+        
+        cursor = self.conn.cursor()
+        cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        cursor.execute(f"PRAGMA cache_size = {int(cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        cursor.execute(f"PRAGMA temp_store = {temp_store}")
+        cursor.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+    
+    def get_connection_settings(self) -> Dict[str, Any]:
+        cursor = self.conn.cursor()
+        settings = {}
+        for pragma in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'foreign_keys'):
+            cursor.execute(f"PRAGMA {pragma}")
+            settings[pragma] = cursor.fetchone()[0]
+        return settings
+    
+    def subscribe(self, listener: ChangeListener):
+        self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: ChangeListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _notify(self, entity: str, ids: Iterable[Optional[int]]):
+        # Вызывается после фиксации записи; добавленные, измененные и удаленные строки
+        # не различаются — слушатель сам перечитывает их по id
+        ids = [row_id for row_id in ids if row_id is not None]
+        if not ids:
+            return
+        self._versions[entity] = self._versions.get(entity, 0) + 1
+        for listener in list(self._listeners):
+            try:
+                listener(entity, ids)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике изменений {entity}: {e}")
+    
+    def _cached_reference(self, key: Tuple, entities: Iterable[str], loader: Callable[[], Any]) -> Any:
+        # PRAGMA data_version меняется при фиксации записи другим подключением (например, импортом
+        # из командной строки), версии сущностей — при записи через это подключение
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA data_version")
+        version = (cursor.fetchone()[0],) + tuple(self._versions.get(entity, 0) for entity in entities)
+        entry = self._reference_cache.pop(key, None)
+        if entry is None or entry[0] != version:
+            entry = (version, loader())
+        # Повторная вставка переносит ключ в конец: первым вытесняется давно не использованный
+        while len(self._reference_cache) >= REFERENCE_CACHE_SIZE:
+            del self._reference_cache[next(iter(self._reference_cache))]
+        self._reference_cache[key] = entry
+        return entry[1]
+    
     def create_tables(self):
         cursor = self.conn.cursor()
         
@@ -171,7 +847,70 @@ class Database:
             )
         """)
         
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'matches'")
+        matches_exist = cursor.fetchone() is not None
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS matches (
+                demand_id INTEGER NOT NULL,
+                offer_id INTEGER NOT NULL,
+                PRIMARY KEY (demand_id, offer_id),
+                FOREIGN KEY (demand_id) REFERENCES demands(id) ON DELETE CASCADE,
+                FOREIGN KEY (offer_id) REFERENCES offers(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_matches_offer ON matches(offer_id)")
+        
         self.conn.commit()
+        
+        version_before = self.get_schema_version()
+        self.apply_migrations()
+        
+        if not matches_exist:
+            self.rebuild_matches()
+        if version_before < DEAL_COMMISSIONS_VERSION:
+            self.backfill_deal_commissions()
+    
+    def get_schema_version(self) -> int:
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA user_version")
+        return cursor.fetchone()[0]
+    
+    def apply_migrations(self):
+        cursor = self.conn.cursor()
+        version = self.get_schema_version()
+        for target_version, statements in SCHEMA_MIGRATIONS:
+            if target_version <= version:
+                continue
+            try:
+                cursor.execute("BEGIN")
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(f"PRAGMA user_version = {target_version}")
+                self.conn.commit()
+                version = target_version
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                logger.error(f"Ошибка при миграции схемы до версии {target_version}: {e}")
+                raise
+    
+    def _begin_immediate(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+    
+    def _next_id(self, table: str) -> int:
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        max_id = cursor.fetchone()[0]
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+        row = cursor.fetchone()
+        return max(max_id, row[0] if row else 0) + 1
+    
+    def _existing_ids(self, table: str, ids: Iterable[int]) -> set:
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?))",
+                       (json.dumps(sorted(set(ids))),))
+        return {row[0] for row in cursor.fetchall()}
     
     def add_realtor(self, surname: str, name: str, patronymic: str, commission_share: Optional[float] = None) -> int:
         try:
@@ -186,6 +925,7 @@ class Database:
                 VALUES (?, ?, ?, ?)
             """, (surname.strip(), name.strip(), patronymic.strip(), commission_share))
             self.conn.commit()
+            self._notify('realtors', [cursor.lastrowid])
             return cursor.lastrowid
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -211,7 +951,14 @@ class Database:
                 SET surname = ?, name = ?, patronymic = ?, commission_share = ?
                 WHERE id = ?
             """, (surname.strip(), name.strip(), patronymic.strip(), commission_share, realtor_id))
+            cursor.execute("""
+                SELECT deal_id FROM deal_commissions WHERE seller_realtor_id = ?
+                UNION
+                SELECT deal_id FROM deal_commissions WHERE buyer_realtor_id = ?
+            """, (realtor_id, realtor_id))
+            self._record_deal_commissions([row[0] for row in cursor.fetchall()])
             self.conn.commit()
+            self._notify('realtors', [realtor_id])
         except sqlite3.Error as e:
             self.conn.rollback()
             logger.error(f"Ошибка при обновлении риэлтора: {e}")
@@ -234,6 +981,7 @@ class Database:
                 return False
             cursor.execute("DELETE FROM realtors WHERE id = ?", (realtor_id,))
             self.conn.commit()
+            self._notify('realtors', [realtor_id])
             return True
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -242,17 +990,48 @@ class Database:
         except ValueError as e:
             raise
     
-    def get_realtors(self, search: Optional[str] = None) -> List[Dict]:
+    def get_realtors(self, search: Optional[str] = None, limit: Optional[int] = None,
+                    after: Optional[Tuple] = None, ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        # Постраничная выборка идет в алфавитном порядке: after — ключ person_sort_key последней
+        # строки предыдущей страницы (FIRST_PERSON_KEY для первой)
         cursor = self.conn.cursor()
-        if search:
-            search_pattern = f"%{search}%"
-            cursor.execute("""
-                SELECT * FROM realtors 
-                WHERE surname LIKE ? OR name LIKE ? OR patronymic LIKE ?
-                ORDER BY surname, name, patronymic
-            """, (search_pattern, search_pattern, search_pattern))
+        match, ranked = _fts_match_expression(search, ('full_name',)) if search else (None, False)
+        order = PERSON_ORDER_SQL.format(prefix='r.')
+        if ids is not None:
+            # Точечное чтение строк по id с тем же условием поиска
+            if search and not match:
+                return []
+            fts_filter = "AND EXISTS (SELECT 1 FROM realtors_fts WHERE realtors_fts MATCH ? AND rowid = r.id)"
+            cursor.execute(f"""
+                SELECT r.* FROM realtors r
+                WHERE r.id IN (SELECT value FROM json_each(?)) {fts_filter if match else ''}
+                ORDER BY r.id
+            """, [json.dumps(sorted(set(ids)))] + ([match] if match else []))
+        elif search and not match:
+            return []
+        elif match and after is None:
+            # Без постраничной выборки результаты упорядочены по релевантности (bm25),
+            # а для коротких префиксов — по порядку добавления
+            cursor.execute(f"""
+                SELECT r.* FROM realtors_fts f
+                JOIN realtors r ON r.id = f.rowid
+                WHERE realtors_fts MATCH ?
+                ORDER BY {'f.rank' if ranked else 'f.rowid'}
+                LIMIT ?
+            """, (match, -1 if limit is None else limit))
         else:
-            cursor.execute("SELECT * FROM realtors ORDER BY surname, name, patronymic")
+            conditions, params = [], []
+            if match:
+                conditions.append("r.id IN (SELECT rowid FROM realtors_fts WHERE realtors_fts MATCH ?)")
+                params.append(match)
+            if after is not None:
+                # Индекс по выражениям SQLite не ищет по сравнению значений строк, поэтому поиск
+                # по idx_realtors_full_name начинается с фамилии, а остаток ключа проверяется фильтром
+                conditions.append(f"COALESCE(r.surname, '') >= ? AND ({order}) > (?, ?, ?, ?)")
+                params.extend([after[0], *after])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor.execute(f"SELECT r.* FROM realtors r {where} ORDER BY {order} LIMIT ?",
+                           params + [-1 if limit is None else limit])
         return [dict(row) for row in cursor.fetchall()]
     
     def get_realtor(self, realtor_id: int) -> Optional[Dict]:
@@ -282,6 +1061,7 @@ class Database:
                   patronymic.strip() if patronymic else None, 
                   phone, email))
             self.conn.commit()
+            self._notify('clients', [cursor.lastrowid])
             return cursor.lastrowid
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -316,6 +1096,7 @@ class Database:
                   patronymic.strip() if patronymic else None, 
                   phone, email, client_id))
             self.conn.commit()
+            self._notify('clients', [client_id])
         except sqlite3.Error as e:
             self.conn.rollback()
             logger.error(f"Ошибка при обновлении клиента: {e}")
@@ -338,6 +1119,7 @@ class Database:
                 return False
             cursor.execute("DELETE FROM clients WHERE id = ?", (client_id,))
             self.conn.commit()
+            self._notify('clients', [client_id])
             return True
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -346,18 +1128,48 @@ class Database:
         except ValueError as e:
             raise
     
-    def get_clients(self, search: Optional[str] = None) -> List[Dict]:
+    def get_clients(self, search: Optional[str] = None, limit: Optional[int] = None,
+                    after: Optional[Tuple] = None, ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        # Постраничная выборка идет в алфавитном порядке: after — ключ person_sort_key последней
+        # строки предыдущей страницы (FIRST_PERSON_KEY для первой)
         cursor = self.conn.cursor()
-        if search:
-            search_pattern = f"%{search}%"
-            cursor.execute("""
-                SELECT * FROM clients 
-                WHERE surname LIKE ? OR name LIKE ? OR patronymic LIKE ? 
-                   OR phone LIKE ? OR email LIKE ?
-                ORDER BY surname, name, patronymic
-            """, (search_pattern, search_pattern, search_pattern, search_pattern, search_pattern))
+        match, ranked = _fts_match_expression(search, ('full_name', 'email'), 'phone') if search else (None, False)
+        order = PERSON_ORDER_SQL.format(prefix='c.')
+        if ids is not None:
+            # Точечное чтение строк по id с тем же условием поиска
+            if search and not match:
+                return []
+            fts_filter = "AND EXISTS (SELECT 1 FROM clients_fts WHERE clients_fts MATCH ? AND rowid = c.id)"
+            cursor.execute(f"""
+                SELECT c.* FROM clients c
+                WHERE c.id IN (SELECT value FROM json_each(?)) {fts_filter if match else ''}
+                ORDER BY c.id
+            """, [json.dumps(sorted(set(ids)))] + ([match] if match else []))
+        elif search and not match:
+            return []
+        elif match and after is None:
+            # Без постраничной выборки результаты упорядочены по релевантности (bm25),
+            # а для коротких префиксов — по порядку добавления
+            cursor.execute(f"""
+                SELECT c.* FROM clients_fts f
+                JOIN clients c ON c.id = f.rowid
+                WHERE clients_fts MATCH ?
+                ORDER BY {'f.rank' if ranked else 'f.rowid'}
+                LIMIT ?
+            """, (match, -1 if limit is None else limit))
         else:
-            cursor.execute("SELECT * FROM clients ORDER BY surname, name, patronymic")
+            conditions, params = [], []
+            if match:
+                conditions.append("c.id IN (SELECT rowid FROM clients_fts WHERE clients_fts MATCH ?)")
+                params.append(match)
+            if after is not None:
+                # Индекс по выражениям SQLite не ищет по сравнению значений строк, поэтому поиск
+                # по idx_clients_full_name начинается с фамилии, а остаток ключа проверяется фильтром
+                conditions.append(f"COALESCE(c.surname, '') >= ? AND ({order}) > (?, ?, ?, ?)")
+                params.extend([after[0], *after])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor.execute(f"SELECT c.* FROM clients c {where} ORDER BY {order} LIMIT ?",
+                           params + [-1 if limit is None else limit])
         return [dict(row) for row in cursor.fetchall()]
     
     def get_client(self, client_id: int) -> Optional[Dict]:
@@ -371,13 +1183,7 @@ class Database:
                     latitude: Optional[float] = None, longitude: Optional[float] = None,
                     **kwargs) -> int:
         try:
-            if property_type not in ['apartment', 'house', 'land']:
-                raise ValueError(f"Некорректный тип объекта: {property_type}")
-            
-            if latitude is not None and (latitude < -90 or latitude > 90):
-                raise ValueError("Широта должна быть от -90 до +90")
-            if longitude is not None and (longitude < -180 or longitude > 180):
-                raise ValueError("Долгота должна быть от -180 до +180")
+            self._validate_property_fields(property_type, latitude, longitude)
             
             cursor = self.conn.cursor()
             cursor.execute("""
@@ -403,6 +1209,7 @@ class Database:
                 """, (property_id, kwargs.get('area')))
             
             self.conn.commit()
+            self._notify('properties', [property_id])
             return property_id
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -411,6 +1218,67 @@ class Database:
         except ValueError as e:
             raise
     
+    @staticmethod
+    def _validate_property_fields(property_type: str, latitude: Optional[float], longitude: Optional[float]):
+        if property_type not in PROPERTY_DETAIL_TABLES:
+            raise ValueError(f"Некорректный тип объекта: {property_type}")
+        if latitude is not None and (latitude < -90 or latitude > 90):
+            raise ValueError("Широта должна быть от -90 до +90")
+        if longitude is not None and (longitude < -180 or longitude > 180):
+            raise ValueError("Долгота должна быть от -180 до +180")
+    
+    def add_properties_bulk(self, records: Iterable[Dict], commit: bool = True) -> BulkResult:
+        records = list(records)
+        ids: List[Optional[int]] = [None] * len(records)
+        errors = []
+        valid = []
+        for index, record in enumerate(records):
+            try:
+                self._validate_property_fields(record.get('property_type'), record.get('latitude'),
+                                               record.get('longitude'))
+                valid.append((index, record))
+            except (ValueError, TypeError) as e:
+                errors.append((index, str(e)))
+        if not valid:
+            return ids, errors
+        
+        try:
+            self._begin_immediate()
+            cursor = self.conn.cursor()
+            next_id = self._next_id('properties')
+            property_rows = []
+            detail_rows = {prop_type: [] for prop_type in PROPERTY_DETAIL_TABLES}
+            for offset, (index, record) in enumerate(valid):
+                property_id = next_id + offset
+                ids[index] = property_id
+                property_type = record['property_type']
+                property_rows.append((property_id, property_type, record.get('city'), record.get('street'),
+                                      record.get('house_number'), record.get('apartment_number'),
+                                      record.get('latitude'), record.get('longitude')))
+                detail_rows[property_type].append(
+                    (property_id,) + tuple(record.get(column) for column in PROPERTY_DETAIL_COLUMNS[property_type]))
+            
+            cursor.executemany("""
+                INSERT INTO properties (id, type, city, street, house_number, apartment_number, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, property_rows)
+            for property_type, rows in detail_rows.items():
+                if not rows:
+                    continue
+                columns = PROPERTY_DETAIL_COLUMNS[property_type]
+                cursor.executemany(f"""
+                    INSERT INTO {PROPERTY_DETAIL_TABLES[property_type]} (property_id, {', '.join(columns)})
+                    VALUES ({', '.join('?' * (len(columns) + 1))})
+                """, rows)
+            if commit:
+                self.conn.commit()
+                self._notify('properties', ids)
+            return ids, errors
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пакетном добавлении объектов недвижимости: {e}")
+            raise
+    
     def update_property(self, property_id: int, city: Optional[str] = None, street: Optional[str] = None,
                        house_number: Optional[str] = None, apartment_number: Optional[str] = None,
                        latitude: Optional[float] = None, longitude: Optional[float] = None,
@@ -438,7 +1306,10 @@ class Database:
                 UPDATE lands SET area = ? WHERE property_id = ?
             """, (kwargs.get('area'), property_id))
         
+        cursor.execute("SELECT id FROM offers WHERE property_id = ?", (property_id,))
+        self._refresh_offer_matches([row[0] for row in cursor.fetchall()])
         self.conn.commit()
+        self._notify('properties', [property_id])
     
     def delete_property(self, property_id: int) -> bool:
         cursor = self.conn.cursor()
@@ -447,49 +1318,134 @@ class Database:
             return False
         cursor.execute("DELETE FROM properties WHERE id = ?", (property_id,))
         self.conn.commit()
+        self._notify('properties', [property_id])
         return True
     
     def get_properties(self, property_type: Optional[str] = None, city: Optional[str] = None,
-                      street: Optional[str] = None) -> List[Dict]:
+                      street: Optional[str] = None, limit: Optional[int] = None,
+                      after_id: Optional[int] = None, ids: Optional[Iterable[int]] = None) -> List[Dict]:
         cursor = self.conn.cursor()
-        query = "SELECT p.* FROM properties p WHERE 1=1"
+        conditions = ""
         params = []
         
         if property_type:
-            query += " AND p.type = ?"
+            conditions += " AND p.type = ?"
             params.append(property_type)
         if city:
-            query += " AND p.city LIKE ?"
+            conditions += " AND p.city LIKE ?"
             params.append(f"%{city}%")
         if street:
-            query += " AND p.street LIKE ?"
+            conditions += " AND p.street LIKE ?"
             params.append(f"%{street}%")
+        if ids is not None:
+            conditions += " AND p.id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(sorted(set(ids))))
         
-        query += " ORDER BY p.id"
-        cursor.execute(query, params)
+        cursor.execute(f"SELECT p.* FROM properties p WHERE p.id > ?{conditions} ORDER BY p.id LIMIT ?",
+                       [after_id or 0] + params + [-1 if limit is None else limit])
         properties = [dict(row) for row in cursor.fetchall()]
+        if limit is not None or ids is not None:
+            # Для страницы или набора id детали читаются только по этим id
+            self._attach_property_details(properties)
+            return properties
+        
+        details = {}
+        for prop_type, table in PROPERTY_DETAIL_TABLES.items():
+            if property_type and property_type != prop_type:
+                continue
+            cursor.execute(f"""
+                SELECT s.* FROM {table} s
+                JOIN properties p ON p.id = s.property_id
+                WHERE p.type = ? AND p.id > ?{conditions}
+            """, [prop_type, after_id or 0] + params)
+            details[prop_type] = {row['property_id']: dict(row) for row in cursor.fetchall()}
         
         for prop in properties:
-            prop_id = prop['id']
-            prop_type = prop['type']
-            if prop_type == 'apartment':
-                cursor.execute("SELECT * FROM apartments WHERE property_id = ?", (prop_id,))
-                row = cursor.fetchone()
-                if row:
-                    prop.update(dict(row))
-            elif prop_type == 'house':
-                cursor.execute("SELECT * FROM houses WHERE property_id = ?", (prop_id,))
-                row = cursor.fetchone()
-                if row:
-                    prop.update(dict(row))
-            elif prop_type == 'land':
-                cursor.execute("SELECT * FROM lands WHERE property_id = ?", (prop_id,))
-                row = cursor.fetchone()
-                if row:
-                    prop.update(dict(row))
+            row = details.get(prop['type'], {}).get(prop['id'])
+            if row:
+                prop.update(row)
         
         return properties
     
+    def _attach_property_details(self, properties: List[Dict]):
+        cursor = self.conn.cursor()
+        for prop_type, table in PROPERTY_DETAIL_TABLES.items():
+            ids = [prop['id'] for prop in properties if prop['type'] == prop_type]
+            if not ids:
+                continue
+            cursor.execute(f"SELECT * FROM {table} WHERE property_id IN (SELECT value FROM json_each(?))",
+                           (json.dumps(ids),))
+            details = {row['property_id']: dict(row) for row in cursor.fetchall()}
+            for prop in properties:
+                row = details.get(prop['id']) if prop['type'] == prop_type else None
+                if row:
+                    prop.update(row)
+    
+    def _points_in_boxes(self, boxes: List[Tuple[float, float, float, float]],
+                         property_type: Optional[str] = None) -> List[Tuple[int, float, float]]:
+        # Кандидаты из R*Tree с точными координатами из properties; CROSS JOIN закрепляет
+        # порядок соединения, чтобы фильтр по типу не увел план на индекс по type
+        cursor = self.conn.cursor()
+        type_filter = "AND p.type = ?" if property_type else ""
+        points = []
+        for min_lat, max_lat, min_lon, max_lon in boxes:
+            cursor.execute(f"""
+                SELECT p.id, p.latitude, p.longitude
+                FROM properties_geo g CROSS JOIN properties p ON p.id = g.id
+                WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ? {type_filter}
+            """, [min_lat, max_lat, min_lon, max_lon] + ([property_type] if property_type else []))
+            points.extend(row for row in cursor.fetchall()
+                          if min_lat <= row[1] <= max_lat and min_lon <= row[2] <= max_lon)
+        return points
+    
+    def _distances_within(self, latitude: float, longitude: float, radius_km: float,
+                          property_type: Optional[str] = None) -> Dict[int, float]:
+        # id объектов в радиусе -> расстояние, км
+        distances = {}
+        for property_id, lat, lon in self._points_in_boxes(_radius_boxes(latitude, longitude, radius_km),
+                                                           property_type):
+            distance = haversine_km(latitude, longitude, lat, lon)
+            if distance <= radius_km:
+                distances[property_id] = distance
+        return distances
+    
+    @staticmethod
+    def _validate_point(latitude: float, longitude: float):
+        if not -90 <= latitude <= 90:
+            raise ValueError("Широта должна быть в диапазоне от -90 до 90")
+        if not -180 <= longitude <= 180:
+            raise ValueError("Долгота должна быть в диапазоне от -180 до 180")
+    
+    def find_properties_in_box(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                               property_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        # Прямоугольник с min_lon > max_lon пересекает 180-й меридиан
+        self._validate_point(min_lat, min_lon)
+        self._validate_point(max_lat, max_lon)
+        if min_lat > max_lat:
+            raise ValueError("Минимальная широта больше максимальной")
+        if min_lon <= max_lon:
+            boxes = [(min_lat, max_lat, min_lon, max_lon)]
+        else:
+            boxes = [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+        ids = sorted(point[0] for point in self._points_in_boxes(boxes, property_type))
+        return self.get_properties(ids=ids[:limit] if limit is not None else ids)
+    
+    def find_properties_near(self, latitude: float, longitude: float, radius_km: float,
+                             property_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        # Отбор по описанному прямоугольнику через R*Tree, затем точное расстояние по гаверсинусу;
+        # результат упорядочен по удаленности, расстояние — в поле distance_km
+        self._validate_point(latitude, longitude)
+        if radius_km < 0:
+            raise ValueError("Радиус поиска не может быть отрицательным")
+        distances = self._distances_within(latitude, longitude, radius_km, property_type)
+        nearest = sorted(distances, key=lambda property_id: (distances[property_id], property_id))
+        if limit is not None:
+            nearest = nearest[:limit]
+        properties = {prop['id']: prop for prop in self.get_properties(ids=nearest)}
+        for property_id in nearest:
+            properties[property_id]['distance_km'] = distances[property_id]
+        return [properties[property_id] for property_id in nearest]
+    
     def get_property(self, property_id: int) -> Optional[Dict]:
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM properties WHERE id = ?", (property_id,))
@@ -521,10 +1477,7 @@ class Database:
     def add_offer(self, client_id: int, realtor_id: int, property_id: int, price: int, rental_period: int) -> int:
         try:
             cursor = self.conn.cursor()
-            if price <= 0:
-                raise ValueError("Цена должна быть положительным числом")
-            if rental_period <= 0:
-                raise ValueError("Срок сдачи должен быть положительным числом")
+            self._validate_offer_fields(price, rental_period)
             
             cursor.execute("SELECT id FROM clients WHERE id = ?", (client_id,))
             if not cursor.fetchone():
@@ -539,11 +1492,14 @@ class Database:
                 raise ValueError(f"Объект недвижимости с ID {property_id} не найден")
             
             cursor.execute("""
-                INSERT INTO offers (client_id, realtor_id, property_id, price, rental_period)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO offers (client_id, realtor_id, property_id, price, rental_period, created_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
             """, (client_id, realtor_id, property_id, price, rental_period))
+            offer_id = cursor.lastrowid
+            self._refresh_offer_matches([offer_id])
             self.conn.commit()
-            return cursor.lastrowid
+            self._notify('offers', [offer_id])
+            return offer_id
         except sqlite3.Error as e:
             self.conn.rollback()
             logger.error(f"Ошибка при добавлении предложения: {e}")
@@ -551,6 +1507,59 @@ class Database:
         except ValueError as e:
             raise
     
+    @staticmethod
+    def _validate_offer_fields(price: int, rental_period: int):
+        if price <= 0:
+            raise ValueError("Цена должна быть положительным числом")
+        if rental_period <= 0:
+            raise ValueError("Срок сдачи должен быть положительным числом")
+    
+    def add_offers_bulk(self, records: Iterable[Dict], commit: bool = True) -> BulkResult:
+        records = list(records)
+        ids: List[Optional[int]] = [None] * len(records)
+        errors = []
+        
+        try:
+            self._begin_immediate()
+            clients = self._existing_ids('clients', (r.get('client_id') for r in records if isinstance(r.get('client_id'), int)))
+            realtors = self._existing_ids('realtors', (r.get('realtor_id') for r in records if isinstance(r.get('realtor_id'), int)))
+            properties = self._existing_ids('properties', (r.get('property_id') for r in records if isinstance(r.get('property_id'), int)))
+            
+            valid = []
+            for index, record in enumerate(records):
+                try:
+                    self._validate_offer_fields(record.get('price'), record.get('rental_period'))
+                    if record.get('client_id') not in clients:
+                        raise ValueError(f"Клиент с ID {record.get('client_id')} не найден")
+                    if record.get('realtor_id') not in realtors:
+                        raise ValueError(f"Риэлтор с ID {record.get('realtor_id')} не найден")
+                    if record.get('property_id') not in properties:
+                        raise ValueError(f"Объект недвижимости с ID {record.get('property_id')} не найден")
+                    valid.append((index, record))
+                except (ValueError, TypeError) as e:
+                    errors.append((index, str(e)))
+            
+            cursor = self.conn.cursor()
+            next_id = self._next_id('offers')
+            rows = []
+            for offset, (index, record) in enumerate(valid):
+                ids[index] = next_id + offset
+                rows.append((next_id + offset, record['client_id'], record['realtor_id'], record['property_id'],
+                             record['price'], record['rental_period']))
+            cursor.executemany("""
+                INSERT INTO offers (id, client_id, realtor_id, property_id, price, rental_period, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, rows)
+            self._refresh_offer_matches([row[0] for row in rows])
+            if commit:
+                self.conn.commit()
+                self._notify('offers', ids)
+            return ids, errors
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пакетном добавлении предложений: {e}")
+            raise
+    
     def update_offer(self, offer_id: int, client_id: int, realtor_id: int, property_id: int, price: int, rental_period: int):
         try:
             cursor = self.conn.cursor()
@@ -558,10 +1567,7 @@ class Database:
             if not cursor.fetchone():
                 raise ValueError(f"Предложение с ID {offer_id} не найдено")
             
-            if price <= 0:
-                raise ValueError("Цена должна быть положительным числом")
-            if rental_period <= 0:
-                raise ValueError("Срок сдачи должен быть положительным числом")
+            self._validate_offer_fields(price, rental_period)
             
             cursor.execute("SELECT id FROM clients WHERE id = ?", (client_id,))
             if not cursor.fetchone():
@@ -580,7 +1586,11 @@ class Database:
                 SET client_id = ?, realtor_id = ?, property_id = ?, price = ?, rental_period = ?
                 WHERE id = ?
             """, (client_id, realtor_id, property_id, price, rental_period, offer_id))
+            self._refresh_offer_matches([offer_id])
+            cursor.execute("SELECT id FROM deals WHERE offer_id = ?", (offer_id,))
+            self._record_deal_commissions([row[0] for row in cursor.fetchall()])
             self.conn.commit()
+            self._notify('offers', [offer_id])
         except sqlite3.Error as e:
             self.conn.rollback()
             logger.error(f"Ошибка при обновлении предложения: {e}")
@@ -598,8 +1608,10 @@ class Database:
             cursor.execute("SELECT COUNT(*) FROM deals WHERE offer_id = ?", (offer_id,))
             if cursor.fetchone()[0] > 0:
                 return False
+            cursor.execute("DELETE FROM matches WHERE offer_id = ?", (offer_id,))
             cursor.execute("DELETE FROM offers WHERE id = ?", (offer_id,))
             self.conn.commit()
+            self._notify('offers', [offer_id])
             return True
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -608,9 +1620,11 @@ class Database:
         except ValueError as e:
             raise
     
-    def get_offers(self) -> List[Dict]:
+    def get_offers(self, limit: Optional[int] = None, after_id: Optional[int] = None,
+                   ids: Optional[Iterable[int]] = None) -> List[Dict]:
         cursor = self.conn.cursor()
-        cursor.execute("""
+        id_filter = "AND o.id IN (SELECT value FROM json_each(?))" if ids is not None else ""
+        cursor.execute(f"""
                 SELECT o.*, 
                    c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
                    r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
@@ -619,8 +1633,11 @@ class Database:
             LEFT JOIN clients c ON o.client_id = c.id
             LEFT JOIN realtors r ON o.realtor_id = r.id
             LEFT JOIN properties p ON o.property_id = p.id
+            WHERE o.id > ? {id_filter}
             ORDER BY o.id
-        """)
+            LIMIT ?
+        """, [after_id or 0] + ([json.dumps(sorted(set(ids)))] if ids is not None else [])
+              + [-1 if limit is None else limit])
         return [dict(row) for row in cursor.fetchall()]
     
     def get_offer(self, offer_id: int) -> Optional[Dict]:
@@ -660,15 +1677,18 @@ class Database:
     def add_demand(self, client_id: int, realtor_id: int, property_type: str,
                    city: Optional[str], street: Optional[str], house_number: Optional[str],
                    apartment_number: Optional[str], min_price: int, max_price: int,
-                   min_rental_period: int, max_rental_period: int, **kwargs) -> int:
+                   min_rental_period: int, max_rental_period: int, latitude: Optional[float] = None,
+                   longitude: Optional[float] = None, radius_km: Optional[float] = None, **kwargs) -> int:
+        self._validate_demand_area(latitude, longitude, radius_km)
         cursor = self.conn.cursor()
         cursor.execute("""
             INSERT INTO demands (client_id, realtor_id, property_type, city, street, 
                                house_number, apartment_number, min_price, max_price,
-                               min_rental_period, max_rental_period)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               min_rental_period, max_rental_period, latitude, longitude, radius_km, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
         """, (client_id, realtor_id, property_type, city, street, house_number, 
-              apartment_number, min_price, max_price, min_rental_period, max_rental_period))
+              apartment_number, min_price, max_price, min_rental_period, max_rental_period,
+              latitude, longitude, radius_km))
         demand_id = cursor.lastrowid
         
         if property_type == 'apartment':
@@ -691,22 +1711,122 @@ class Database:
                 VALUES (?, ?, ?)
             """, (demand_id, kwargs.get('min_area'), kwargs.get('max_area')))
         
+        self._refresh_demand_matches([demand_id])
         self.conn.commit()
+        self._notify('demands', [demand_id])
         return demand_id
     
+    @staticmethod
+    def _validate_demand_fields(property_type: str, min_price: int, max_price: int,
+                                min_rental_period: int, max_rental_period: int, details: Dict):
+        if property_type not in DEMAND_DETAIL_TABLES:
+            raise ValueError(f"Некорректный тип объекта: {property_type}")
+        if min_price <= 0 or max_price <= 0:
+            raise ValueError("Цена должна быть положительным числом")
+        if max_price < min_price:
+            raise ValueError("Максимальная цена должна быть больше или равна минимальной")
+        if min_rental_period <= 0 or max_rental_period <= 0:
+            raise ValueError("Срок аренды должен быть положительным числом")
+        if max_rental_period < min_rental_period:
+            raise ValueError("Максимальный срок должен быть больше или равен минимальному")
+        columns = DEMAND_DETAIL_COLUMNS[property_type]
+        for min_column, max_column in zip(columns[::2], columns[1::2]):
+            low, high = details.get(min_column), details.get(max_column)
+            if low is not None and high is not None and high < low:
+                raise ValueError(f"Значение {max_column} должно быть больше или равно {min_column}")
+        Database._validate_demand_area(details.get('latitude'), details.get('longitude'), details.get('radius_km'))
+    
+    @staticmethod
+    def _validate_demand_area(latitude: Optional[float], longitude: Optional[float], radius_km: Optional[float]):
+        if latitude is None and longitude is None and radius_km is None:
+            return
+        if latitude is None or longitude is None or radius_km is None:
+            raise ValueError("Для поиска по району укажите широту, долготу и радиус")
+        Database._validate_point(latitude, longitude)
+        if radius_km <= 0:
+            raise ValueError("Радиус поиска должен быть положительным числом")
+    
+    def add_demands_bulk(self, records: Iterable[Dict], commit: bool = True) -> BulkResult:
+        records = list(records)
+        ids: List[Optional[int]] = [None] * len(records)
+        errors = []
+        
+        try:
+            self._begin_immediate()
+            clients = self._existing_ids('clients', (r.get('client_id') for r in records if isinstance(r.get('client_id'), int)))
+            realtors = self._existing_ids('realtors', (r.get('realtor_id') for r in records if isinstance(r.get('realtor_id'), int)))
+            
+            valid = []
+            for index, record in enumerate(records):
+                try:
+                    self._validate_demand_fields(record.get('property_type'), record.get('min_price'),
+                                                 record.get('max_price'), record.get('min_rental_period'),
+                                                 record.get('max_rental_period'), record)
+                    if record.get('client_id') not in clients:
+                        raise ValueError(f"Клиент с ID {record.get('client_id')} не найден")
+                    if record.get('realtor_id') not in realtors:
+                        raise ValueError(f"Риэлтор с ID {record.get('realtor_id')} не найден")
+                    valid.append((index, record))
+                except (ValueError, TypeError) as e:
+                    errors.append((index, str(e)))
+            
+            cursor = self.conn.cursor()
+            next_id = self._next_id('demands')
+            demand_rows = []
+            detail_rows = {prop_type: [] for prop_type in DEMAND_DETAIL_TABLES}
+            for offset, (index, record) in enumerate(valid):
+                demand_id = next_id + offset
+                ids[index] = demand_id
+                property_type = record['property_type']
+                demand_rows.append((demand_id, record['client_id'], record['realtor_id'], property_type,
+                                    record.get('city'), record.get('street'), record.get('house_number'),
+                                    record.get('apartment_number'), record['min_price'], record['max_price'],
+                                    record['min_rental_period'], record['max_rental_period'],
+                                    record.get('latitude'), record.get('longitude'), record.get('radius_km')))
+                detail_rows[property_type].append(
+                    (demand_id,) + tuple(record.get(column) for column in DEMAND_DETAIL_COLUMNS[property_type]))
+            
+            cursor.executemany("""
+                INSERT INTO demands (id, client_id, realtor_id, property_type, city, street,
+                                     house_number, apartment_number, min_price, max_price,
+                                     min_rental_period, max_rental_period, latitude, longitude, radius_km,
+                                     created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, demand_rows)
+            for property_type, rows in detail_rows.items():
+                if not rows:
+                    continue
+                columns = DEMAND_DETAIL_COLUMNS[property_type]
+                cursor.executemany(f"""
+                    INSERT INTO {DEMAND_DETAIL_TABLES[property_type]} (demand_id, {', '.join(columns)})
+                    VALUES ({', '.join('?' * (len(columns) + 1))})
+                """, rows)
+            self._refresh_demand_matches([row[0] for row in demand_rows])
+            if commit:
+                self.conn.commit()
+                self._notify('demands', ids)
+            return ids, errors
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пакетном добавлении потребностей: {e}")
+            raise
+    
     def update_demand(self, demand_id: int, client_id: int, realtor_id: int, property_type: str,
                      city: Optional[str], street: Optional[str], house_number: Optional[str],
                      apartment_number: Optional[str], min_price: int, max_price: int,
-                     min_rental_period: int, max_rental_period: int, **kwargs):
+                     min_rental_period: int, max_rental_period: int, latitude: Optional[float] = None,
+                     longitude: Optional[float] = None, radius_km: Optional[float] = None, **kwargs):
+        self._validate_demand_area(latitude, longitude, radius_km)
         cursor = self.conn.cursor()
         cursor.execute("""
             UPDATE demands 
             SET client_id = ?, realtor_id = ?, property_type = ?, city = ?, street = ?,
                 house_number = ?, apartment_number = ?, min_price = ?, max_price = ?,
-                min_rental_period = ?, max_rental_period = ?
+                min_rental_period = ?, max_rental_period = ?, latitude = ?, longitude = ?, radius_km = ?
             WHERE id = ?
         """, (client_id, realtor_id, property_type, city, street, house_number,
-              apartment_number, min_price, max_price, min_rental_period, max_rental_period, demand_id))
+              apartment_number, min_price, max_price, min_rental_period, max_rental_period,
+              latitude, longitude, radius_km, demand_id))
         
         if property_type == 'apartment':
             cursor.execute("""
@@ -731,50 +1851,64 @@ class Database:
                 WHERE demand_id = ?
             """, (kwargs.get('min_area'), kwargs.get('max_area'), demand_id))
         
+        self._refresh_demand_matches([demand_id])
+        cursor.execute("SELECT id FROM deals WHERE demand_id = ?", (demand_id,))
+        self._record_deal_commissions([row[0] for row in cursor.fetchall()])
         self.conn.commit()
+        self._notify('demands', [demand_id])
     
     def delete_demand(self, demand_id: int) -> bool:
         cursor = self.conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM deals WHERE demand_id = ?", (demand_id,))
         if cursor.fetchone()[0] > 0:
             return False
+        cursor.execute("DELETE FROM matches WHERE demand_id = ?", (demand_id,))
         cursor.execute("DELETE FROM demands WHERE id = ?", (demand_id,))
         self.conn.commit()
+        self._notify('demands', [demand_id])
         return True
     
-    def get_demands(self) -> List[Dict]:
+    def get_demands(self, limit: Optional[int] = None, after_id: Optional[int] = None,
+                    ids: Optional[Iterable[int]] = None) -> List[Dict]:
         cursor = self.conn.cursor()
-        cursor.execute("""
+        id_filter = "AND d.id IN (SELECT value FROM json_each(?))" if ids is not None else ""
+        cursor.execute(f"""
             SELECT d.*, 
                    c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
                    r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name
             FROM demands d
             LEFT JOIN clients c ON d.client_id = c.id
             LEFT JOIN realtors r ON d.realtor_id = r.id
+            WHERE d.id > ? {id_filter}
             ORDER BY d.id
-        """)
+            LIMIT ?
+        """, [after_id or 0] + ([json.dumps(sorted(set(ids)))] if ids is not None else [])
+              + [-1 if limit is None else limit])
         demands = [dict(row) for row in cursor.fetchall()]
+        # Без ограничений выборки детали читаются целиком по типу, а не по списку id
+        self._attach_demand_details(demands, (after_id or 0) if limit is None and ids is None else None)
+        return demands
+    
+    def _attach_demand_details(self, demands: List[Dict], scan_after_id: Optional[int] = None):
+        cursor = self.conn.cursor()
+        details = {}
+        for prop_type, table in DEMAND_DETAIL_TABLES.items():
+            if scan_after_id is not None:
+                cursor.execute(f"""
+                    SELECT s.* FROM {table} s
+                    JOIN demands d ON d.id = s.demand_id
+                    WHERE d.property_type = ? AND d.id > ?
+                """, (prop_type, scan_after_id))
+            else:
+                cursor.execute(f"SELECT * FROM {table} WHERE demand_id IN (SELECT value FROM json_each(?))",
+                               (json.dumps([demand['id'] for demand in demands
+                                            if demand['property_type'] == prop_type]),))
+            details[prop_type] = {row['demand_id']: dict(row) for row in cursor.fetchall()}
         
         for demand in demands:
-            demand_id = demand['id']
-            prop_type = demand['property_type']
-            if prop_type == 'apartment':
-                cursor.execute("SELECT * FROM apartment_demands WHERE demand_id = ?", (demand_id,))
-                row = cursor.fetchone()
-                if row:
-                    demand.update(dict(row))
-            elif prop_type == 'house':
-                cursor.execute("SELECT * FROM house_demands WHERE demand_id = ?", (demand_id,))
-                row = cursor.fetchone()
-                if row:
-                    demand.update(dict(row))
-            elif prop_type == 'land':
-                cursor.execute("SELECT * FROM land_demands WHERE demand_id = ?", (demand_id,))
-                row = cursor.fetchone()
-                if row:
-                    demand.update(dict(row))
-        
-        return demands
+            row = details.get(demand['property_type'], {}).get(demand['id'])
+            if row:
+                demand.update(row)
     
     def get_demand(self, demand_id: int) -> Optional[Dict]:
         cursor = self.conn.cursor()
@@ -836,8 +1970,12 @@ class Database:
                 INSERT INTO deals (demand_id, offer_id)
                 VALUES (?, ?)
             """, (demand_id, offer_id))
+            deal_id = cursor.lastrowid
+            cursor.execute("DELETE FROM matches WHERE demand_id = ? OR offer_id = ?", (demand_id, offer_id))
+            self._record_deal_commissions([deal_id])
             self.conn.commit()
-            return cursor.lastrowid
+            self._notify('deals', [deal_id])
+            return deal_id
         except sqlite3.Error as e:
             self.conn.rollback()
             logger.error(f"Ошибка при добавлении сделки: {e}")
@@ -845,23 +1983,105 @@ class Database:
         except ValueError as e:
             raise
     
+    def add_deals_bulk(self, records: Iterable[Dict], commit: bool = True) -> BulkResult:
+        # Пакет сделок (например, из DealAssignment.propose): записи с demand_id и offer_id;
+        # занятые потребности и предложения, в том числе повторы внутри пакета, — ошибки записей
+        records = list(records)
+        ids: List[Optional[int]] = [None] * len(records)
+        errors = []
+        
+        try:
+            self._begin_immediate()
+            demands = self._existing_ids('demands', (r.get('demand_id') for r in records if isinstance(r.get('demand_id'), int)))
+            offers = self._existing_ids('offers', (r.get('offer_id') for r in records if isinstance(r.get('offer_id'), int)))
+            cursor = self.conn.cursor()
+            # Занятость проверяется только для id пакета (UNIQUE-индексы deals), а не по всей истории сделок
+            cursor.execute("SELECT demand_id FROM deals WHERE demand_id IN (SELECT value FROM json_each(?))",
+                           (json.dumps(sorted(demands)),))
+            busy_demands = {row[0] for row in cursor.fetchall()}
+            cursor.execute("SELECT offer_id FROM deals WHERE offer_id IN (SELECT value FROM json_each(?))",
+                           (json.dumps(sorted(offers)),))
+            busy_offers = {row[0] for row in cursor.fetchall()}
+        
+            valid = []
+            for index, record in enumerate(records):
+                demand_id, offer_id = record.get('demand_id'), record.get('offer_id')
+                if demand_id not in demands:
+                    errors.append((index, f"Потребность с ID {demand_id} не найдена"))
+                elif offer_id not in offers:
+                    errors.append((index, f"Предложение с ID {offer_id} не найдено"))
+                elif demand_id in busy_demands:
+                    errors.append((index, f"Потребность с ID {demand_id} уже удовлетворена"))
+                elif offer_id in busy_offers:
+                    errors.append((index, f"Предложение с ID {offer_id} уже удовлетворено"))
+                else:
+                    busy_demands.add(demand_id)
+                    busy_offers.add(offer_id)
+                    valid.append((index, demand_id, offer_id))
+        
+            next_id = self._next_id('deals')
+            rows = []
+            for offset, (index, demand_id, offer_id) in enumerate(valid):
+                ids[index] = next_id + offset
+                rows.append((next_id + offset, demand_id, offer_id))
+            cursor.executemany("INSERT INTO deals (id, demand_id, offer_id) VALUES (?, ?, ?)", rows)
+            cursor.execute("DELETE FROM matches WHERE demand_id IN (SELECT value FROM json_each(?))",
+                           (json.dumps([row[1] for row in rows]),))
+            cursor.execute("DELETE FROM matches WHERE offer_id IN (SELECT value FROM json_each(?))",
+                           (json.dumps([row[2] for row in rows]),))
+            self._record_deal_commissions([row[0] for row in rows])
+            if commit:
+                self.conn.commit()
+                self._notify('deals', [row[0] for row in rows])
+            return ids, errors
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пакетном добавлении сделок: {e}")
+            raise
+    
     def update_deal(self, deal_id: int, demand_id: int, offer_id: int):
         cursor = self.conn.cursor()
+        cursor.execute("SELECT demand_id, offer_id FROM deals WHERE id = ?", (deal_id,))
+        old = cursor.fetchone()
         cursor.execute("""
             UPDATE deals 
             SET demand_id = ?, offer_id = ?
             WHERE id = ?
         """, (demand_id, offer_id, deal_id))
+        if old:
+            self._refresh_demand_matches([old['demand_id']])
+            self._refresh_offer_matches([old['offer_id']])
+        cursor.execute("DELETE FROM matches WHERE demand_id = ? OR offer_id = ?", (demand_id, offer_id))
+        self._record_deal_commissions([deal_id])
         self.conn.commit()
+        self._notify('deals', [deal_id])
     
     def delete_deal(self, deal_id: int):
         cursor = self.conn.cursor()
+        cursor.execute("SELECT demand_id, offer_id FROM deals WHERE id = ?", (deal_id,))
+        old = cursor.fetchone()
+        cursor.execute("DELETE FROM deal_commissions WHERE deal_id = ?", (deal_id,))
         cursor.execute("DELETE FROM deals WHERE id = ?", (deal_id,))
+        if old:
+            self._refresh_demand_matches([old['demand_id']])
+            self._refresh_offer_matches([old['offer_id']])
         self.conn.commit()
+        self._notify('deals', [deal_id])
     
-    def get_deals(self) -> List[Dict]:
+    def get_deals(self, limit: Optional[int] = None, before_id: Optional[int] = None,
+                  ids: Optional[Iterable[int]] = None) -> List[Dict]:
         cursor = self.conn.cursor()
-        cursor.execute("""
+        conditions, params = [], []
+        if before_id is not None:
+            conditions.append("d.id < ?")
+            params.append(before_id)
+        if ids is not None:
+            conditions.append("d.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(set(ids))))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Постраничная выборка идет от новых сделок к старым: id растет вместе с created_at
+        order = "d.created_at DESC" if limit is None and before_id is None else "d.id DESC"
+        cursor.execute(f"""
             SELECT d.*,
                    dem.client_id as demand_client_id,
                    dem.realtor_id as demand_realtor_id,
@@ -873,10 +2093,164 @@ class Database:
             FROM deals d
             LEFT JOIN demands dem ON d.demand_id = dem.id
             LEFT JOIN offers off ON d.offer_id = off.id
-            ORDER BY d.created_at DESC
-        """)
+            {where}
+            ORDER BY {order}
+            LIMIT ?
+        """, params + [-1 if limit is None else limit])
         return [dict(row) for row in cursor.fetchall()]
     
+    def get_deal_commission_inputs(self, deal_ids: Optional[List[int]] = None) -> Dict[str, List]:
+        cursor = self.conn.cursor()
+        where = "WHERE d.id IN (SELECT value FROM json_each(?))" if deal_ids is not None else ""
+        cursor.execute(f"""
+            SELECT d.id as deal_id, d.created_at,
+                   COALESCE(p.type, 'apartment') as property_type,
+                   off.price,
+                   off.realtor_id as seller_realtor_id,
+                   dem.realtor_id as buyer_realtor_id,
+                   sr.commission_share as seller_commission_share,
+                   br.commission_share as buyer_commission_share,
+                   julianday(d.created_at) - julianday(off.created_at) as offer_days_to_close,
+                   julianday(d.created_at) - julianday(dem.created_at) as demand_days_to_close
+            FROM deals d
+            LEFT JOIN demands dem ON d.demand_id = dem.id
+            LEFT JOIN offers off ON d.offer_id = off.id
+            LEFT JOIN properties p ON off.property_id = p.id
+            LEFT JOIN realtors sr ON off.realtor_id = sr.id
+            LEFT JOIN realtors br ON dem.realtor_id = br.id
+            {where}
+            ORDER BY d.id
+        """, (json.dumps(list(deal_ids)),) if deal_ids is not None else ())
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        return {column: [row[index] for row in rows] for index, column in enumerate(columns)}
+    
+    def _record_deal_commissions(self, deal_ids: Optional[List[int]] = None) -> int:
+        if deal_ids is not None and not deal_ids:
+            return 0
+        inputs = self.get_deal_commission_inputs(deal_ids)
+        commissions = CommissionCalculator.calculate_commissions_batch(
+            inputs['property_type'], inputs['price'],
+            inputs['seller_commission_share'], inputs['buyer_commission_share']
+        )
+        cursor = self.conn.cursor()
+        if deal_ids is None:
+            cursor.execute("DELETE FROM deal_commissions")
+        # UPSERT вместо INSERT OR REPLACE: замена строки должна вызывать триггер UPDATE для сводных таблиц
+        cursor.executemany("""
+            INSERT INTO deal_commissions
+                (deal_id, created_at, property_type, price, seller_realtor_id, buyer_realtor_id,
+                 offer_days_to_close, demand_days_to_close,
+                 seller_commission, buyer_commission, seller_realtor_share, buyer_realtor_share, company_share)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (deal_id) DO UPDATE SET
+                created_at = excluded.created_at, property_type = excluded.property_type,
+                price = excluded.price, seller_realtor_id = excluded.seller_realtor_id,
+                buyer_realtor_id = excluded.buyer_realtor_id,
+                offer_days_to_close = excluded.offer_days_to_close,
+                demand_days_to_close = excluded.demand_days_to_close,
+                seller_commission = excluded.seller_commission, buyer_commission = excluded.buyer_commission,
+                seller_realtor_share = excluded.seller_realtor_share,
+                buyer_realtor_share = excluded.buyer_realtor_share, company_share = excluded.company_share
+        """, zip(inputs['deal_id'], inputs['created_at'], inputs['property_type'], inputs['price'],
+                 inputs['seller_realtor_id'], inputs['buyer_realtor_id'],
+                 inputs['offer_days_to_close'], inputs['demand_days_to_close'],
+                 *(commissions[field] for field in COMMISSION_FIELDS)))
+        return len(inputs['deal_id'])
+    
+    def backfill_deal_commissions(self) -> int:
+        try:
+            count = self._record_deal_commissions()
+            self.conn.commit()
+            return count
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пересчете комиссий по сделкам: {e}")
+            raise
+    
+    def rebuild_rollups(self):
+        try:
+            cursor = self.conn.cursor()
+            for statement in ROLLUP_REBUILD_SQL:
+                cursor.execute(statement)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пересчете сводных таблиц: {e}")
+            raise
+    
+    def get_deal_commissions(self, deal_id: int) -> Optional[Dict]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM deal_commissions WHERE deal_id = ?", (deal_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def _period_filter(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, list]:
+        conditions, params = [], []
+        if date_from:
+            conditions.append("created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("created_at < ?")
+            params.append(date_to)
+        return "".join(f" AND {condition}" for condition in conditions), params
+    
+    def get_realtor_payouts(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                            by_month: bool = False) -> List[Dict]:
+        # Риэлтор получает долю со стороны продавца и/или покупателя;
+        # каждая сторона выбирается по своему индексу (realtor_id, created_at)
+        period, params = self._period_filter(date_from, date_to)
+        month = "strftime('%Y-%m', created_at)" if by_month else "NULL"
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT s.realtor_id,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   s.month,
+                   COUNT(*) as deals_count,
+                   ROUND(SUM(s.share), 2) as payout
+            FROM (
+                SELECT seller_realtor_id as realtor_id, {month} as month, seller_realtor_share as share
+                FROM deal_commissions
+                WHERE seller_realtor_id IS NOT NULL{period}
+                UNION ALL
+                SELECT buyer_realtor_id, {month}, buyer_realtor_share
+                FROM deal_commissions
+                WHERE buyer_realtor_id IS NOT NULL{period}
+            ) s
+            LEFT JOIN realtors r ON r.id = s.realtor_id
+            GROUP BY s.realtor_id, s.month
+            ORDER BY s.month, s.realtor_id
+        """, params * 2)
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_realtor_payout(self, realtor_id: int, date_from: Optional[str] = None,
+                           date_to: Optional[str] = None) -> Dict:
+        period, params = self._period_filter(date_from, date_to)
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) as deals_count, ROUND(COALESCE(SUM(share), 0), 2) as payout
+            FROM (
+                SELECT seller_realtor_share as share FROM deal_commissions
+                WHERE seller_realtor_id = ?{period}
+                UNION ALL
+                SELECT buyer_realtor_share FROM deal_commissions
+                WHERE buyer_realtor_id = ?{period}
+            )
+        """, [realtor_id] + params + [realtor_id] + params)
+        row = dict(cursor.fetchone())
+        row['realtor_id'] = realtor_id
+        return row
+    
+    def get_company_income(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> float:
+        period, params = self._period_filter(date_from, date_to)
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT ROUND(COALESCE(SUM(company_share), 0), 2) FROM deal_commissions
+            WHERE 1 = 1{period}
+        """, params)
+        return cursor.fetchone()[0]
+    
     def get_deal(self, deal_id: int) -> Optional[Dict]:
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -904,47 +2278,470 @@ class Database:
     
     def is_demand_satisfied(self, demand_id: int) -> bool:
         cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM deals WHERE demand_id = ?", (demand_id,))
-        return cursor.fetchone()[0] > 0
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM deals WHERE demand_id = ?)", (demand_id,))
+        return bool(cursor.fetchone()[0])
     
     def is_offer_satisfied(self, offer_id: int) -> bool:
         cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM deals WHERE offer_id = ?", (offer_id,))
-        return cursor.fetchone()[0] > 0
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM deals WHERE offer_id = ?)", (offer_id,))
+        return bool(cursor.fetchone()[0])
+    
+    def get_open_offers(self, property_type: Optional[str] = None, min_price: Optional[int] = None,
+                        max_price: Optional[int] = None, limit: Optional[int] = None,
+                        after_id: Optional[int] = None) -> List[Dict]:
+        # Предложения без сделок одним запросом: анти-соединение по уникальному индексу deals(offer_id)
+        conditions, params = ["o.id > ?", "NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id)"], [after_id or 0]
+        if property_type:
+            conditions.append("p.type = ?")
+            params.append(property_type)
+        if min_price is not None:
+            conditions.append("o.price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("o.price <= ?")
+            params.append(max_price)
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT o.*,
+                   c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   p.type as property_type
+            FROM offers o
+            JOIN properties p ON o.property_id = p.id
+            LEFT JOIN clients c ON o.client_id = c.id
+            LEFT JOIN realtors r ON o.realtor_id = r.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY o.id
+            LIMIT ?
+        """, params + [-1 if limit is None else limit])
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_open_demands(self, property_type: Optional[str] = None, min_price: Optional[int] = None,
+                         max_price: Optional[int] = None, limit: Optional[int] = None,
+                         after_id: Optional[int] = None) -> List[Dict]:
+        # Потребности без сделок; диапазон цен отбирает потребности, чей диапазон с ним пересекается
+        conditions, params = ["d.id > ?", "NOT EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = d.id)"], [after_id or 0]
+        if property_type:
+            conditions.append("d.property_type = ?")
+            params.append(property_type)
+        if min_price is not None:
+            conditions.append("d.max_price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("d.min_price <= ?")
+            params.append(max_price)
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT d.*,
+                   c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name
+            FROM demands d
+            LEFT JOIN clients c ON d.client_id = c.id
+            LEFT JOIN realtors r ON d.realtor_id = r.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY d.id
+            LIMIT ?
+        """, params + [-1 if limit is None else limit])
+        demands = [dict(row) for row in cursor.fetchall()]
+        self._attach_demand_details(demands)
+        return demands
+    
+    def get_satisfied_ids(self, side: str) -> frozenset:
+        # id потребностей (side='demand') или предложений (side='offer'), уже участвующих в сделках
+        if side not in ('demand', 'offer'):
+            raise ValueError(f"Некорректная сторона сделки: {side}")
+        
+        def load():
+            cursor = self.conn.cursor()
+            cursor.execute(f"SELECT DISTINCT {side}_id FROM deals")
+            return frozenset(row[0] for row in cursor.fetchall())
+        
+        return self._cached_reference(('satisfied', side), ('deals',), load)
+    
+    def lookup(self, kind: str, search: str = '', limit: Optional[int] = LOOKUP_LIMIT,
+               ids: Optional[Iterable[int]] = None, open_only: bool = False) -> List[Dict]:
+        """Короткая выборка для выпадающих списков с поиском.
+
+        kind — clients, realtors, properties, demands или offers; search — текст поиска
+        (для клиентов и риэлторов через FTS, для остальных по номеру и адресу или ФИО клиента);
+        ids — вернуть только указанные записи (подпись текущего значения); open_only — только
+        потребности и предложения без сделок. Результаты кэшируются до следующей записи в
+        сущности из LOOKUP_DEPENDENCIES; возвращаемые словари общие для всех вызовов.
+        """
+        if kind not in LOOKUP_DEPENDENCIES:
+            raise ValueError(f"Неизвестный справочник: {kind}")
+        search = (search or '').strip().lstrip('#')
+        ids = tuple(sorted(set(ids))) if ids is not None else None
+        if ids is not None:
+            limit = None
+        rows = self._cached_reference(('lookup', kind, search, limit, ids, open_only), LOOKUP_DEPENDENCIES[kind],
+                                      lambda: self._load_lookup(kind, search, limit, ids, open_only))
+        return list(rows)
+    
+    def _load_lookup(self, kind: str, search: str, limit: Optional[int], ids: Optional[Tuple[int, ...]],
+                     open_only: bool) -> List[Dict]:
+        if kind == 'clients':
+            return self.get_clients(search or None, limit, ids=ids)
+        if kind == 'realtors':
+            return self.get_realtors(search or None, limit, ids=ids)
+        
+        if kind == 'properties':
+            query = """
+                SELECT x.id, x.type, x.city, x.street, x.house_number
+                FROM properties x
+                {where}
+                ORDER BY x.id LIMIT ?
+            """
+            search_filter = "(CAST(x.id AS TEXT) = ? OR x.city LIKE ? OR x.street LIKE ?)"
+        elif kind == 'demands':
+            query = """
+                SELECT x.id, x.property_type,
+                       c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name
+                FROM demands x
+                LEFT JOIN clients c ON x.client_id = c.id
+                {where}
+                ORDER BY x.id LIMIT ?
+            """
+            search_filter = "(CAST(x.id AS TEXT) = ? OR client_name LIKE ? OR c.phone LIKE ?)"
+        else:
+            query = """
+                SELECT x.id, x.price, p.type as property_type, p.city, p.street
+                FROM offers x
+                LEFT JOIN properties p ON x.property_id = p.id
+                {where}
+                ORDER BY x.id LIMIT ?
+            """
+            search_filter = "(CAST(x.id AS TEXT) = ? OR p.city LIKE ? OR p.street LIKE ?)"
+        
+        filters, params = [], []
+        if open_only:
+            filters.append(f"NOT EXISTS (SELECT 1 FROM deals WHERE deals.{kind[:-1]}_id = x.id)")
+        if ids is not None:
+            filters.append("x.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(ids))
+        if search:
+            filters.append(search_filter)
+            params.extend([search, f"%{search}%", f"%{search}%"])
+        cursor = self.conn.cursor()
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        cursor.execute(query.format(where=where), params + [-1 if limit is None else limit])
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_import_checkpoint(self, source: str) -> Optional[Dict]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM import_checkpoints WHERE source = ?", (source,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    def save_import_checkpoint(self, source: str, kind: str, rows_done: int, fingerprint: Optional[str] = None,
+                               commit: bool = True):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO import_checkpoints (source, kind, rows_done, fingerprint, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(source) DO UPDATE SET kind = excluded.kind, rows_done = excluded.rows_done,
+                                              fingerprint = excluded.fingerprint, updated_at = excluded.updated_at
+        """, (source, kind, rows_done, fingerprint))
+        if commit:
+            self.conn.commit()
+    
+    def clear_import_checkpoint(self, source: str, commit: bool = True):
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM import_checkpoints WHERE source = ?", (source,))
+        if commit:
+            self.conn.commit()
     
     def get_matching_offers(self, demand_id: int) -> List[Dict]:
+        # Для потребности с районом предложения упорядочены по расстоянию (distance_km)
+        cursor = self.conn.cursor()
+        candidates = self._demand_area_candidates([demand_id]).get(demand_id)
+        if candidates is not None and not candidates:
+            return []
+        cursor.execute(f"""
+            SELECT o.*,
+                   c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   p.type as property_type,
+                   {MATCH_DISTANCE_SQL} as distance_km
+            {MATCH_FROM_SQL}
+            LEFT JOIN clients c ON o.client_id = c.id
+            LEFT JOIN realtors r ON o.realtor_id = r.id
+            WHERE dm.id = ? {"AND p.id IN (SELECT value FROM json_each(?))" if candidates else ""}
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id)
+              AND {MATCH_CONDITIONS_SQL}
+            ORDER BY distance_km, o.id
+        """, (demand_id,) + ((json.dumps(candidates),) if candidates else ()))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_ranked_offers(self, demand_id: int, limit: int = RANKED_OFFERS_LIMIT,
+                          max_score: float = MATCH_SCORE_LIMIT) -> List[Dict]:
+        """Лучшие limit свободных предложений для потребности по оценке отклонения (score).
+        
+        В отличие от get_matching_offers, попадают и почти подходящие предложения с
+        оценкой не выше max_score (см. MATCH_SCORE_WEIGHTS). Порядок — по score, при
+        равенстве по цене, затем по id. Цены просматриваются полосами по индексу
+        offers(price, rental_period) в порядке цены, лучшие строки держатся в куче
+        размера limit; полоса (и ее остаток) пропускается, если даже нижняя граница
+        ее оценки не лучше худшей строки в куче.
+        """
+        if limit <= 0:
+            return []
         demand = self.get_demand(demand_id)
         if not demand:
             return []
+        filters, params = "", []
+        if demand['radius_km'] is not None:
+            # Объекты дальше этого расстояния не проходят порог только за счет района
+            reach = demand['radius_km'] * (1 + max_score / MATCH_SCORE_WEIGHTS['distance'])
+            candidates = sorted(self._distances_within(demand['latitude'], demand['longitude'], reach,
+                                                       demand['property_type']))
+            if not candidates:
+                return []
+            filters = "AND o.property_id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(candidates))
         
-        all_offers = self.get_offers()
-        matching = []
+        cursor = self.conn.cursor()
+        # Куча limit лучших ключей (score, price, id) с обратным знаком: в вершине худший
+        best: List[Tuple[float, int, int]] = []
+        threshold = max_score
+        for floor, band_sql, band_params in _price_bands(demand['min_price'], demand['max_price'], max_score):
+            if floor > threshold:
+                break
+            period_slack = threshold / MATCH_SCORE_WEIGHTS['period']
+            cursor.execute(f"""
+                SELECT o.id, o.price, {MATCH_SCORE_SQL} as score
+                {RANKED_FROM_SQL}
+                WHERE dm.id = ? AND {band_sql}
+                  AND o.rental_period BETWEEN ? AND ? {filters}
+                  AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id)
+                  AND score <= ?
+                ORDER BY o.price, o.id
+            """, (demand_id,) + tuple(band_params)
+                 + (demand['min_rental_period'] - period_slack, demand['max_rental_period'] + period_slack)
+                 + tuple(params) + (threshold,))
+            for offer_id, price, score in cursor:
+                if len(best) == limit:
+                    worst = (-best[0][0], -best[0][1], -best[0][2])
+                    # Остальные строки полосы дороже, а их оценка не меньше floor
+                    if (floor, price, offer_id) >= worst:
+                        break
+                    if (score, price, offer_id) < worst:
+                        heapq.heapreplace(best, (-score, -price, -offer_id))
+                        threshold = -best[0][0]
+                elif score <= threshold:
+                    heapq.heappush(best, (-score, -price, -offer_id))
+                    if len(best) == limit:
+                        threshold = -best[0][0]
         
-        for offer in all_offers:
-            if self.is_offer_satisfied(offer['id']):
-                continue
+        ranked = sorted((-neg_score, -neg_price, -neg_id) for neg_score, neg_price, neg_id in best)
+        if not ranked:
+            return []
+        cursor.execute(f"""
+            SELECT o.*,
+                   c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   p.type as property_type,
+                   {MATCH_DISTANCE_SQL} as distance_km
+            FROM demands dm
+            CROSS JOIN offers o
+            JOIN properties p ON p.id = o.property_id
+            LEFT JOIN clients c ON o.client_id = c.id
+            LEFT JOIN realtors r ON o.realtor_id = r.id
+            WHERE dm.id = ? AND o.id IN (SELECT value FROM json_each(?))
+        """, (demand_id, json.dumps([offer_id for _, _, offer_id in ranked])))
+        rows = {row['id']: dict(row) for row in cursor.fetchall()}
+        result = []
+        for score, _, offer_id in ranked:
+            row = rows[offer_id]
+            row['score'] = score
+            result.append(row)
+        return result
+    
+    def get_matching_demands(self, offer_id: int) -> List[Dict]:
+        # Открытые потребности, которым подходит предложение; кандидаты берутся из R*Tree
+        # demands_ranges, для потребностей с районом они упорядочены по расстоянию (distance_km)
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT dm.*,
+                   c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   {MATCH_DISTANCE_SQL} as distance_km
+            {OFFER_MATCH_FROM_SQL}
+            LEFT JOIN clients c ON dm.client_id = c.id
+            LEFT JOIN realtors r ON dm.realtor_id = r.id
+            WHERE o.id = ?
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = dm.id)
+              AND {MATCH_CONDITIONS_SQL}
+            ORDER BY distance_km, dm.id
+        """, (offer_id,))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def _demand_area_candidates(self, demand_ids: List[int]) -> Dict[int, List[int]]:
+        # Для потребностей с районом — объекты нужного типа в радиусе по R*Tree;
+        # потребности без района в результат не попадают
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, property_type, latitude, longitude, radius_km FROM demands
+            WHERE id IN (SELECT value FROM json_each(?)) AND radius_km IS NOT NULL
+        """, (json.dumps(list(demand_ids)),))
+        return {row['id']: sorted(self._distances_within(row['latitude'], row['longitude'], row['radius_km'],
+                                                         row['property_type']))
+                for row in cursor.fetchall()}
+    
+    def rebuild_matches(self) -> int:
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT o.id, o.price, o.rental_period,
+                       p.type, p.city, p.street, p.house_number, p.apartment_number, p.latitude, p.longitude,
+                       a.floor, h.floors,
+                       COALESCE(a.rooms, h.rooms) as rooms,
+                       COALESCE(a.area, h.area, l.area) as area
+                FROM offers o
+                JOIN properties p ON o.property_id = p.id
+                LEFT JOIN apartments a ON a.property_id = p.id AND p.type = 'apartment'
+                LEFT JOIN houses h ON h.property_id = p.id AND p.type = 'house'
+                LEFT JOIN lands l ON l.property_id = p.id AND p.type = 'land'
+                WHERE NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id)
+                ORDER BY p.type, o.rental_period, o.price
+            """)
             
-            property_data = self.get_property(offer['property_id'])
-            if not property_data:
-                continue
+            # Разбиение: тип объекта -> срок -> предложения, отсортированные по цене
+            partitions: Dict[str, Dict[int, tuple]] = {}
+            for row in cursor.fetchall():
+                offer = dict(row)
+                buckets = partitions.setdefault(offer['type'], {})
+                prices, items = buckets.setdefault(offer['rental_period'], ([], []))
+                prices.append(offer['price'])
+                items.append(offer)
+            periods_by_type = {prop_type: sorted(buckets) for prop_type, buckets in partitions.items()}
             
-            if self.check_match(demand, property_data, offer):
-                matching.append(offer)
-        
-        return matching
+            cursor.execute("""
+                SELECT d.id, d.property_type, d.city, d.street, d.house_number, d.apartment_number,
+                       d.latitude, d.longitude, d.radius_km, d.min_price, d.max_price, d.min_rental_period, d.max_rental_period,
+                       ad.min_floor, ad.max_floor, hd.min_floors, hd.max_floors,
+                       COALESCE(ad.min_rooms, hd.min_rooms) as min_rooms,
+                       COALESCE(ad.max_rooms, hd.max_rooms) as max_rooms,
+                       COALESCE(ad.min_area, hd.min_area, ld.min_area) as min_area,
+                       COALESCE(ad.max_area, hd.max_area, ld.max_area) as max_area
+                FROM demands d
+                LEFT JOIN apartment_demands ad ON ad.demand_id = d.id AND d.property_type = 'apartment'
+                LEFT JOIN house_demands hd ON hd.demand_id = d.id AND d.property_type = 'house'
+                LEFT JOIN land_demands ld ON ld.demand_id = d.id AND d.property_type = 'land'
+                WHERE NOT EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = d.id)
+            """)
+            
+            pairs = []
+            for row in cursor.fetchall():
+                demand = dict(row)
+                buckets = partitions.get(demand['property_type'])
+                if not buckets:
+                    continue
+                periods = periods_by_type[demand['property_type']]
+                start = bisect_left(periods, demand['min_rental_period'])
+                end = bisect_right(periods, demand['max_rental_period'])
+                for period in periods[start:end]:
+                    prices, items = buckets[period]
+                    lo = bisect_left(prices, demand['min_price'])
+                    hi = bisect_right(prices, demand['max_price'])
+                    for offer in items[lo:hi]:
+                        if self.check_match(demand, offer, offer):
+                            pairs.append((demand['id'], offer['id']))
+            
+            cursor.execute("DELETE FROM matches")
+            cursor.executemany("INSERT INTO matches (demand_id, offer_id) VALUES (?, ?)", pairs)
+            self.conn.commit()
+            return len(pairs)
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при пересчете совпадений: {e}")
+            raise
+    
+    def _refresh_demand_matches(self, demand_ids: List[int]):
+        if not demand_ids:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM matches WHERE demand_id IN (SELECT value FROM json_each(?))",
+                       (json.dumps(list(demand_ids)),))
+        insert_sql = f"""
+            INSERT INTO matches (demand_id, offer_id)
+            SELECT dm.id, o.id
+            {MATCH_FROM_SQL}
+            WHERE dm.id IN (SELECT value FROM json_each(?)) {{candidates}}
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = dm.id)
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id)
+              AND {MATCH_CONDITIONS_SQL}
+        """
+        # Потребности с районом сопоставляются только с объектами из R*Tree, а не со всеми объектами типа
+        area_candidates = self._demand_area_candidates(demand_ids)
+        plain_ids = [demand_id for demand_id in demand_ids if demand_id not in area_candidates]
+        if plain_ids:
+            cursor.execute(insert_sql.format(candidates=""), (json.dumps(plain_ids),))
+        for demand_id, candidates in area_candidates.items():
+            if candidates:
+                cursor.execute(insert_sql.format(candidates="AND p.id IN (SELECT value FROM json_each(?))"),
+                               (json.dumps([demand_id]), json.dumps(candidates)))
+    
+    def _refresh_offer_matches(self, offer_ids: List[int]):
+        if not offer_ids:
+            return
+        cursor = self.conn.cursor()
+        ids_json = json.dumps(list(offer_ids))
+        cursor.execute("DELETE FROM matches WHERE offer_id IN (SELECT value FROM json_each(?))", (ids_json,))
+        cursor.execute(f"""
+            INSERT INTO matches (demand_id, offer_id)
+            SELECT dm.id, o.id
+            {OFFER_MATCH_FROM_SQL}
+            WHERE o.id IN (SELECT value FROM json_each(?))
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id)
+              AND NOT EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = dm.id)
+              AND {MATCH_CONDITIONS_SQL}
+        """, (ids_json,))
+    
+    def get_matched_offers(self, demand_id: int) -> List[Dict]:
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT o.*,
+                   c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+                   r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+                   p.type as property_type,
+                   {MATCH_DISTANCE_SQL} as distance_km
+            FROM matches m
+            JOIN demands dm ON m.demand_id = dm.id
+            JOIN offers o ON m.offer_id = o.id
+            LEFT JOIN clients c ON o.client_id = c.id
+            LEFT JOIN realtors r ON o.realtor_id = r.id
+            LEFT JOIN properties p ON o.property_id = p.id
+            WHERE m.demand_id = ?
+            ORDER BY distance_km, o.id
+        """, (demand_id,))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_matches(self) -> List[Dict]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT demand_id, offer_id FROM matches ORDER BY demand_id, offer_id")
+        return [dict(row) for row in cursor.fetchall()]
     
     def check_match(self, demand: Dict, property_data: Dict, offer: Dict) -> bool:
         if demand['property_type'] != property_data['type']:
             return False
         
-        if demand['city'] and property_data['city'] != demand['city']:
-            return False
-        if demand['street'] and property_data['street'] != demand['street']:
-            return False
-        if demand['house_number'] and property_data['house_number'] != demand['house_number']:
-            return False
-        if demand['apartment_number'] and property_data['apartment_number'] != demand['apartment_number']:
-            return False
+        if demand.get('radius_km') is not None:
+            # Район поиска заменяет совпадение адреса
+            if property_data.get('latitude') is None or property_data.get('longitude') is None:
+                return False
+            if haversine_km(demand['latitude'], demand['longitude'],
+                            property_data['latitude'], property_data['longitude']) > demand['radius_km']:
+                return False
+        else:
+            if demand['city'] and property_data['city'] != demand['city']:
+                return False
+            if demand['street'] and property_data['street'] != demand['street']:
+                return False
+            if demand['house_number'] and property_data['house_number'] != demand['house_number']:
+                return False
+            if demand['apartment_number'] and property_data['apartment_number'] != demand['apartment_number']:
+                return False
         
         if not (demand['min_price'] <= offer['price'] <= demand['max_price']):
             return False
@@ -1015,6 +2812,57 @@ class Database:
         
         return True
     
+    def score_match(self, demand: Dict, property_data: Dict, offer: Dict) -> Optional[float]:
+        # Оценка отклонения по MATCH_SCORE_WEIGHTS: 0 тогда и только тогда, когда check_match
+        # истинно; None — предложение не подходит вовсе (другой тип объекта или нет координат
+        # у объекта для потребности с районом)
+        if demand['property_type'] != property_data['type']:
+            return None
+        weights = MATCH_SCORE_WEIGHTS
+        score = 0.0
+        
+        if demand.get('radius_km') is not None:
+            if property_data.get('latitude') is None or property_data.get('longitude') is None:
+                return None
+            distance = haversine_km(demand['latitude'], demand['longitude'],
+                                    property_data['latitude'], property_data['longitude'])
+            if distance > demand['radius_km']:
+                score += weights['distance'] * (distance - demand['radius_km']) / demand['radius_km']
+        else:
+            for field in ('city', 'street', 'house_number', 'apartment_number'):
+                if demand[field] and property_data[field] != demand[field]:
+                    score += weights[field]
+        
+        score += _range_penalty(offer['price'], demand['min_price'], demand['max_price'],
+                                weights['price'], relative=True)
+        score += _range_penalty(offer['rental_period'], demand['min_rental_period'], demand['max_rental_period'],
+                                weights['period'])
+        
+        prop_type = demand['property_type']
+        if prop_type == 'apartment':
+            score += _range_penalty(property_data.get('floor'), demand.get('min_floor'), demand.get('max_floor'),
+                                    weights['floor'])
+        elif prop_type == 'house':
+            score += _range_penalty(property_data.get('floors'), demand.get('min_floors'), demand.get('max_floors'),
+                                    weights['floor'])
+        if prop_type in ('apartment', 'house'):
+            score += _range_penalty(property_data.get('rooms'), demand.get('min_rooms'), demand.get('max_rooms'),
+                                    weights['rooms'])
+        score += _range_penalty(property_data.get('area'), demand.get('min_area'), demand.get('max_area'),
+                                weights['area'], relative=True)
+        return score
+    
+    def analyze(self):
+        self.conn.execute("ANALYZE")
+        self.conn.execute("PRAGMA optimize")
+        self.conn.commit()
+    
+    def vacuum(self):
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        if self.get_connection_settings()['journal_mode'] == 'wal':
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
     def close(self):
         self.conn.close()
 
@@ -0,0 +1,275 @@
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from commission_calculator import COMMISSION_FIELDS, CommissionCalculator
+from database import Database
+
+EXPORT_QUERIES = {
+    'clients': "SELECT * FROM clients ORDER BY id",
+    'realtors': "SELECT * FROM realtors ORDER BY id",
+    'properties': """
+        SELECT p.*, a.floor, h.floors,
+               COALESCE(a.rooms, h.rooms) as rooms,
+               COALESCE(a.area, h.area, l.area) as area
+        FROM properties p
+        LEFT JOIN apartments a ON a.property_id = p.id AND p.type = 'apartment'
+        LEFT JOIN houses h ON h.property_id = p.id AND p.type = 'house'
+        LEFT JOIN lands l ON l.property_id = p.id AND p.type = 'land'
+        ORDER BY p.id
+    """,
+    'offers': """
+        SELECT o.*,
+               c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+               r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+               p.type as property_type, p.city, p.street, p.house_number, p.apartment_number,
+               EXISTS (SELECT 1 FROM deals WHERE deals.offer_id = o.id) as satisfied
+        FROM offers o
+        LEFT JOIN clients c ON o.client_id = c.id
+        LEFT JOIN realtors r ON o.realtor_id = r.id
+        LEFT JOIN properties p ON o.property_id = p.id
+        ORDER BY o.id
+    """,
+    'demands': """
+        SELECT d.*,
+               c.surname || ' ' || c.name || ' ' || COALESCE(c.patronymic, '') as client_name,
+               r.surname || ' ' || r.name || ' ' || COALESCE(r.patronymic, '') as realtor_name,
+               ad.min_floor, ad.max_floor, hd.min_floors, hd.max_floors,
+               COALESCE(ad.min_rooms, hd.min_rooms) as min_rooms,
+               COALESCE(ad.max_rooms, hd.max_rooms) as max_rooms,
+               COALESCE(ad.min_area, hd.min_area, ld.min_area) as min_area,
+               COALESCE(ad.max_area, hd.max_area, ld.max_area) as max_area,
+               EXISTS (SELECT 1 FROM deals WHERE deals.demand_id = d.id) as satisfied
+        FROM demands d
+        LEFT JOIN clients c ON d.client_id = c.id
+        LEFT JOIN realtors r ON d.realtor_id = r.id
+        LEFT JOIN apartment_demands ad ON ad.demand_id = d.id AND d.property_type = 'apartment'
+        LEFT JOIN house_demands hd ON hd.demand_id = d.id AND d.property_type = 'house'
+        LEFT JOIN land_demands ld ON ld.demand_id = d.id AND d.property_type = 'land'
+        ORDER BY d.id
+    """,
+    'deals': """
+        SELECT d.id, d.demand_id, d.offer_id, d.created_at,
+               COALESCE(p.type, 'apartment') as property_type, off.price, off.rental_period,
+               sc.surname || ' ' || sc.name || ' ' || COALESCE(sc.patronymic, '') as seller_client_name,
+               bc.surname || ' ' || bc.name || ' ' || COALESCE(bc.patronymic, '') as buyer_client_name,
+               off.realtor_id as seller_realtor_id,
+               sr.surname || ' ' || sr.name || ' ' || COALESCE(sr.patronymic, '') as seller_realtor_name,
+               dem.realtor_id as buyer_realtor_id,
+               br.surname || ' ' || br.name || ' ' || COALESCE(br.patronymic, '') as buyer_realtor_name,
+               sr.commission_share as seller_commission_share,
+               br.commission_share as buyer_commission_share
+        FROM deals d
+        LEFT JOIN demands dem ON d.demand_id = dem.id
+        LEFT JOIN offers off ON d.offer_id = off.id
+        LEFT JOIN properties p ON off.property_id = p.id
+        LEFT JOIN clients sc ON off.client_id = sc.id
+        LEFT JOIN clients bc ON dem.client_id = bc.id
+        LEFT JOIN realtors sr ON off.realtor_id = sr.id
+        LEFT JOIN realtors br ON dem.realtor_id = br.id
+        ORDER BY d.id
+    """,
+    'deal_commissions': "SELECT * FROM deal_commissions ORDER BY deal_id",
+    'matches': "SELECT demand_id, offer_id FROM matches ORDER BY demand_id, offer_id",
+}
+
+COLUMNAR_MAGIC = b'RCOL1'
+COLUMNAR_ROW_GROUP_SIZE = 65536
+
+
+def iter_export(db: Database, name: str, batch_size: int = 10000) -> Tuple[List[str], Iterator[tuple]]:
+    if name not in EXPORT_QUERIES:
+        raise ValueError(f"Неизвестная таблица или отчет: {name}")
+
+    cursor = db.conn.cursor()
+    cursor.execute(EXPORT_QUERIES[name])
+    columns = [description[0] for description in cursor.description]
+
+    def batches() -> Iterator[List[tuple]]:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield [tuple(row) for row in batch]
+
+    if name != 'deals':
+        return columns, (row for batch in batches() for row in batch)
+
+    price_index = columns.index('price')
+    type_index = columns.index('property_type')
+    seller_share_index = columns.index('seller_commission_share')
+    buyer_share_index = columns.index('buyer_commission_share')
+
+    def rows_with_commissions() -> Iterator[tuple]:
+        for batch in batches():
+            commissions = CommissionCalculator.calculate_commissions_batch(
+                [row[type_index] for row in batch], [row[price_index] for row in batch],
+                [row[seller_share_index] for row in batch], [row[buyer_share_index] for row in batch]
+            )
+            for index, row in enumerate(batch):
+                yield row + tuple(commissions[column][index] for column in COMMISSION_FIELDS)
+
+    return columns + list(COMMISSION_FIELDS), rows_with_commissions()
+
+
+def write_csv(path: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+            count += 1
+    return count
+
+
+def write_jsonl(path: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def _column_type(values: Sequence) -> str:
+    kind = 'n'
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, (bytes, str)):
+            return 's'
+        if isinstance(value, float):
+            kind = 'f'
+        elif kind == 'n':
+            kind = 'i'
+    return kind
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encode_column(values: Sequence) -> Tuple[str, bytes]:
+    kind = _column_type(values)
+    nulls = bytearray((len(values) + 7) // 8)
+    for index, value in enumerate(values):
+        if value is None:
+            nulls[index >> 3] |= 1 << (index & 7)
+
+    if kind == 'i':
+        data = _to_little_endian(array('q', (0 if value is None else int(value) for value in values)))
+    elif kind == 'f':
+        data = _to_little_endian(array('d', (0.0 if value is None else float(value) for value in values)))
+    elif kind == 's':
+        offsets = array('Q', [0])
+        blob = bytearray()
+        for value in values:
+            if value is not None:
+                blob += value if isinstance(value, bytes) else str(value).encode('utf-8')
+            offsets.append(len(blob))
+        data = _to_little_endian(offsets) + bytes(blob)
+    else:
+        data = b''
+    return kind, zlib.compress(bytes(nulls) + data, 1)
+
+
+def write_columnar(path: str, columns: Sequence[str], rows: Iterable[tuple],
+                   row_group_size: int = COLUMNAR_ROW_GROUP_SIZE) -> int:
+    # Формат: магическая строка, группы строк (каждая колонка сжата отдельно),
+    # JSON-оглавление с типами и смещениями, длина оглавления, магическая строка.
+    footer = {'columns': list(columns), 'row_groups': [], 'rows': 0}
+    with open(path, 'wb') as f:
+        f.write(COLUMNAR_MAGIC)
+        group: List[tuple] = []
+
+        def flush():
+            group_meta = {'rows': len(group), 'chunks': []}
+            for index in range(len(columns)):
+                kind, payload = _encode_column([row[index] for row in group])
+                group_meta['chunks'].append({'type': kind, 'offset': f.tell(), 'length': len(payload)})
+                f.write(payload)
+            footer['row_groups'].append(group_meta)
+            footer['rows'] += len(group)
+            group.clear()
+
+        for row in rows:
+            group.append(row)
+            if len(group) >= row_group_size:
+                flush()
+        if group:
+            flush()
+
+        encoded = json.dumps(footer).encode('utf-8')
+        f.write(encoded)
+        f.write(struct.pack('<Q', len(encoded)))
+        f.write(COLUMNAR_MAGIC)
+    return footer['rows']
+
+
+def _decode_column(kind: str, payload: bytes, count: int) -> List:
+    raw = zlib.decompress(payload)
+    null_size = (count + 7) // 8
+    nulls, data = raw[:null_size], raw[null_size:]
+    if kind == 'n':
+        return [None] * count
+    if kind in ('i', 'f'):
+        values = array('q' if kind == 'i' else 'd')
+        values.frombytes(data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        values = values.tolist()
+    else:
+        offsets = array('Q')
+        offsets.frombytes(data[:(count + 1) * 8])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        blob = data[(count + 1) * 8:]
+        values = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(count)]
+    return [None if nulls[i >> 3] & (1 << (i & 7)) else values[i] for i in range(count)]
+
+
+def read_columnar_footer(path: str) -> Dict:
+    with open(path, 'rb') as f:
+        f.seek(-(len(COLUMNAR_MAGIC) + 8), os.SEEK_END)
+        (length,) = struct.unpack('<Q', f.read(8))
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"Файл {path} не является колоночным файлом экспорта")
+        f.seek(-(len(COLUMNAR_MAGIC) + 8 + length), os.SEEK_END)
+        return json.loads(f.read(length).decode('utf-8'))
+
+
+def read_columnar(path: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    footer = read_columnar_footer(path)
+    names = list(columns) if columns else footer['columns']
+    indexes = [footer['columns'].index(name) for name in names]
+    with open(path, 'rb') as f:
+        for group in footer['row_groups']:
+            decoded = []
+            for index in indexes:
+                chunk = group['chunks'][index]
+                f.seek(chunk['offset'])
+                decoded.append(_decode_column(chunk['type'], f.read(chunk['length']), group['rows']))
+            for values in zip(*decoded):
+                yield dict(zip(names, values))
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'rcol': write_columnar}
+
+
+def export(db: Database, name: str, path: str, fmt: Optional[str] = None, batch_size: int = 10000) -> int:
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"Неподдерживаемый формат экспорта: {fmt}")
+    columns, rows = iter_export(db, name, batch_size)
+    return WRITERS[fmt](path, columns, rows)
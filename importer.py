@@ -0,0 +1,239 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from database import Database
+
+IMPORT_KINDS = ('properties', 'offers', 'demands')
+
+INT_FIELDS = {
+    'client_id', 'realtor_id', 'property_id', 'price', 'rental_period',
+    'min_price', 'max_price', 'min_rental_period', 'max_rental_period',
+    'floor', 'floors', 'rooms', 'min_rooms', 'max_rooms',
+    'min_floor', 'max_floor', 'min_floors', 'max_floors',
+}
+FLOAT_FIELDS = {'latitude', 'longitude', 'radius_km', 'area', 'min_area', 'max_area'}
+
+ParsedRow = Tuple[int, Optional[Dict], Optional[str]]
+# Сколько байт начала файла входит в отпечаток контрольной точки
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    digits = re.sub(r'\D', '', phone or '')
+    # +7 916 ... и 8 916 ... — один и тот же номер
+    return digits[-10:] if len(digits) >= 10 else digits
+
+
+def read_records(path: str) -> Iterator[Union[Dict, str]]:
+    # Строки JSONL отдаются без разбора: их декодирует parse_rows, чтобы некорректная
+    # строка стала ошибкой этой строки, а не прерывала импорт
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+    elif extension in ('.jsonl', '.ndjson'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {extension}")
+
+
+def file_fingerprint(path: str) -> str:
+    # Размер, время изменения и хеш начала файла: замененный по тому же пути файл
+    # импортируется с начала, а не с позиции старой контрольной точки
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        head = hashlib.sha1(f.read(FINGERPRINT_BYTES)).hexdigest()
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{head}"
+
+
+def parse_record(raw: Dict) -> Dict:
+    record = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = key.strip()
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '':
+                value = None
+        if value is not None and key in INT_FIELDS:
+            # Дробные числа из JSONL не округляются молча: 12.5 — ошибка строки, 12.0 — допустимо
+            if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+                raise ValueError(f"Поле {key} должно быть целым числом: {value!r}")
+            try:
+                value = int(value)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"Поле {key} должно быть целым числом: {value!r}")
+        elif value is not None and key in FLOAT_FIELDS:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Поле {key} должно быть числом: {value!r}")
+        record[key] = value
+    if 'type' in record and 'property_type' not in record:
+        record['property_type'] = record.pop('type')
+    return record
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class DataImporter:
+
+    def __init__(self, db: Database, chunk_size: int = 5000,
+                 progress: Optional[Callable[[Dict], None]] = None):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._clients_by_phone: Optional[Dict[str, int]] = None
+        self._clients_by_email: Optional[Dict[str, int]] = None
+        self._realtors_by_name: Optional[Dict[str, int]] = None
+
+    def _load_client_lookup(self):
+        self._clients_by_phone = {}
+        self._clients_by_email = {}
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT id, phone, email FROM clients ORDER BY id")
+        for client_id, phone, email in cursor:
+            digits = normalize_phone(phone)
+            if digits:
+                self._clients_by_phone.setdefault(digits, client_id)
+            if email:
+                self._clients_by_email.setdefault(email.strip().lower(), client_id)
+
+    def _load_realtor_lookup(self):
+        self._realtors_by_name = {}
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT id, surname, name, patronymic FROM realtors ORDER BY id")
+        for realtor_id, surname, name, patronymic in cursor:
+            key = ' '.join(part for part in (surname, name, patronymic) if part).lower()
+            self._realtors_by_name.setdefault(key, realtor_id)
+
+    def resolve_references(self, record: Dict) -> Dict:
+        if record.get('client_id') is None and (record.get('client_phone') or record.get('client_email')):
+            if self._clients_by_phone is None:
+                self._load_client_lookup()
+            client_id = None
+            if record.get('client_phone'):
+                client_id = self._clients_by_phone.get(normalize_phone(record['client_phone']))
+            if client_id is None and record.get('client_email'):
+                client_id = self._clients_by_email.get(record['client_email'].lower())
+            if client_id is None:
+                raise ValueError("Клиент не найден по телефону или email")
+            record['client_id'] = client_id
+
+        if record.get('realtor_id') is None and record.get('realtor'):
+            if self._realtors_by_name is None:
+                self._load_realtor_lookup()
+            realtor_id = self._realtors_by_name.get(' '.join(record['realtor'].split()).lower())
+            if realtor_id is None:
+                raise ValueError(f"Риэлтор не найден: {record['realtor']}")
+            record['realtor_id'] = realtor_id
+
+        for key in ('client_phone', 'client_email', 'realtor'):
+            record.pop(key, None)
+        return record
+
+    def parse_rows(self, raw_records: Iterable[Union[Dict, str]], start_row: int = 0) -> Iterator[ParsedRow]:
+        for row_number, raw in enumerate(raw_records, start=start_row + 1):
+            try:
+                if isinstance(raw, str):
+                    try:
+                        raw = json.loads(raw)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Некорректная строка JSON: {e}")
+                    if not isinstance(raw, dict):
+                        raise ValueError("Строка JSONL должна быть объектом")
+                yield row_number, self.resolve_references(parse_record(raw)), None
+            except (ValueError, TypeError, AttributeError) as e:
+                yield row_number, None, str(e)
+
+    def _insert_chunk(self, kind: str, records: List[Dict]):
+        if kind == 'properties':
+            return self.db.add_properties_bulk(records, commit=False)
+        if kind == 'offers':
+            return self.db.add_offers_bulk(records, commit=False)
+        return self.db.add_demands_bulk(records, commit=False)
+
+    def import_file(self, kind: str, path: str, resume: bool = True,
+                    errors_path: Optional[str] = None) -> Dict:
+        if kind not in IMPORT_KINDS:
+            raise ValueError(f"Некорректный тип импорта: {kind}")
+
+        source = os.path.abspath(path)
+        fingerprint = file_fingerprint(path)
+        checkpoint = self.db.get_import_checkpoint(source) if resume else None
+        if checkpoint and checkpoint['fingerprint'] != fingerprint:
+            # Файл изменился после сохранения позиции — импорт начинается заново
+            checkpoint = None
+        if checkpoint and checkpoint['kind'] != kind:
+            raise ValueError(f"Файл {path} уже импортировался как {checkpoint['kind']}")
+        skipped = checkpoint['rows_done'] if checkpoint else 0
+
+        stats = {'kind': kind, 'source': source, 'skipped': skipped, 'rows': 0,
+                 'inserted': 0, 'errors': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+        errors_file = open(errors_path, 'a', encoding='utf-8') if errors_path else None
+        started = time.perf_counter()
+        rows_done = skipped
+        try:
+            raw_records = islice(read_records(path), skipped, None)
+            chunks = chunked(self.parse_rows(raw_records, skipped), self.chunk_size)
+            chunk = next(chunks, None)
+            if chunk is None:
+                self.db.clear_import_checkpoint(source)
+            while chunk is not None:
+                records = [record for _, record, _ in chunk if record is not None]
+                row_numbers = [row_number for row_number, record, _ in chunk if record is not None]
+                failures = [(row_number, error) for row_number, record, error in chunk if record is None]
+
+                ids, bulk_errors = self._insert_chunk(kind, records) if records else ([], [])
+                failures.extend((row_numbers[index], error) for index, error in bulk_errors)
+
+                # Ошибки пишутся до фиксации пачки: при сбое между записью и фиксацией пачка
+                # импортируется повторно (ее ошибки могут повториться), но строки не теряются
+                if errors_file:
+                    for row_number, error in sorted(failures):
+                        errors_file.write(json.dumps({'row': row_number, 'error': error}, ensure_ascii=False) + "\n")
+                    errors_file.flush()
+
+                # Контрольная точка удаляется в одной транзакции с последней пачкой
+                rows_done += len(chunk)
+                next_chunk = next(chunks, None)
+                if next_chunk is None:
+                    self.db.clear_import_checkpoint(source, commit=False)
+                else:
+                    self.db.save_import_checkpoint(source, kind, rows_done, fingerprint, commit=False)
+                self.db.conn.commit()
+
+                stats['rows'] += len(chunk)
+                stats['inserted'] += sum(1 for new_id in ids if new_id is not None)
+                stats['errors'] += len(failures)
+
+                stats['seconds'] = time.perf_counter() - started
+                stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+                if self.progress:
+                    self.progress(dict(stats))
+                chunk = next_chunk
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        stats['seconds'] = time.perf_counter() - started
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        return stats
@@ -1,24 +1,43 @@
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import importlib
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTabWidget, QMessageBox
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon
 
 from database import Database
 from commission_calculator import CommissionCalculator
-from widgets.clients_widget import ClientsWidget
-from widgets.realtors_widget import RealtorsWidget
-from widgets.properties_widget import PropertiesWidget
-from widgets.offers_widget import OffersWidget
-from widgets.demands_widget import DemandsWidget
-from widgets.deals_widget import DealsWidget
+from startup import StartupProfile, format_startup_report
+
+# Вкладки создаются при первом показе: атрибут окна, заголовок, модуль и класс виджета.
+# Модули виджетов тоже импортируются только тогда.
+TABS = (
+    ('clients_widget', "👥 Клиенты", 'widgets.clients_widget', 'ClientsWidget'),
+    ('realtors_widget', "👔 Риэлторы", 'widgets.realtors_widget', 'RealtorsWidget'),
+    ('properties_widget', "🏘️ Объекты недвижимости", 'widgets.properties_widget', 'PropertiesWidget'),
+    ('offers_widget', "📋 Предложения", 'widgets.offers_widget', 'OffersWidget'),
+    ('demands_widget', "🔍 Потребности", 'widgets.demands_widget', 'DemandsWidget'),
+    ('deals_widget', "💼 Сделки", 'widgets.deals_widget', 'DealsWidget'),
+)
 
 class MainWindow(QMainWindow):
     
-    def __init__(self):
+    # Первая вкладка создана и загружена — запуск завершен
+    tab_loaded = pyqtSignal()
+    
+    def __init__(self, db_path: str = "real_estate.db", profile: StartupProfile = None):
         super().__init__()
-        self.db = Database()
+        self.profile = profile or StartupProfile()
+        self.db = Database(db_path)
+        self.profile.mark('schema')
+        self.painted = False
         self.commission_calculator = CommissionCalculator()
         self.init_ui()
+        self.profile.mark('window')
     
     def init_ui(self):
         self.setWindowTitle("Информационная система агентства недвижимости")
@@ -68,49 +87,85 @@ class MainWindow(QMainWindow):
             }
         """)
         
-        self.clients_widget = ClientsWidget(self.db)
-        self.realtors_widget = RealtorsWidget(self.db)
-        self.properties_widget = PropertiesWidget(self.db)
-        self.offers_widget = OffersWidget(self.db)
-        self.demands_widget = DemandsWidget(self.db)
-        self.deals_widget = DealsWidget(self.db, self.commission_calculator)
-        
-        self.tabs.addTab(self.clients_widget, "👥 Клиенты")
-        self.tabs.addTab(self.realtors_widget, "👔 Риэлторы")
-        self.tabs.addTab(self.properties_widget, "🏘️ Объекты недвижимости")
-        self.tabs.addTab(self.offers_widget, "📋 Предложения")
-        self.tabs.addTab(self.demands_widget, "🔍 Потребности")
-        self.tabs.addTab(self.deals_widget, "💼 Сделки")
+        self.tab_pages = []
+        for attribute, title, _, _ in TABS:
+            setattr(self, attribute, None)
+            page = QWidget()
+            page_layout = QVBoxLayout()
+            page_layout.setContentsMargins(0, 0, 0, 0)
+            page.setLayout(page_layout)
+            self.tab_pages.append(page)
+            self.tabs.addTab(page, title)
+        self.tabs.currentChanged.connect(self.ensure_tab)
         
         main_layout.addWidget(self.tabs)
-        
-        self.clients_widget.data_changed.connect(self.refresh_all)
-        self.realtors_widget.data_changed.connect(self.refresh_all)
-        self.properties_widget.data_changed.connect(self.refresh_all)
-        self.offers_widget.data_changed.connect(self.refresh_all)
-        self.demands_widget.data_changed.connect(self.refresh_all)
-        self.deals_widget.data_changed.connect(self.refresh_all)
     
-    def refresh_all(self):
-        self.clients_widget.refresh_data()
-        self.realtors_widget.refresh_data()
-        self.properties_widget.refresh_data()
-        self.offers_widget.refresh_data()
-        self.demands_widget.refresh_data()
-        self.deals_widget.refresh_data()
+    def ensure_tab(self, index):
+        if not 0 <= index < len(TABS):
+            return None
+        attribute, _, module_name, class_name = TABS[index]
+        widget = getattr(self, attribute)
+        if widget is None:
+            widget_class = getattr(importlib.import_module(module_name), class_name)
+            if attribute == 'deals_widget':
+                widget = widget_class(self.db, self.commission_calculator)
+            else:
+                widget = widget_class(self.db)
+            setattr(self, attribute, widget)
+            self.tab_pages[index].layout().addWidget(widget)
+        return widget
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            self.profile.mark('first_paint')
+            # Текущая вкладка загружается после того, как окно появилось на экране
+            QTimer.singleShot(0, self.load_current_tab)
+    
+    def load_current_tab(self):
+        self.ensure_tab(self.tabs.currentIndex())
+        self.profile.mark('first_tab')
+        self.tab_loaded.emit()
     
     def closeEvent(self, event):
+        for widget in (self.clients_widget, self.realtors_widget, self.properties_widget):
+            if widget is not None:
+                widget.search_controller.stop()
         self.db.close()
         event.accept()
 
-def main():
-    app = QApplication(sys.argv)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Информационная система агентства недвижимости")
+    parser.add_argument('--db', default='real_estate.db', help="Путь к базе данных")
+    parser.add_argument('--startup-report', nargs='?', const='text', choices=('text', 'json'),
+                        help="Вывести время этапов запуска в stderr")
+    parser.add_argument('--quit-after-startup', action='store_true',
+                        help="Закрыть приложение после загрузки первой вкладки (для замеров)")
+    args, qt_args = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    
+    profile = StartupProfile(_STARTED)
+    profile.mark('import')
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     
     app.setStyle('Fusion')
     
-    window = MainWindow()
+    window = MainWindow(args.db, profile)
     window.show()
     
+    def finish_startup():
+        window.tab_loaded.disconnect(finish_startup)
+        if args.startup_report == 'json':
+            print(profile.to_json(), file=sys.stderr)
+        elif args.startup_report:
+            print(format_startup_report(profile.report()), file=sys.stderr)
+        if args.quit_after_startup:
+            window.close()
+    
+    if args.startup_report or args.quit_after_startup:
+        window.tab_loaded.connect(finish_startup)
+    
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
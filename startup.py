@@ -0,0 +1,59 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Этапы запуска в порядке выполнения и их подписи в отчете
+STARTUP_PHASES = (
+    ('import', "Импорт модулей"),
+    ('schema', "Подключение и схема БД"),
+    ('window', "Создание окна"),
+    ('first_paint', "Первая отрисовка окна"),
+    ('first_tab', "Загрузка первой вкладки"),
+)
+
+
+class StartupProfile:
+    """Отметки времени запуска приложения.
+
+    Каждая отметка фиксирует конец этапа; длительность этапа считается от
+    предыдущей отметки, а время до первого окна — от начала импорта до first_paint.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        if phase not in self.phases():
+            self.marks.append((phase, time.perf_counter()))
+
+    def phases(self) -> List[str]:
+        return [phase for phase, _ in self.marks]
+
+    def report(self) -> Dict[str, float]:
+        result = {}
+        previous = self.started
+        for phase, moment in self.marks:
+            result[phase] = moment - previous
+            previous = moment
+        moments = dict(self.marks)
+        if 'first_paint' in moments:
+            result['time_to_first_window'] = moments['first_paint'] - self.started
+        if self.marks:
+            result['total'] = self.marks[-1][1] - self.started
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.report())
+
+
+def format_startup_report(report: Dict[str, float]) -> str:
+    lines = [f"{'Этап':<28} {'Время, мс':>10}"]
+    for phase, title in STARTUP_PHASES:
+        if phase in report:
+            lines.append(f"{title:<28} {report[phase] * 1000:>10.1f}")
+    if 'time_to_first_window' in report:
+        lines.append(f"{'До первого окна':<28} {report['time_to_first_window'] * 1000:>10.1f}")
+    if 'total' in report:
+        lines.append(f"{'Всего':<28} {report['total'] * 1000:>10.1f}")
+    return "\n".join(lines)
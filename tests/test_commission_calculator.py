@@ -0,0 +1,105 @@
+import random
+import unittest
+from typing import Dict, List, Optional, Sequence
+
+from commission_calculator import COMMISSION_FIELDS, CommissionCalculator, _load_numpy
+from database import Database
+
+SEEDS = range(8)
+ROW_COUNT = 400
+
+PROPERTY_TYPES = ['apartment', 'house', 'land', 'garage']
+# Цены, на которых комиссии и доли попадают на середину между сотыми (x.xx5)
+EDGE_PRICES = [0.05, 0.15, 0.25, 1.05, 1.25, 2.675, 10.05, 12.5, 12345.65, 0.125]
+SHARES = [None, 0, 0.0, 12.5, 33.3, 45.0, 50, 87.5, 100]
+
+
+def scalar_commissions(property_type: str, price: Optional[float],
+                       seller_share: Optional[float], buyer_share: Optional[float]) -> Dict[str, float]:
+    # Построчный расчет через скалярные функции калькулятора
+    if price is None:
+        return {field: 0.0 for field in COMMISSION_FIELDS}
+    seller = CommissionCalculator.calculate_commission_for_seller(property_type, float(price))
+    buyer = CommissionCalculator.calculate_commission_for_buyer(float(price))
+    seller_realtor = seller * CommissionCalculator.realtor_share_rate(seller_share)
+    buyer_realtor = buyer * CommissionCalculator.realtor_share_rate(buyer_share)
+    company = (seller - seller_realtor) + (buyer - buyer_realtor)
+    values = (seller, buyer, seller_realtor, buyer_realtor, company)
+    return {field: round(value, 2) for field, value in zip(COMMISSION_FIELDS, values)}
+
+
+def scalar_batch(property_types: Sequence[str], prices: Sequence[Optional[float]],
+                 seller_shares: Sequence[Optional[float]], buyer_shares: Sequence[Optional[float]]) -> Dict[str, List[float]]:
+    rows = [scalar_commissions(*row) for row in zip(property_types, prices, seller_shares, buyer_shares)]
+    return {field: [row[field] for row in rows] for field in COMMISSION_FIELDS}
+
+
+def random_inputs(seed: int):
+    rng = random.Random(seed)
+    prices = [rng.choice([None, rng.choice(EDGE_PRICES), rng.randint(1, 100000),
+                          round(rng.uniform(0, 100000), 3), round(rng.uniform(0, 10), 3)])
+              for _ in range(ROW_COUNT)]
+    return ([rng.choice(PROPERTY_TYPES) for _ in range(ROW_COUNT)], prices,
+            [rng.choice(SHARES) for _ in range(ROW_COUNT)], [rng.choice(SHARES) for _ in range(ROW_COUNT)])
+
+
+class CommissionBatchTest(unittest.TestCase):
+    """Пакетный расчет комиссий совпадает с построчным вплоть до округления."""
+
+    def check_batch(self, use_numpy: bool):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                inputs = random_inputs(seed)
+                self.assertEqual(CommissionCalculator.calculate_commissions_batch(*inputs, use_numpy=use_numpy),
+                                 scalar_batch(*inputs))
+
+        edges = (['apartment', 'house', 'land'] * len(EDGE_PRICES), [p for p in EDGE_PRICES for _ in range(3)])
+        for share in SHARES:
+            with self.subTest(share=share):
+                inputs = edges + ([share] * len(edges[1]), [share] * len(edges[1]))
+                self.assertEqual(CommissionCalculator.calculate_commissions_batch(*inputs, use_numpy=use_numpy),
+                                 scalar_batch(*inputs))
+
+        empty = CommissionCalculator.calculate_commissions_batch([], [], [], [], use_numpy=use_numpy)
+        self.assertEqual(empty, {field: [] for field in COMMISSION_FIELDS})
+
+    @unittest.skipIf(_load_numpy() is None, "numpy не установлен")
+    def test_numpy_matches_scalar(self):
+        self.check_batch(use_numpy=True)
+
+    def test_python_matches_scalar(self):
+        self.check_batch(use_numpy=False)
+
+    def test_missing_price_gives_zero(self):
+        result = CommissionCalculator.calculate_commissions_batch(['house', 'land'], [None, 100], [50, 50], [None, None],
+                                                                  use_numpy=False)
+        self.assertEqual([result[field][0] for field in COMMISSION_FIELDS], [0.0] * len(COMMISSION_FIELDS))
+
+    def test_all_deals_match_deal_commissions(self):
+        # calculate_all_deal_commissions по базе против calculate_deal_commissions для каждой сделки
+        rng = random.Random(0)
+        db = Database(':memory:')
+        realtors = [db.add_realtor('Иванов', 'Иван', 'Иванович', share) for share in [None, 0, 12.5, 33.3, 87.5, 100]]
+        client_id = db.add_client('Петров', 'Петр', None, '+79160000001', None)
+        for _ in range(60):
+            property_type = rng.choice(['apartment', 'house', 'land'])
+            property_id = db.add_property(property_type, city='Москва')
+            price = rng.choice([1, 5, 15, 25, 35, 1005, 12345, rng.randint(1, 100000)])
+            offer_id = db.add_offer(client_id, rng.choice(realtors), property_id, price, 12)
+            demand_id = db.add_demand(client_id, rng.choice(realtors), property_type, 'Москва', None, None, None,
+                                      1, 100000, 1, 12)
+            db.add_deal(demand_id, offer_id)
+
+        for use_numpy in ([False, True] if _load_numpy() is not None else [False]):
+            with self.subTest(use_numpy=use_numpy):
+                result = CommissionCalculator.calculate_all_deal_commissions(db, use_numpy=use_numpy)
+                self.assertEqual(len(result['deal_id']), 60)
+                for index, deal_id in enumerate(result['deal_id']):
+                    expected = CommissionCalculator.calculate_deal_commissions(db.get_deal(deal_id), db)
+                    self.assertEqual({field: result[field][index] for field in COMMISSION_FIELDS}, expected,
+                                     f"сделка {deal_id}")
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
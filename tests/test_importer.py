@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import Database
+from importer import DataImporter
+
+
+class ImportFileTest(unittest.TestCase):
+    """Потоковый импорт: контрольные точки, замена файла и ошибки отдельных строк."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = Database(':memory:')
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def cities(self):
+        return [row['city'] for row in self.db.get_properties()]
+
+    def test_checkpoint_cleared_after_import(self):
+        path = self.write('feed.csv', "type,city\nland,A\nland,B\n")
+        stats = DataImporter(self.db).import_file('properties', path)
+        self.assertEqual(stats['inserted'], 2)
+        self.assertIsNone(self.db.get_import_checkpoint(os.path.abspath(path)))
+
+    def test_replaced_file_imported_from_start(self):
+        path = self.write('feed.csv', "type,city\nland,A\nland,B\n")
+        DataImporter(self.db).import_file('properties', path)
+        self.write('feed.csv', "type,city\nland,C\nland,D\nland,E\n")
+        stats = DataImporter(self.db).import_file('properties', path)
+        self.assertEqual((stats['skipped'], stats['inserted']), (0, 3))
+        self.assertEqual(self.cities(), ['A', 'B', 'C', 'D', 'E'])
+
+    def test_stale_checkpoint_of_changed_file_ignored(self):
+        path = self.write('feed.csv', "type,city\nland,A\nland,B\n")
+        self.db.save_import_checkpoint(os.path.abspath(path), 'properties', 1, 'другой файл')
+        stats = DataImporter(self.db).import_file('properties', path)
+        self.assertEqual((stats['skipped'], stats['inserted']), (0, 2))
+
+    def test_resume_after_failure(self):
+        path = self.write('feed.csv', "type,city\n" + "".join(f"land,{city}\n" for city in 'ABCDE'))
+        importer = DataImporter(self.db, chunk_size=2)
+        insert_chunk = importer._insert_chunk
+        calls = []
+
+        def failing_insert(kind, records):
+            calls.append(len(records))
+            if len(calls) == 2:
+                raise RuntimeError("сбой")
+            return insert_chunk(kind, records)
+
+        importer._insert_chunk = failing_insert
+        with self.assertRaises(RuntimeError):
+            importer.import_file('properties', path)
+        self.db.conn.rollback()
+        self.assertEqual(self.db.get_import_checkpoint(os.path.abspath(path))['rows_done'], 2)
+
+        stats = DataImporter(self.db, chunk_size=2).import_file('properties', path)
+        self.assertEqual((stats['skipped'], stats['inserted']), (2, 3))
+        self.assertEqual(self.cities(), list('ABCDE'))
+        self.assertIsNone(self.db.get_import_checkpoint(os.path.abspath(path)))
+
+    def test_invalid_jsonl_lines_are_row_errors(self):
+        path = self.write('feed.jsonl', '{"type": "land", "city": "A"}\n{bad\n[1, 2]\n'
+                                        '{"type": "apartment", "city": "B", "floor": 2.9}\n'
+                                        '{"type": "apartment", "city": "C", "floor": 3.0}\n')
+        errors_path = os.path.join(self.directory, 'errors.jsonl')
+        stats = DataImporter(self.db).import_file('properties', path, errors_path=errors_path)
+        self.assertEqual((stats['rows'], stats['inserted'], stats['errors']), (5, 2, 3))
+        self.assertEqual(self.cities(), ['A', 'C'])
+        with open(errors_path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['row'] for line in f], [2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import random
+import unittest
+from typing import Dict, Optional, Set, Tuple
+
+from database import Database
+
+SEEDS = range(12)
+PROPERTY_COUNT = 120
+DEMAND_COUNT = 120
+
+CENTER = (55.75, 37.6)
+CITIES = ['Москва', 'Тверь']
+STREETS = ['Ленина', 'Мира']
+HOUSE_NUMBERS = ['1', '2']
+APARTMENT_NUMBERS = ['1', '2', None]
+
+
+def _bounds(rng: random.Random, lows, steps) -> Tuple[Optional[float], Optional[float]]:
+    # Границы диапазона: без минимума, без максимума (открытый сверху), нулевые и обычные;
+    # максимум без минимума check_match не учитывает
+    low = rng.choice(lows)
+    if low is None:
+        return None, rng.choice([None, max(steps)])
+    step = rng.choice(steps + [None])
+    return low, None if step is None else low + step
+
+
+def _address_part(rng: random.Random, values):
+    # В потребности части адреса бывают пустыми строками — такие не ограничивают подбор
+    return rng.choice([None, ''] + list(values))
+
+
+def _property_fields(rng: random.Random, property_type: str) -> Dict:
+    fields = {
+        'city': rng.choice(CITIES),
+        'street': rng.choice(STREETS + [None]),
+        'house_number': rng.choice(HOUSE_NUMBERS),
+        'apartment_number': rng.choice(APARTMENT_NUMBERS),
+        'latitude': None,
+        'longitude': None,
+    }
+    if rng.random() < 0.7:
+        fields['latitude'] = CENTER[0] + rng.uniform(-0.05, 0.05)
+        fields['longitude'] = CENTER[1] + rng.uniform(-0.05, 0.05)
+    if property_type == 'apartment':
+        fields.update(floor=rng.choice([None, 0, 1, 2, 5, 9]), rooms=rng.choice([None, 0, 1, 2, 3]),
+                      area=rng.choice([None, 0, 25.5, 40, 60]))
+    elif property_type == 'house':
+        fields.update(floors=rng.choice([None, 0, 1, 2, 3]), rooms=rng.choice([None, 0, 2, 4, 6]),
+                      area=rng.choice([None, 0, 80, 120.5, 200]))
+    else:
+        fields.update(area=rng.choice([None, 0, 300, 600, 1200.5]))
+    return fields
+
+
+def _demand_fields(rng: random.Random, property_type: str) -> Dict:
+    min_price = rng.choice([5000, 10000, 20000, 30000])
+    min_period = rng.choice([1, 3, 6])
+    fields = {
+        'property_type': property_type,
+        'city': _address_part(rng, CITIES),
+        'street': _address_part(rng, STREETS),
+        'house_number': _address_part(rng, HOUSE_NUMBERS),
+        'apartment_number': _address_part(rng, ['1', '2']),
+        'min_price': min_price,
+        'max_price': min_price + rng.choice([0, 10000, 20000]),
+        'min_rental_period': min_period,
+        'max_rental_period': min_period + rng.choice([0, 3, 6]),
+        'latitude': None,
+        'longitude': None,
+        'radius_km': None,
+    }
+    if rng.random() < 0.25:
+        fields.update(latitude=CENTER[0] + rng.uniform(-0.03, 0.03), longitude=CENTER[1] + rng.uniform(-0.03, 0.03),
+                      radius_km=rng.choice([1, 3, 5]))
+    if property_type == 'apartment':
+        fields['min_floor'], fields['max_floor'] = _bounds(rng, [None, 0, 1, 2], [0, 3, 8])
+        fields['min_rooms'], fields['max_rooms'] = _bounds(rng, [None, 0, 1, 2], [0, 1, 2])
+        fields['min_area'], fields['max_area'] = _bounds(rng, [None, 0, 25.5, 40], [0, 20, 40])
+    elif property_type == 'house':
+        fields['min_floors'], fields['max_floors'] = _bounds(rng, [None, 0, 1, 2], [0, 1, 2])
+        fields['min_rooms'], fields['max_rooms'] = _bounds(rng, [None, 0, 2, 4], [0, 2, 4])
+        fields['min_area'], fields['max_area'] = _bounds(rng, [None, 0, 80, 120.5], [0, 50, 100])
+    else:
+        fields['min_area'], fields['max_area'] = _bounds(rng, [None, 0, 300, 600], [0, 300, 900])
+    return fields
+
+
+def build_database(seed: int) -> Database:
+    """Случайная база: объекты, предложения и потребности добавляются по одной и пакетами,
+    затем часть потребностей, предложений и объектов изменяется, заключаются и удаляются сделки.
+    Таблица matches все это время поддерживается инкрементально."""
+    rng = random.Random(seed)
+    db = Database(':memory:')
+    realtor_id = db.add_realtor('Иванов', 'Иван', 'Иванович')
+    clients = [db.add_client('Петров', 'Петр', None, '+79160000001', None),
+               db.add_client(None, None, None, '+79160000002', None)]
+
+    properties = []
+    for _ in range(PROPERTY_COUNT):
+        property_type = rng.choice(['apartment', 'house', 'land'])
+        properties.append((db.add_property(property_type, **_property_fields(rng, property_type)), property_type))
+    offer_records = [
+        {'client_id': rng.choice(clients), 'realtor_id': realtor_id, 'property_id': property_id,
+         'price': rng.choice([5000, 10000, 15000, 20000, 30000, 40000, 50000]),
+         'rental_period': rng.randint(1, 12)}
+        for property_id, _ in properties
+    ]
+    half = len(offer_records) // 2
+    for record in offer_records[:half]:
+        db.add_offer(**record)
+    db.add_offers_bulk(offer_records[half:])
+
+    demand_records = []
+    for _ in range(DEMAND_COUNT):
+        fields = _demand_fields(rng, rng.choice(['apartment', 'house', 'land']))
+        fields.update(client_id=rng.choice(clients), realtor_id=realtor_id)
+        demand_records.append(fields)
+    for record in demand_records:
+        if rng.random() < 0.5:
+            db.add_demands_bulk([record])
+        else:
+            db.add_demand(**record)
+
+    demand_ids = [row['id'] for row in db.get_demands()]
+    offer_ids = [row['id'] for row in db.get_offers()]
+    for demand_id in rng.sample(demand_ids, len(demand_ids) // 3):
+        demand = db.get_demand(demand_id)
+        fields = _demand_fields(rng, demand['property_type'])
+        db.update_demand(demand_id, demand['client_id'], demand['realtor_id'], **fields)
+    for offer_id in rng.sample(offer_ids, len(offer_ids) // 4):
+        offer = db.get_offer(offer_id)
+        db.update_offer(offer_id, offer['client_id'], offer['realtor_id'], offer['property_id'],
+                        rng.choice([10000, 20000, 30000]), rng.randint(1, 12))
+    for property_id, property_type in rng.sample(properties, len(properties) // 4):
+        db.update_property(property_id, **_property_fields(rng, property_type))
+
+    deals = []
+    for demand_id, offer_id in zip(rng.sample(demand_ids, 6), rng.sample(offer_ids, 6)):
+        deals.append(db.add_deal(demand_id, offer_id))
+    db.delete_deal(deals[0])
+    return db
+
+
+def satisfied_ids(db: Database, column: str) -> Set[int]:
+    return {row[0] for row in db.conn.execute(f"SELECT {column} FROM deals")}
+
+
+def reference_pairs(db: Database) -> Set[Tuple[int, int]]:
+    # Пары (потребность, предложение), которые принимает check_match, по всем предложениям без сделок
+    demands = [db.get_demand(row['id']) for row in db.get_demands()]
+    busy_offers = satisfied_ids(db, 'offer_id')
+    offers = [db.get_offer(row['id']) for row in db.get_offers() if row['id'] not in busy_offers]
+    properties = {offer['property_id']: db.get_property(offer['property_id']) for offer in offers}
+    return {
+        (demand['id'], offer['id'])
+        for demand in demands
+        for offer in offers
+        if db.check_match(demand, properties[offer['property_id']], offer)
+    }
+
+
+class MatchingEquivalenceTest(unittest.TestCase):
+    """Все пути подбора совпадают с построчной проверкой check_match."""
+
+    def check_all_paths(self, seed: int):
+        db = build_database(seed)
+        expected = reference_pairs(db)
+        busy_demands, busy_offers = satisfied_ids(db, 'demand_id'), satisfied_ids(db, 'offer_id')
+        open_expected = {(d, o) for d, o in expected if d not in busy_demands}
+        demand_ids = [row['id'] for row in db.get_demands()]
+        offer_ids = [row['id'] for row in db.get_offers() if row['id'] not in busy_offers]
+        self.assertTrue(open_expected, "в случайной базе должны быть совпадения")
+
+        # Инкрементальное обновление matches (_refresh_demand_matches / _refresh_offer_matches)
+        self.assertEqual({(m['demand_id'], m['offer_id']) for m in db.get_matches()}, open_expected)
+
+        for demand_id in demand_ids:
+            wanted = {o for d, o in expected if d == demand_id}
+            self.assertEqual({row['id'] for row in db.get_matching_offers(demand_id)}, wanted,
+                             f"get_matching_offers({demand_id})")
+            ranked = db.get_ranked_offers(demand_id, limit=len(offer_ids) + 1, max_score=0.0)
+            self.assertEqual({row['id'] for row in ranked}, wanted, f"get_ranked_offers({demand_id})")
+
+        for offer_id in offer_ids:
+            wanted = {d for d, o in open_expected if o == offer_id}
+            self.assertEqual({row['id'] for row in db.get_matching_demands(offer_id)}, wanted,
+                             f"get_matching_demands({offer_id})")
+
+        db.rebuild_matches()
+        self.assertEqual({(m['demand_id'], m['offer_id']) for m in db.get_matches()}, open_expected)
+        db.close()
+
+    def test_paths_match_check_match(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                self.check_all_paths(seed)
+
+    def test_score_is_zero_exactly_for_matches(self):
+        db = build_database(100)
+        expected = reference_pairs(db)
+        busy_offers = satisfied_ids(db, 'offer_id')
+        for row in db.get_demands():
+            demand = db.get_demand(row['id'])
+            for offer in db.get_offers():
+                if offer['id'] in busy_offers:
+                    continue
+                prop = db.get_property(offer['property_id'])
+                score = db.score_match(demand, prop, offer)
+                self.assertEqual(score == 0, (demand['id'], offer['id']) in expected)
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import random
+import unittest
+
+from database import FIRST_PERSON_KEY, Database, person_sort_key
+
+PAGE_SIZE = 7
+NAMES = ['Иванов', 'Иван', 'Ёлкин', 'Абрамов', 'абрамов', '', None]
+
+
+def read_pages(get, search=None):
+    # Страницы по ключу последней строки, как их загружает PagedTableModel
+    rows, after = [], FIRST_PERSON_KEY
+    while True:
+        page = get(search, PAGE_SIZE, after)
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        after = person_sort_key(page[-1])
+
+
+class PersonPagesTest(unittest.TestCase):
+    """Постраничные списки клиентов и риэлторов идут по алфавиту без пропусков и повторов."""
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.db = Database(':memory:')
+        for index in range(150):
+            self.db.add_client(rng.choice(NAMES), rng.choice(NAMES), rng.choice(NAMES), f'+7916{index:07d}', None)
+        for _ in range(60):
+            self.db.add_realtor(*(rng.choice(NAMES[:5]) for _ in range(3)))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_pages_match_full_list(self):
+        for get in (self.db.get_clients, self.db.get_realtors):
+            with self.subTest(get=get.__name__):
+                full = get()
+                self.assertEqual(full, sorted(full, key=person_sort_key))
+                self.assertEqual(read_pages(get), full)
+
+    def test_search_pages_alphabetical(self):
+        for get in (self.db.get_clients, self.db.get_realtors):
+            for search in ('ив', 'абрамов', 'елкин иван'):
+                with self.subTest(get=get.__name__, search=search):
+                    rows = read_pages(get, search)
+                    self.assertEqual(rows, sorted(get(search), key=person_sort_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
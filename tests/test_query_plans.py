@@ -0,0 +1,97 @@
+import unittest
+from typing import Callable, List
+
+from database import FIRST_PERSON_KEY, Database
+
+
+class QueryPlanTest(unittest.TestCase):
+    """Запросы выборок и подбора используют индексы миграции 1, а не полный просмотр таблиц."""
+
+    def setUp(self):
+        self.db = Database(':memory:')
+        db = self.db
+        self.realtor_id = db.add_realtor('Иванов', 'Иван', 'Иванович')
+        self.client_id = db.add_client('Петров', 'Петр', None, '+79160000001', None)
+        self.property_id = db.add_property('apartment', city='Москва', street='Ленина', house_number='1',
+                                           latitude=55.75, longitude=37.6, floor=3, rooms=2, area=45)
+        db.add_property('house', city='Тверь', street='Мира', floors=2, rooms=4, area=120)
+        self.offer_id = db.add_offer(self.client_id, self.realtor_id, self.property_id, 30000, 12)
+        self.demand_id = db.add_demand(self.client_id, self.realtor_id, 'apartment', 'Москва', None, None, None,
+                                       20000, 40000, 6, 12, min_rooms=1, max_rooms=3)
+
+    def tearDown(self):
+        self.db.close()
+
+    def query_plans(self, call: Callable) -> List[str]:
+        # Строки EXPLAIN QUERY PLAN всех SELECT, выполненных вызовом (с подставленными параметрами)
+        statements = []
+        self.db.conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            self.db.conn.set_trace_callback(None)
+        plans = []
+        for sql in statements:
+            if sql.lstrip().upper().startswith('SELECT'):
+                plans.extend(row[3] for row in self.db.conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        self.assertTrue(plans, "вызов не выполнил ни одного SELECT")
+        return plans
+
+    def assert_uses_index(self, plans: List[str], *indexes: str):
+        for index in indexes:
+            self.assertTrue(any(f"INDEX {index} " in detail for detail in plans), f"{index} не используется: {plans}")
+        # Просмотр таблицы или индекса целиком — строка SCAN; обход R*Tree (VIRTUAL TABLE) идет по его индексу
+        scans = [detail for detail in plans if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail]
+        self.assertEqual(scans, [])
+
+    def test_offers_by_client(self):
+        plans = self.query_plans(lambda: self.db.get_offers_by_client(self.client_id))
+        self.assert_uses_index(plans, 'idx_offers_client')
+
+    def test_delete_realtor_reference_counts(self):
+        plans = self.query_plans(lambda: self.assertFalse(self.db.delete_realtor(self.realtor_id)))
+        self.assert_uses_index(plans, 'idx_offers_realtor')
+        unused = self.db.add_realtor('Сидоров', 'Сидор', 'Сидорович')
+        plans = self.query_plans(lambda: self.assertTrue(self.db.delete_realtor(unused)))
+        self.assert_uses_index(plans, 'idx_offers_realtor', 'idx_demands_realtor')
+
+    def test_delete_property_reference_count(self):
+        plans = self.query_plans(lambda: self.assertFalse(self.db.delete_property(self.property_id)))
+        self.assert_uses_index(plans, 'idx_offers_property_price')
+
+    def test_person_pages_by_full_name(self):
+        # Алфавитные страницы клиентов и риэлторов: поиск по индексу от ключа последней строки
+        for get, index in ((self.db.get_clients, 'idx_clients_full_name'),
+                           (self.db.get_realtors, 'idx_realtors_full_name')):
+            for after in (FIRST_PERSON_KEY, ('Петров', 'Петр', '', 7)):
+                plans = self.query_plans(lambda: get(None, 50, after))
+                self.assert_uses_index(plans, index)
+
+    def test_properties_filter(self):
+        plans = self.query_plans(lambda: self.db.get_properties('apartment', city='Моск'))
+        self.assert_uses_index(plans, 'idx_properties_type_city_street')
+        plans = self.query_plans(lambda: self.db.get_properties('house', limit=50))
+        self.assert_uses_index(plans, 'idx_properties_type_city_street')
+
+    def test_matching_offers_for_demand(self):
+        # Объекты потребности по типу, затем их предложения в диапазоне цен
+        plans = self.query_plans(lambda: self.db.get_matching_offers(self.demand_id))
+        self.assert_uses_index(plans, 'idx_properties_type_city_street', 'idx_offers_property_price')
+
+    def test_ranked_offers_by_price(self):
+        plans = self.query_plans(lambda: self.db.get_ranked_offers(self.demand_id))
+        self.assert_uses_index(plans, 'idx_offers_price_period')
+
+    def test_open_demands_by_type_and_price(self):
+        plans = self.query_plans(lambda: self.db.get_open_demands('apartment', min_price=25000, max_price=35000))
+        self.assert_uses_index(plans, 'idx_demands_type_price')
+
+    def test_matching_demands_for_offer(self):
+        # Обратный подбор идет по R*Tree demands_ranges, потребности читаются по id
+        plans = self.query_plans(lambda: self.db.get_matching_demands(self.offer_id))
+        self.assert_uses_index(plans)
+        self.assertTrue(any(detail.startswith('SCAN dr VIRTUAL TABLE') for detail in plans), plans)
+
+
+if __name__ == '__main__':
+    unittest.main()
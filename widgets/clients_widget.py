@@ -1,8 +1,9 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QLineEdit, QLabel, QMessageBox, QDialog, 
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
+                             QLineEdit, QLabel, QMessageBox, QDialog, 
                              QFormLayout, QDialogButtonBox, QTextEdit)
-from PyQt5.QtCore import pyqtSignal, Qt
-from database import Database
+from database import FIRST_PERSON_KEY, Database, person_sort_key
+from widgets.search_controller import SearchController
+from widgets.table_model import PAGE_SIZE, PagedTableModel
 
 class ClientDialog(QDialog):
     
@@ -71,13 +72,21 @@ class ClientDialog(QDialog):
 
 class ClientsWidget(QWidget):
     
-    data_changed = pyqtSignal()
-    
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        self.search = ''
+        # Вкладка скрыта во время изменения — перечитать при показе
+        self.dirty = False
+        self.search_controller = SearchController(
+            db, lambda search_db, search: (search, search_db.get_clients(search or None, PAGE_SIZE, FIRST_PERSON_KEY)),
+            parent=self
+        )
+        self.search_controller.results_ready.connect(self.show_clients)
+        self.search_controller.search_failed.connect(self.show_search_error)
         self.init_ui()
         self.refresh_data()
+        self.db.subscribe(self.on_db_changed)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -86,7 +95,7 @@ class ClientsWidget(QWidget):
         
         self.search_edit = QLineEdit()
         self.search_edit.setPlaceholderText("Поиск по ФИО, телефону, email...")
-        self.search_edit.textChanged.connect(self.refresh_data)
+        self.search_edit.textChanged.connect(self.search_changed)
         
         add_btn = QPushButton("➕ Добавить клиента")
         add_btn.clicked.connect(self.add_client)
@@ -110,13 +119,18 @@ class ClientsWidget(QWidget):
         
         layout.addLayout(toolbar)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Фамилия", "Имя", "Отчество", "Телефон", "Email"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.model = PagedTableModel([
+            ("ID", lambda client: client['id']),
+            ("Фамилия", lambda client: client.get('surname')),
+            ("Имя", lambda client: client.get('name')),
+            ("Отчество", lambda client: client.get('patronymic')),
+            ("Телефон", lambda client: client.get('phone')),
+            ("Email", lambda client: client.get('email')),
+        ], row_key=person_sort_key, parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setStretchLastSection(True)
         
         layout.addWidget(self.table)
@@ -127,34 +141,48 @@ class ClientsWidget(QWidget):
         self.info_text.setPlaceholderText("Выберите клиента для просмотра связанных данных...")
         layout.addWidget(self.info_text)
         
-        self.table.itemSelectionChanged.connect(self.show_client_info)
+        self.table.selectionModel().selectionChanged.connect(self.show_client_info)
         
         self.setLayout(layout)
     
+    def search_changed(self):
+        self.search_controller.request(self.search_edit.text().strip())
+    
     def refresh_data(self):
-        search = self.search_edit.text().strip()
-        clients = self.db.get_clients(search if search else None)
-        
-        self.table.setRowCount(len(clients))
-        for i, client in enumerate(clients):
-            self.table.setItem(i, 0, QTableWidgetItem(str(client['id'])))
-            self.table.setItem(i, 1, QTableWidgetItem(client.get('surname') or ''))
-            self.table.setItem(i, 2, QTableWidgetItem(client.get('name') or ''))
-            self.table.setItem(i, 3, QTableWidgetItem(client.get('patronymic') or ''))
-            self.table.setItem(i, 4, QTableWidgetItem(client.get('phone') or ''))
-            self.table.setItem(i, 5, QTableWidgetItem(client.get('email') or ''))
-            
-            for col in range(6):
-                item = self.table.item(i, col)
-                if item:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        self.search_controller.request(self.search_edit.text().strip(), immediate=True)
+    
+    def show_search_error(self, error):
+        QMessageBox.warning(self, "Ошибка поиска", error)
+    
+    def show_clients(self, result):
+        search, clients = result
+        self.search = search
+        self.model.reset(lambda after, limit: self.db.get_clients(search or None, limit, after or FIRST_PERSON_KEY),
+                         clients)
+        self.info_text.clear()
+    
+    def on_db_changed(self, entity, ids):
+        if entity == 'clients':
+            if self.isVisible():
+                self.model.sync_rows(ids, self.db.get_clients(self.search or None, ids=ids))
+            else:
+                self.dirty = True
+        elif entity in ('offers', 'demands') and self.isVisible():
+            self.show_client_info()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.dirty = False
+            self.refresh_data()
+        else:
+            self.show_client_info()
     
     def get_selected_client_id(self):
-        row = self.table.currentRow()
-        if row < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             return None
-        item = self.table.item(row, 0)
-        return int(item.text()) if item else None
+        return self.model.row_id(index.row())
     
     def add_client(self):
         dialog = ClientDialog(self)
@@ -162,8 +190,6 @@ class ClientsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.add_client(**data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Клиент успешно добавлен!")
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
@@ -186,8 +212,6 @@ class ClientsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.update_client(client_id, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Клиент успешно обновлен!")
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
@@ -209,8 +233,6 @@ class ClientsWidget(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 if self.db.delete_client(client_id):
-                    self.refresh_data()
-                    self.data_changed.emit()
                     QMessageBox.information(self, "Успех", "Клиент успешно удален!")
                 else:
                     QMessageBox.warning(
@@ -234,7 +256,7 @@ class ClientsWidget(QWidget):
         offers = self.db.get_offers_by_client(client_id)
         info.append(f"Предложения: {len(offers)}")
         for offer in offers[:5]:
-            info.append(f"  - Предложение
+            info.append(f"  - Предложение #{offer['id']}: {offer.get('price', 0)} руб/мес, {offer.get('rental_period', 0)} мес.")
         if len(offers) > 5:
             info.append(f"  ... и еще {len(offers) - 5}")
         
@@ -243,7 +265,7 @@ class ClientsWidget(QWidget):
         demands = self.db.get_demands_by_client(client_id)
         info.append(f"Потребности: {len(demands)}")
         for demand in demands[:5]:
-            info.append(f"  - Потребность
+            info.append(f"  - Потребность #{demand['id']}: {demand.get('min_price', 0)} - {demand.get('max_price', 0)} руб/мес")
         if len(demands) > 5:
             info.append(f"  ... и еще {len(demands) - 5}")
         
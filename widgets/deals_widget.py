@@ -1,8 +1,9 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QLabel, QMessageBox, QDialog, 
-                             QFormLayout, QDialogButtonBox, QComboBox, QTextEdit, QGroupBox)
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
+                             QLabel, QMessageBox, QDialog, 
+                             QFormLayout, QDialogButtonBox, QTextEdit, QGroupBox)
 from database import Database
+from widgets.lookup_combo import LookupComboBox
+from widgets.table_model import PagedTableModel
 from commission_calculator import CommissionCalculator
 
 class DealDialog(QDialog):
@@ -21,38 +22,16 @@ class DealDialog(QDialog):
         layout = QVBoxLayout()
         form = QFormLayout()
         
-        self.demand_combo = QComboBox()
-        demands = self.db.get_demands() if self.db else []
-        for demand in demands:
-            if not self.db.is_demand_satisfied(demand['id']):
-                prop_type = demand.get('property_type', '')
-                type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
-                text = f"Потребность
-                self.demand_combo.addItem(text, demand['id'])
+        # В списках только потребности и предложения без сделок
+        self.demand_combo = LookupComboBox(self.db, 'demands', open_only=True)
         form.addRow("Потребность *:", self.demand_combo)
         
-        self.offer_combo = QComboBox()
-        offers = self.db.get_offers() if self.db else []
-        for offer in offers:
-            if not self.db.is_offer_satisfied(offer['id']):
-                prop_type = offer.get('property_type', '')
-                type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
-                text = f"Предложение
-                self.offer_combo.addItem(text, offer['id'])
+        self.offer_combo = LookupComboBox(self.db, 'offers', open_only=True)
         form.addRow("Предложение *:", self.offer_combo)
         
         if self.deal_data:
-            demand_id = self.deal_data.get('demand_id')
-            for i in range(self.demand_combo.count()):
-                if self.demand_combo.itemData(i) == demand_id:
-                    self.demand_combo.setCurrentIndex(i)
-                    break
-            
-            offer_id = self.deal_data.get('offer_id')
-            for i in range(self.offer_combo.count()):
-                if self.offer_combo.itemData(i) == offer_id:
-                    self.offer_combo.setCurrentIndex(i)
-                    break
+            self.demand_combo.set_current_id(self.deal_data.get('demand_id'))
+            self.offer_combo.set_current_id(self.deal_data.get('offer_id'))
         
         layout.addLayout(form)
         
@@ -71,14 +50,15 @@ class DealDialog(QDialog):
 
 class DealsWidget(QWidget):
     
-    data_changed = pyqtSignal()
-    
     def __init__(self, db: Database, commission_calculator: CommissionCalculator):
         super().__init__()
         self.db = db
         self.commission_calculator = commission_calculator
+        # Вкладка скрыта во время изменения — перечитать при показе
+        self.dirty = False
         self.init_ui()
         self.refresh_data()
+        self.db.subscribe(self.on_db_changed)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -105,13 +85,16 @@ class DealsWidget(QWidget):
         
         layout.addLayout(toolbar)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Потребность", "Предложение", "Дата создания"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.model = PagedTableModel([
+            ("ID", lambda deal: deal['id']),
+            ("Потребность", lambda deal: f"Потребность #{deal['demand_id']}"),
+            ("Предложение", lambda deal: f"Предложение #{deal['offer_id']}"),
+            ("Дата создания", lambda deal: deal.get('created_at')),
+        ], descending=True, parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setStretchLastSection(True)
         
         layout.addWidget(self.table)
@@ -122,33 +105,36 @@ class DealsWidget(QWidget):
         self.commission_text.setPlaceholderText("Выберите сделку для просмотра информации о комиссиях...")
         layout.addWidget(self.commission_text)
         
-        self.table.itemSelectionChanged.connect(self.show_commission_info)
+        self.table.selectionModel().selectionChanged.connect(self.show_commission_info)
         
         self.setLayout(layout)
     
     def refresh_data(self):
-        deals = self.db.get_deals()
-        
-        self.table.setRowCount(len(deals))
-        for i, deal in enumerate(deals):
-            self.table.setItem(i, 0, QTableWidgetItem(str(deal['id'])))
-            self.table.setItem(i, 1, QTableWidgetItem(f"Потребность
-            self.table.setItem(i, 2, QTableWidgetItem(f"Предложение
-            
-            created_at = deal.get('created_at', '')
-            self.table.setItem(i, 3, QTableWidgetItem(created_at))
-            
-            for col in range(4):
-                item = self.table.item(i, col)
-                if item:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        self.model.reset(lambda before_id, limit: self.db.get_deals(limit, before_id))
+    
+    def on_db_changed(self, entity, ids):
+        if entity == 'deals':
+            if self.isVisible():
+                self.model.sync_rows(ids, self.db.get_deals(ids=ids))
+            else:
+                self.dirty = True
+        elif entity in ('offers', 'demands', 'realtors') and self.isVisible():
+            # Комиссии выбранной сделки зависят от цены, типа объекта и долей риэлторов
+            self.show_commission_info()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.dirty = False
+            self.refresh_data()
+        else:
+            self.show_commission_info()
     
     def get_selected_deal_id(self):
-        row = self.table.currentRow()
-        if row < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             return None
-        item = self.table.item(row, 0)
-        return int(item.text()) if item else None
+        return self.model.row_id(index.row())
     
     def add_deal(self):
         dialog = DealDialog(self, db=self.db)
@@ -164,9 +150,11 @@ class DealsWidget(QWidget):
                 
                 property_data = self.db.get_property(offer['property_id'])
                 if not self.db.check_match(demand, property_data, offer):
+                    score = self.db.score_match(demand, property_data, offer)
+                    deviation = f" (оценка отклонения {score:.2f})" if score is not None else ""
                     reply = QMessageBox.warning(
                         self, "Предупреждение",
-                        "Предложение не соответствует требованиям потребности!\n"
+                        f"Предложение не соответствует требованиям потребности{deviation}!\n"
                         "Все равно создать сделку?",
                         QMessageBox.Yes | QMessageBox.No
                     )
@@ -174,8 +162,6 @@ class DealsWidget(QWidget):
                         return
                 
                 self.db.add_deal(**data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Сделка успешно создана!")
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
@@ -198,8 +184,6 @@ class DealsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.update_deal(deal_id, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Сделка успешно обновлена!")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось обновить сделку:\n{str(e)}")
@@ -219,8 +203,6 @@ class DealsWidget(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 self.db.delete_deal(deal_id)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Сделка успешно удалена!")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось удалить сделку:\n{str(e)}")
@@ -231,12 +213,13 @@ class DealsWidget(QWidget):
             self.commission_text.clear()
             return
         
-        deal = self.db.get_deal(deal_id)
-        if not deal:
-            self.commission_text.clear()
-            return
-        
-        commissions = self.commission_calculator.calculate_deal_commissions(deal, self.db)
+        commissions = self.db.get_deal_commissions(deal_id)
+        if not commissions:
+            deal = self.db.get_deal(deal_id)
+            if not deal:
+                self.commission_text.clear()
+                return
+            commissions = self.commission_calculator.calculate_deal_commissions(deal, self.db)
         
         info = []
         info.append("=== Расчет комиссий и отчислений ===\n")
@@ -1,9 +1,10 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QLineEdit, QLabel, QMessageBox, QDialog, 
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
+                             QLineEdit, QLabel, QMessageBox, QDialog, 
                              QFormLayout, QDialogButtonBox, QComboBox, QSpinBox, QGroupBox,
                              QDoubleSpinBox)
-from PyQt5.QtCore import pyqtSignal, Qt
 from database import Database
+from widgets.lookup_combo import LookupComboBox
+from widgets.table_model import PagedTableModel
 
 class DemandDialog(QDialog):
     
@@ -21,20 +22,10 @@ class DemandDialog(QDialog):
         layout = QVBoxLayout()
         form = QFormLayout()
         
-        self.client_combo = QComboBox()
-        clients = self.db.get_clients() if self.db else []
-        for client in clients:
-            name = f"{client.get('surname') or ''} {client.get('name') or ''} {client.get('patronymic') or ''}".strip()
-            if not name:
-                name = f"ID: {client['id']}"
-            self.client_combo.addItem(name, client['id'])
+        self.client_combo = LookupComboBox(self.db, 'clients')
         form.addRow("Клиент *:", self.client_combo)
         
-        self.realtor_combo = QComboBox()
-        realtors = self.db.get_realtors() if self.db else []
-        for realtor in realtors:
-            name = f"{realtor.get('surname')} {realtor.get('name')} {realtor.get('patronymic')}"
-            self.realtor_combo.addItem(name, realtor['id'])
+        self.realtor_combo = LookupComboBox(self.db, 'realtors')
         form.addRow("Риэлтор *:", self.realtor_combo)
         
         self.type_combo = QComboBox()
@@ -58,6 +49,27 @@ class DemandDialog(QDialog):
         address_group.setLayout(address_layout)
         form.addRow(address_group)
         
+        area_group = QGroupBox("Район поиска (вместо точного адреса)")
+        area_layout = QFormLayout()
+        self.latitude_spin = QDoubleSpinBox()
+        self.latitude_spin.setRange(-90, 90)
+        self.latitude_spin.setDecimals(6)
+        self.latitude_spin.setSpecialValueText("Не указано")
+        self.longitude_spin = QDoubleSpinBox()
+        self.longitude_spin.setRange(-180, 180)
+        self.longitude_spin.setDecimals(6)
+        self.longitude_spin.setSpecialValueText("Не указано")
+        self.radius_spin = QDoubleSpinBox()
+        self.radius_spin.setRange(0, 1000)
+        self.radius_spin.setDecimals(1)
+        self.radius_spin.setSuffix(" км")
+        self.radius_spin.setSpecialValueText("Не указано")
+        area_layout.addRow("Широта центра:", self.latitude_spin)
+        area_layout.addRow("Долгота центра:", self.longitude_spin)
+        area_layout.addRow("Радиус:", self.radius_spin)
+        area_group.setLayout(area_layout)
+        form.addRow(area_group)
+        
         price_group = QGroupBox("Цена (руб/мес)")
         price_layout = QFormLayout()
         self.min_price_spin = QSpinBox()
@@ -188,17 +200,8 @@ class DemandDialog(QDialog):
         if not self.demand_data:
             return
         
-        client_id = self.demand_data.get('client_id')
-        for i in range(self.client_combo.count()):
-            if self.client_combo.itemData(i) == client_id:
-                self.client_combo.setCurrentIndex(i)
-                break
-        
-        realtor_id = self.demand_data.get('realtor_id')
-        for i in range(self.realtor_combo.count()):
-            if self.realtor_combo.itemData(i) == realtor_id:
-                self.realtor_combo.setCurrentIndex(i)
-                break
+        self.client_combo.set_current_id(self.demand_data.get('client_id'))
+        self.realtor_combo.set_current_id(self.demand_data.get('realtor_id'))
         
         prop_type = self.demand_data.get('property_type', 'apartment')
         type_map = {'apartment': 0, 'house': 1, 'land': 2}
@@ -210,6 +213,11 @@ class DemandDialog(QDialog):
         self.house_edit.setText(self.demand_data.get('house_number') or '')
         self.apartment_edit.setText(self.demand_data.get('apartment_number') or '')
         
+        if self.demand_data.get('radius_km') is not None:
+            self.latitude_spin.setValue(self.demand_data['latitude'])
+            self.longitude_spin.setValue(self.demand_data['longitude'])
+            self.radius_spin.setValue(self.demand_data['radius_km'])
+        
         self.min_price_spin.setValue(self.demand_data.get('min_price', 0))
         self.max_price_spin.setValue(self.demand_data.get('max_price', 0))
         self.min_period_spin.setValue(self.demand_data.get('min_rental_period', 0))
@@ -256,6 +264,10 @@ class DemandDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Максимальный срок должен быть больше или равен минимальному!")
             return
         
+        if self.radius_spin.value() > 0 and (self.latitude_spin.value() == 0 or self.longitude_spin.value() == 0):
+            QMessageBox.warning(self, "Ошибка", "Для поиска по району укажите координаты центра!")
+            return
+        
         self.accept()
     
     def get_data(self):
@@ -275,6 +287,11 @@ class DemandDialog(QDialog):
             'max_rental_period': self.max_period_spin.value()
         }
         
+        if self.radius_spin.value() > 0:
+            data['latitude'] = self.latitude_spin.value()
+            data['longitude'] = self.longitude_spin.value()
+            data['radius_km'] = self.radius_spin.value()
+        
         if prop_type == 'apartment':
             data['min_area'] = self.min_area_spin.value() if self.min_area_spin.value() > 0 else None
             data['max_area'] = self.max_area_spin.value() if self.max_area_spin.value() > 0 else None
@@ -297,13 +314,14 @@ class DemandDialog(QDialog):
 
 class DemandsWidget(QWidget):
     
-    data_changed = pyqtSignal()
-    
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        # Вкладка скрыта во время изменения — перечитать при показе
+        self.dirty = False
         self.init_ui()
         self.refresh_data()
+        self.db.subscribe(self.on_db_changed)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -330,13 +348,20 @@ class DemandsWidget(QWidget):
         
         layout.addLayout(toolbar)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Клиент", "Риэлтор", "Тип", "Цена (мин-макс)", "Срок (мин-макс)"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
+        self.model = PagedTableModel([
+            ("ID", lambda demand: demand['id']),
+            ("Клиент", lambda demand: demand.get('client_name')),
+            ("Риэлтор", lambda demand: demand.get('realtor_name')),
+            ("Тип", lambda demand: type_map.get(demand.get('property_type'), demand.get('property_type'))),
+            ("Цена (мин-макс)", lambda demand: f"{demand.get('min_price', 0)} - {demand.get('max_price', 0)}"),
+            ("Срок (мин-макс)",
+             lambda demand: f"{demand.get('min_rental_period', 0)} - {demand.get('max_rental_period', 0)}"),
+        ], parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setStretchLastSection(True)
         
         layout.addWidget(self.table)
@@ -344,35 +369,33 @@ class DemandsWidget(QWidget):
         self.setLayout(layout)
     
     def refresh_data(self):
-        demands = self.db.get_demands()
-        
-        self.table.setRowCount(len(demands))
-        for i, demand in enumerate(demands):
-            self.table.setItem(i, 0, QTableWidgetItem(str(demand['id'])))
-            self.table.setItem(i, 1, QTableWidgetItem(demand.get('client_name', '')))
-            self.table.setItem(i, 2, QTableWidgetItem(demand.get('realtor_name', '')))
-            
-            prop_type = demand.get('property_type', '')
-            type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
-            self.table.setItem(i, 3, QTableWidgetItem(type_map.get(prop_type, prop_type)))
-            
-            price_text = f"{demand.get('min_price', 0)} - {demand.get('max_price', 0)}"
-            self.table.setItem(i, 4, QTableWidgetItem(price_text))
-            
-            period_text = f"{demand.get('min_rental_period', 0)} - {demand.get('max_rental_period', 0)}"
-            self.table.setItem(i, 5, QTableWidgetItem(period_text))
-            
-            for col in range(6):
-                item = self.table.item(i, col)
-                if item:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        self.model.reset(lambda after_id, limit: self.db.get_demands(limit, after_id))
+    
+    def on_db_changed(self, entity, ids):
+        if entity not in ('demands', 'clients', 'realtors'):
+            return
+        if not self.isVisible():
+            self.dirty = True
+            return
+        if entity != 'demands':
+            # В строках показаны ФИО клиента и риэлтора
+            column = 'client_id' if entity == 'clients' else 'realtor_id'
+            changed = set(ids)
+            ids = self.model.loaded_ids(lambda demand: demand[column] in changed)
+        if ids:
+            self.model.sync_rows(ids, self.db.get_demands(ids=ids))
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.dirty = False
+            self.refresh_data()
     
     def get_selected_demand_id(self):
-        row = self.table.currentRow()
-        if row < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             return None
-        item = self.table.item(row, 0)
-        return int(item.text()) if item else None
+        return self.model.row_id(index.row())
     
     def add_demand(self):
         dialog = DemandDialog(self, db=self.db)
@@ -380,8 +403,6 @@ class DemandsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.add_demand(**data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Потребность успешно добавлена!")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось добавить потребность:\n{str(e)}")
@@ -402,8 +423,6 @@ class DemandsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.update_demand(demand_id, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Потребность успешно обновлена!")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось обновить потребность:\n{str(e)}")
@@ -423,8 +442,6 @@ class DemandsWidget(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 if self.db.delete_demand(demand_id):
-                    self.refresh_data()
-                    self.data_changed.emit()
                     QMessageBox.information(self, "Успех", "Потребность успешно удалена!")
                 else:
                     QMessageBox.warning(
@@ -0,0 +1,117 @@
+from typing import Dict, Optional
+
+from PyQt5.QtCore import QModelIndex, Qt, QTimer
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from PyQt5.QtWidgets import QComboBox, QCompleter, QWidget
+
+from database import LOOKUP_LIMIT, Database
+
+PROPERTY_TYPE_NAMES = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
+
+
+def person_label(row: Dict) -> str:
+    name = f"{row.get('surname') or ''} {row.get('name') or ''} {row.get('patronymic') or ''}".strip()
+    return name or f"ID: {row['id']}"
+
+
+def property_label(row: Dict) -> str:
+    prop_type = PROPERTY_TYPE_NAMES.get(row['type'], row['type'])
+    address = f"{row.get('city') or ''}, {row.get('street') or ''}, {row.get('house_number') or ''}".strip(', ')
+    text = f"{prop_type} #{row['id']}"
+    if address:
+        text += f" - {address}"
+    return text
+
+
+def demand_label(row: Dict) -> str:
+    prop_type = row.get('property_type', '')
+    return f"Потребность #{row['id']}: {PROPERTY_TYPE_NAMES.get(prop_type, prop_type)}, {row.get('client_name') or ''}"
+
+
+def offer_label(row: Dict) -> str:
+    prop_type = row.get('property_type', '')
+    return f"Предложение #{row['id']}: {PROPERTY_TYPE_NAMES.get(prop_type, prop_type)}, {row.get('price', 0)} руб/мес"
+
+
+LOOKUP_LABELS = {
+    'clients': person_label,
+    'realtors': person_label,
+    'properties': property_label,
+    'demands': demand_label,
+    'offers': offer_label,
+}
+
+
+class LookupComboBox(QComboBox):
+    """Выпадающий список с поиском по справочнику Database.lookup.
+
+    Сразу загружаются только первые limit записей; при вводе текста совпадения
+    подгружаются запросом к базе (с задержкой delay_ms) и показываются в подсказке.
+    Выбранная запись добавляется в список, currentData() возвращает ее id.
+    """
+
+    def __init__(self, db: Database, kind: str, open_only: bool = False, limit: int = LOOKUP_LIMIT,
+                 delay_ms: int = 200, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.db = db
+        self.kind = kind
+        self.open_only = open_only
+        self.limit = limit
+        self.label = LOOKUP_LABELS[kind]
+
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        self.lineEdit().setPlaceholderText("Начните вводить для поиска")
+
+        self._matches = QStandardItemModel(self)
+        completer = QCompleter(self._matches, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.activated[QModelIndex].connect(self._on_match_activated)
+        self.setCompleter(completer)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._update_matches)
+        self.lineEdit().textEdited.connect(self._timer.start)
+        self.lineEdit().editingFinished.connect(self._restore_text)
+
+        if db is not None:
+            for row in db.lookup(kind, limit=limit, open_only=open_only):
+                self.addItem(self.label(row), row['id'])
+
+    def set_current_id(self, item_id: Optional[int]):
+        # Текущее значение может не входить в первые limit записей (или быть занято сделкой)
+        if item_id is None:
+            return
+        index = self.findData(item_id)
+        if index < 0:
+            rows = self.db.lookup(self.kind, ids=[item_id])
+            if not rows:
+                return
+            self.addItem(self.label(rows[0]), item_id)
+            index = self.count() - 1
+        self.setCurrentIndex(index)
+
+    def _update_matches(self):
+        text = self.lineEdit().text().strip()
+        self._matches.clear()
+        for row in self.db.lookup(self.kind, text, self.limit, open_only=self.open_only):
+            item = QStandardItem(self.label(row))
+            item.setData(row['id'], Qt.UserRole)
+            self._matches.appendRow(item)
+        self.completer().complete()
+
+    def _on_match_activated(self, index: QModelIndex):
+        self._timer.stop()
+        item_id = index.data(Qt.UserRole)
+        position = self.findData(item_id)
+        if position < 0:
+            self.addItem(index.data(Qt.DisplayRole), item_id)
+            position = self.count() - 1
+        self.setCurrentIndex(position)
+
+    def _restore_text(self):
+        # Введенный, но не выбранный текст не меняет выбранную запись
+        if self.currentIndex() >= 0 and self.lineEdit().text() != self.itemText(self.currentIndex()):
+            self.lineEdit().setText(self.itemText(self.currentIndex()))
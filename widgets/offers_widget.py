@@ -1,8 +1,12 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QLineEdit, QLabel, QMessageBox, QDialog, 
-                             QFormLayout, QDialogButtonBox, QComboBox, QSpinBox)
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
+                             QLineEdit, QLabel, QMessageBox, QDialog, 
+                             QFormLayout, QDialogButtonBox, QSpinBox)
 from database import Database
+from widgets.lookup_combo import LookupComboBox, demand_label
+from widgets.table_model import PagedTableModel
+
+# Сколько подходящих потребностей перечислять после добавления предложения
+MATCHING_DEMANDS_SHOWN = 5
 
 class OfferDialog(QDialog):
     
@@ -19,31 +23,13 @@ class OfferDialog(QDialog):
         layout = QVBoxLayout()
         form = QFormLayout()
         
-        self.client_combo = QComboBox()
-        clients = self.db.get_clients() if self.db else []
-        for client in clients:
-            name = f"{client.get('surname') or ''} {client.get('name') or ''} {client.get('patronymic') or ''}".strip()
-            if not name:
-                name = f"ID: {client['id']}"
-            self.client_combo.addItem(name, client['id'])
+        self.client_combo = LookupComboBox(self.db, 'clients')
         form.addRow("Клиент *:", self.client_combo)
         
-        self.realtor_combo = QComboBox()
-        realtors = self.db.get_realtors() if self.db else []
-        for realtor in realtors:
-            name = f"{realtor.get('surname')} {realtor.get('name')} {realtor.get('patronymic')}"
-            self.realtor_combo.addItem(name, realtor['id'])
+        self.realtor_combo = LookupComboBox(self.db, 'realtors')
         form.addRow("Риэлтор *:", self.realtor_combo)
         
-        self.property_combo = QComboBox()
-        properties = self.db.get_properties() if self.db else []
-        for prop in properties:
-            prop_type = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}.get(prop['type'], prop['type'])
-            address = f"{prop.get('city') or ''}, {prop.get('street') or ''}, {prop.get('house_number') or ''}".strip(', ')
-            text = f"{prop_type}
-            if address:
-                text += f" - {address}"
-            self.property_combo.addItem(text, prop['id'])
+        self.property_combo = LookupComboBox(self.db, 'properties')
         form.addRow("Объект недвижимости *:", self.property_combo)
         
         self.price_spin = QSpinBox()
@@ -57,23 +43,9 @@ class OfferDialog(QDialog):
         form.addRow("Срок сдачи *:", self.rental_period_spin)
         
         if self.offer_data:
-            client_id = self.offer_data.get('client_id')
-            for i in range(self.client_combo.count()):
-                if self.client_combo.itemData(i) == client_id:
-                    self.client_combo.setCurrentIndex(i)
-                    break
-            
-            realtor_id = self.offer_data.get('realtor_id')
-            for i in range(self.realtor_combo.count()):
-                if self.realtor_combo.itemData(i) == realtor_id:
-                    self.realtor_combo.setCurrentIndex(i)
-                    break
-            
-            property_id = self.offer_data.get('property_id')
-            for i in range(self.property_combo.count()):
-                if self.property_combo.itemData(i) == property_id:
-                    self.property_combo.setCurrentIndex(i)
-                    break
+            self.client_combo.set_current_id(self.offer_data.get('client_id'))
+            self.realtor_combo.set_current_id(self.offer_data.get('realtor_id'))
+            self.property_combo.set_current_id(self.offer_data.get('property_id'))
             
             self.price_spin.setValue(self.offer_data.get('price', 0))
             self.rental_period_spin.setValue(self.offer_data.get('rental_period', 0))
@@ -98,13 +70,14 @@ class OfferDialog(QDialog):
 
 class OffersWidget(QWidget):
     
-    data_changed = pyqtSignal()
-    
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        # Вкладка скрыта во время изменения — перечитать при показе
+        self.dirty = False
         self.init_ui()
         self.refresh_data()
+        self.db.subscribe(self.on_db_changed)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -131,13 +104,19 @@ class OffersWidget(QWidget):
         
         layout.addLayout(toolbar)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Клиент", "Риэлтор", "Объект", "Цена (руб/мес)", "Срок (мес)"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
+        self.model = PagedTableModel([
+            ("ID", lambda offer: offer['id']),
+            ("Клиент", lambda offer: offer.get('client_name')),
+            ("Риэлтор", lambda offer: offer.get('realtor_name')),
+            ("Объект", lambda offer: type_map.get(offer.get('property_type'), offer.get('property_type'))),
+            ("Цена (руб/мес)", lambda offer: offer.get('price', 0)),
+            ("Срок (мес)", lambda offer: offer.get('rental_period', 0)),
+        ], parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setStretchLastSection(True)
         
         layout.addWidget(self.table)
@@ -145,42 +124,46 @@ class OffersWidget(QWidget):
         self.setLayout(layout)
     
     def refresh_data(self):
-        offers = self.db.get_offers()
-        
-        self.table.setRowCount(len(offers))
-        for i, offer in enumerate(offers):
-            self.table.setItem(i, 0, QTableWidgetItem(str(offer['id'])))
-            self.table.setItem(i, 1, QTableWidgetItem(offer.get('client_name', '')))
-            self.table.setItem(i, 2, QTableWidgetItem(offer.get('realtor_name', '')))
-            
-            prop_type = offer.get('property_type', '')
-            type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
-            self.table.setItem(i, 3, QTableWidgetItem(type_map.get(prop_type, prop_type)))
-            
-            self.table.setItem(i, 4, QTableWidgetItem(str(offer.get('price', 0))))
-            self.table.setItem(i, 5, QTableWidgetItem(str(offer.get('rental_period', 0))))
-            
-            for col in range(6):
-                item = self.table.item(i, col)
-                if item:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        self.model.reset(lambda after_id, limit: self.db.get_offers(limit, after_id))
+    
+    def on_db_changed(self, entity, ids):
+        if entity not in ('offers', 'clients', 'realtors'):
+            return
+        if not self.isVisible():
+            self.dirty = True
+            return
+        if entity != 'offers':
+            # В строках показаны ФИО клиента и риэлтора
+            column = 'client_id' if entity == 'clients' else 'realtor_id'
+            changed = set(ids)
+            ids = self.model.loaded_ids(lambda offer: offer[column] in changed)
+        if ids:
+            self.model.sync_rows(ids, self.db.get_offers(ids=ids))
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.dirty = False
+            self.refresh_data()
     
     def get_selected_offer_id(self):
-        row = self.table.currentRow()
-        if row < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             return None
-        item = self.table.item(row, 0)
-        return int(item.text()) if item else None
+        return self.model.row_id(index.row())
     
     def add_offer(self):
         dialog = OfferDialog(self, db=self.db)
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
             try:
-                self.db.add_offer(**data)
-                self.refresh_data()
-                self.data_changed.emit()
-                QMessageBox.information(self, "Успех", "Предложение успешно добавлено!")
+                offer_id = self.db.add_offer(**data)
+                demands = self.db.get_matching_demands(offer_id)
+                message = "Предложение успешно добавлено!"
+                if demands:
+                    message += f"\n\nПодходящих открытых потребностей: {len(demands)}\n"
+                    message += "\n".join(demand_label(demand) for demand in demands[:MATCHING_DEMANDS_SHOWN])
+                QMessageBox.information(self, "Успех", message)
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
             except Exception as e:
@@ -202,8 +185,6 @@ class OffersWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.update_offer(offer_id, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Предложение успешно обновлено!")
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
@@ -225,8 +206,6 @@ class OffersWidget(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 if self.db.delete_offer(offer_id):
-                    self.refresh_data()
-                    self.data_changed.emit()
                     QMessageBox.information(self, "Успех", "Предложение успешно удалено!")
                 else:
                     QMessageBox.warning(
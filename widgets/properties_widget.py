@@ -1,9 +1,10 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QLineEdit, QLabel, QMessageBox, QDialog, 
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
+                             QLineEdit, QLabel, QMessageBox, QDialog, 
                              QFormLayout, QDialogButtonBox, QComboBox, QDoubleSpinBox, QSpinBox,
                              QGroupBox)
-from PyQt5.QtCore import pyqtSignal, Qt
 from database import Database
+from widgets.search_controller import SearchController
+from widgets.table_model import PAGE_SIZE, PagedTableModel
 
 class PropertyDialog(QDialog):
     
@@ -193,13 +194,20 @@ class PropertyDialog(QDialog):
 
 class PropertiesWidget(QWidget):
     
-    data_changed = pyqtSignal()
-    
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        self.filters = (None, None, None)
+        # Вкладка скрыта во время изменения — перечитать при показе
+        self.dirty = False
+        self.search_controller = SearchController(
+            db, lambda search_db, filters: (filters, search_db.get_properties(*filters, limit=PAGE_SIZE)), parent=self
+        )
+        self.search_controller.results_ready.connect(self.show_properties)
+        self.search_controller.search_failed.connect(self.show_search_error)
         self.init_ui()
         self.refresh_data()
+        self.db.subscribe(self.on_db_changed)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -212,11 +220,11 @@ class PropertiesWidget(QWidget):
         
         self.city_filter = QLineEdit()
         self.city_filter.setPlaceholderText("Фильтр по городу...")
-        self.city_filter.textChanged.connect(self.refresh_data)
+        self.city_filter.textChanged.connect(self.search_changed)
         
         self.street_filter = QLineEdit()
         self.street_filter.setPlaceholderText("Фильтр по улице...")
-        self.street_filter.textChanged.connect(self.refresh_data)
+        self.street_filter.textChanged.connect(self.search_changed)
         
         add_btn = QPushButton("➕ Добавить объект")
         add_btn.clicked.connect(self.add_property)
@@ -244,20 +252,28 @@ class PropertiesWidget(QWidget):
         
         layout.addLayout(toolbar)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Тип", "Город", "Улица", "Дом", "Квартира", "Характеристики", "Координаты"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
+        self.model = PagedTableModel([
+            ("ID", lambda prop: prop['id']),
+            ("Тип", lambda prop: type_map.get(prop['type'], prop['type'])),
+            ("Город", lambda prop: prop.get('city')),
+            ("Улица", lambda prop: prop.get('street')),
+            ("Дом", lambda prop: prop.get('house_number')),
+            ("Квартира", lambda prop: prop.get('apartment_number')),
+            ("Характеристики", self.characteristics_text),
+            ("Координаты", self.coordinates_text),
+        ], parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setStretchLastSection(True)
         
         layout.addWidget(self.table)
         
         self.setLayout(layout)
     
-    def refresh_data(self):
+    def get_filters(self):
         type_filter = None
         type_index = self.type_filter.currentIndex()
         if type_index > 0:
@@ -266,57 +282,70 @@ class PropertiesWidget(QWidget):
         
         city = self.city_filter.text().strip() or None
         street = self.street_filter.text().strip() or None
-        
-        properties = self.db.get_properties(type_filter, city, street)
-        
-        self.table.setRowCount(len(properties))
-        for i, prop in enumerate(properties):
-            self.table.setItem(i, 0, QTableWidgetItem(str(prop['id'])))
-            
-            type_map = {'apartment': 'Квартира', 'house': 'Дом', 'land': 'Земля'}
-            self.table.setItem(i, 1, QTableWidgetItem(type_map.get(prop['type'], prop['type'])))
-            
-            self.table.setItem(i, 2, QTableWidgetItem(prop.get('city') or ''))
-            self.table.setItem(i, 3, QTableWidgetItem(prop.get('street') or ''))
-            self.table.setItem(i, 4, QTableWidgetItem(prop.get('house_number') or ''))
-            self.table.setItem(i, 5, QTableWidgetItem(prop.get('apartment_number') or ''))
-            
-            char_text = []
-            if prop['type'] == 'apartment':
-                if prop.get('floor'):
-                    char_text.append(f"Этаж: {prop['floor']}")
-                if prop.get('rooms'):
-                    char_text.append(f"Комнат: {prop['rooms']}")
-                if prop.get('area'):
-                    char_text.append(f"Пл: {prop['area']} м²")
-            elif prop['type'] == 'house':
-                if prop.get('floors'):
-                    char_text.append(f"Этажей: {prop['floors']}")
-                if prop.get('rooms'):
-                    char_text.append(f"Комнат: {prop['rooms']}")
-                if prop.get('area'):
-                    char_text.append(f"Пл: {prop['area']} м²")
-            elif prop['type'] == 'land':
-                if prop.get('area'):
-                    char_text.append(f"Пл: {prop['area']} м²")
-            self.table.setItem(i, 6, QTableWidgetItem(", ".join(char_text)))
-            
-            coord_text = ""
-            if prop.get('latitude') and prop.get('longitude'):
-                coord_text = f"{prop['latitude']:.4f}, {prop['longitude']:.4f}"
-            self.table.setItem(i, 7, QTableWidgetItem(coord_text))
-            
-            for col in range(8):
-                item = self.table.item(i, col)
-                if item:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        return type_filter, city, street
+    
+    def search_changed(self):
+        self.search_controller.request(self.get_filters())
+    
+    def refresh_data(self):
+        self.search_controller.request(self.get_filters(), immediate=True)
+    
+    def show_search_error(self, error):
+        QMessageBox.warning(self, "Ошибка поиска", error)
+    
+    @staticmethod
+    def characteristics_text(prop):
+        char_text = []
+        if prop['type'] == 'apartment':
+            if prop.get('floor'):
+                char_text.append(f"Этаж: {prop['floor']}")
+            if prop.get('rooms'):
+                char_text.append(f"Комнат: {prop['rooms']}")
+            if prop.get('area'):
+                char_text.append(f"Пл: {prop['area']} м²")
+        elif prop['type'] == 'house':
+            if prop.get('floors'):
+                char_text.append(f"Этажей: {prop['floors']}")
+            if prop.get('rooms'):
+                char_text.append(f"Комнат: {prop['rooms']}")
+            if prop.get('area'):
+                char_text.append(f"Пл: {prop['area']} м²")
+        elif prop['type'] == 'land':
+            if prop.get('area'):
+                char_text.append(f"Пл: {prop['area']} м²")
+        return ", ".join(char_text)
+    
+    @staticmethod
+    def coordinates_text(prop):
+        if prop.get('latitude') and prop.get('longitude'):
+            return f"{prop['latitude']:.4f}, {prop['longitude']:.4f}"
+        return ""
+    
+    def show_properties(self, result):
+        filters, properties = result
+        self.filters = filters
+        self.model.reset(lambda after_id, limit: self.db.get_properties(*filters, limit=limit, after_id=after_id),
+                         properties)
+    
+    def on_db_changed(self, entity, ids):
+        if entity != 'properties':
+            return
+        if self.isVisible():
+            self.model.sync_rows(ids, self.db.get_properties(*self.filters, ids=ids))
+        else:
+            self.dirty = True
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.dirty = False
+            self.refresh_data()
     
     def get_selected_property_id(self):
-        row = self.table.currentRow()
-        if row < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             return None
-        item = self.table.item(row, 0)
-        return int(item.text()) if item else None
+        return self.model.row_id(index.row())
     
     def add_property(self):
         dialog = PropertyDialog(self)
@@ -325,8 +354,6 @@ class PropertiesWidget(QWidget):
             try:
                 prop_type = data.pop('property_type')
                 self.db.add_property(prop_type, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Объект успешно добавлен!")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось добавить объект:\n{str(e)}")
@@ -349,8 +376,6 @@ class PropertiesWidget(QWidget):
                 property_id = property_data['id']
                 prop_type = data.pop('property_type')
                 self.db.update_property(property_id, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Объект успешно обновлен!")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось обновить объект:\n{str(e)}")
@@ -370,8 +395,6 @@ class PropertiesWidget(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 if self.db.delete_property(property_id):
-                    self.refresh_data()
-                    self.data_changed.emit()
                     QMessageBox.information(self, "Успех", "Объект успешно удален!")
                 else:
                     QMessageBox.warning(
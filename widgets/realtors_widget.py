@@ -1,8 +1,9 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QLineEdit, QLabel, QMessageBox, QDialog, 
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
+                             QLineEdit, QLabel, QMessageBox, QDialog, 
                              QFormLayout, QDialogButtonBox, QDoubleSpinBox, QTextEdit)
-from PyQt5.QtCore import pyqtSignal, Qt
-from database import Database
+from database import FIRST_PERSON_KEY, Database, person_sort_key
+from widgets.search_controller import SearchController
+from widgets.table_model import PAGE_SIZE, PagedTableModel
 
 class RealtorDialog(QDialog):
     
@@ -72,13 +73,21 @@ class RealtorDialog(QDialog):
 
 class RealtorsWidget(QWidget):
     
-    data_changed = pyqtSignal()
-    
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        self.search = ''
+        # Вкладка скрыта во время изменения — перечитать при показе
+        self.dirty = False
+        self.search_controller = SearchController(
+            db, lambda search_db, search: (search, search_db.get_realtors(search or None, PAGE_SIZE, FIRST_PERSON_KEY)),
+            parent=self
+        )
+        self.search_controller.results_ready.connect(self.show_realtors)
+        self.search_controller.search_failed.connect(self.show_search_error)
         self.init_ui()
         self.refresh_data()
+        self.db.subscribe(self.on_db_changed)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -87,7 +96,7 @@ class RealtorsWidget(QWidget):
         
         self.search_edit = QLineEdit()
         self.search_edit.setPlaceholderText("Поиск по ФИО...")
-        self.search_edit.textChanged.connect(self.refresh_data)
+        self.search_edit.textChanged.connect(self.search_changed)
         
         add_btn = QPushButton("➕ Добавить риэлтора")
         add_btn.clicked.connect(self.add_realtor)
@@ -111,13 +120,17 @@ class RealtorsWidget(QWidget):
         
         layout.addLayout(toolbar)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Фамилия", "Имя", "Отчество", "Доля от комиссии (%)"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.model = PagedTableModel([
+            ("ID", lambda realtor: realtor['id']),
+            ("Фамилия", lambda realtor: realtor.get('surname')),
+            ("Имя", lambda realtor: realtor.get('name')),
+            ("Отчество", lambda realtor: realtor.get('patronymic')),
+            ("Доля от комиссии (%)", self.commission_text),
+        ], row_key=person_sort_key, parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setStretchLastSection(True)
         
         layout.addWidget(self.table)
@@ -128,35 +141,53 @@ class RealtorsWidget(QWidget):
         self.info_text.setPlaceholderText("Выберите риэлтора для просмотра связанных данных...")
         layout.addWidget(self.info_text)
         
-        self.table.itemSelectionChanged.connect(self.show_realtor_info)
+        self.table.selectionModel().selectionChanged.connect(self.show_realtor_info)
         
         self.setLayout(layout)
     
+    def search_changed(self):
+        self.search_controller.request(self.search_edit.text().strip())
+    
     def refresh_data(self):
-        search = self.search_edit.text().strip()
-        realtors = self.db.get_realtors(search if search else None)
-        
-        self.table.setRowCount(len(realtors))
-        for i, realtor in enumerate(realtors):
-            self.table.setItem(i, 0, QTableWidgetItem(str(realtor['id'])))
-            self.table.setItem(i, 1, QTableWidgetItem(realtor.get('surname') or ''))
-            self.table.setItem(i, 2, QTableWidgetItem(realtor.get('name') or ''))
-            self.table.setItem(i, 3, QTableWidgetItem(realtor.get('patronymic') or ''))
-            commission = realtor.get('commission_share')
-            commission_text = f"{commission:.1f}" if commission else "45.0 (по умолчанию)"
-            self.table.setItem(i, 4, QTableWidgetItem(commission_text))
-            
-            for col in range(5):
-                item = self.table.item(i, col)
-                if item:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        self.search_controller.request(self.search_edit.text().strip(), immediate=True)
+    
+    def show_search_error(self, error):
+        QMessageBox.warning(self, "Ошибка поиска", error)
+    
+    @staticmethod
+    def commission_text(realtor):
+        commission = realtor.get('commission_share')
+        return f"{commission:.1f}" if commission else "45.0 (по умолчанию)"
+    
+    def show_realtors(self, result):
+        search, realtors = result
+        self.search = search
+        self.model.reset(lambda after, limit: self.db.get_realtors(search or None, limit, after or FIRST_PERSON_KEY),
+                         realtors)
+        self.info_text.clear()
+    
+    def on_db_changed(self, entity, ids):
+        if entity == 'realtors':
+            if self.isVisible():
+                self.model.sync_rows(ids, self.db.get_realtors(self.search or None, ids=ids))
+            else:
+                self.dirty = True
+        elif entity in ('offers', 'demands') and self.isVisible():
+            self.show_realtor_info()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.dirty = False
+            self.refresh_data()
+        else:
+            self.show_realtor_info()
     
     def get_selected_realtor_id(self):
-        row = self.table.currentRow()
-        if row < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             return None
-        item = self.table.item(row, 0)
-        return int(item.text()) if item else None
+        return self.model.row_id(index.row())
     
     def add_realtor(self):
         dialog = RealtorDialog(self)
@@ -164,8 +195,6 @@ class RealtorsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.add_realtor(**data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Риэлтор успешно добавлен!")
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
@@ -188,8 +217,6 @@ class RealtorsWidget(QWidget):
             data = dialog.get_data()
             try:
                 self.db.update_realtor(realtor_id, **data)
-                self.refresh_data()
-                self.data_changed.emit()
                 QMessageBox.information(self, "Успех", "Риэлтор успешно обновлен!")
             except ValueError as e:
                 QMessageBox.warning(self, "Ошибка валидации", str(e))
@@ -211,8 +238,6 @@ class RealtorsWidget(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 if self.db.delete_realtor(realtor_id):
-                    self.refresh_data()
-                    self.data_changed.emit()
                     QMessageBox.information(self, "Успех", "Риэлтор успешно удален!")
                 else:
                     QMessageBox.warning(
@@ -236,7 +261,7 @@ class RealtorsWidget(QWidget):
         offers = self.db.get_offers_by_realtor(realtor_id)
         info.append(f"Предложения: {len(offers)}")
         for offer in offers[:5]:
-            info.append(f"  - Предложение
+            info.append(f"  - Предложение #{offer['id']}: {offer.get('price', 0)} руб/мес, {offer.get('rental_period', 0)} мес.")
         if len(offers) > 5:
             info.append(f"  ... и еще {len(offers) - 5}")
         
@@ -245,7 +270,7 @@ class RealtorsWidget(QWidget):
         demands = self.db.get_demands_by_realtor(realtor_id)
         info.append(f"Потребности: {len(demands)}")
         for demand in demands[:5]:
-            info.append(f"  - Потребность
+            info.append(f"  - Потребность #{demand['id']}: {demand.get('min_price', 0)} - {demand.get('max_price', 0)} руб/мес")
         if len(demands) > 5:
             info.append(f"  ... и еще {len(demands) - 5}")
         
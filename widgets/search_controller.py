@@ -0,0 +1,148 @@
+import queue
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from database import Database
+
+
+class SearchController(QObject):
+    """Отложенный поиск в фоновом потоке.
+
+    Ввод копится delay_ms миллисекунд, затем запрос выполняется на отдельном
+    подключении к той же базе. Новый запрос прерывает устаревший через
+    sqlite3 interrupt, а в виджет попадает только результат последнего запроса.
+    """
+
+    results_ready = pyqtSignal(object)
+    search_failed = pyqtSignal(str)
+
+    _finished = pyqtSignal(int, object, object)
+
+    def __init__(self, db: Database, query: Callable[[Database, Any], Any],
+                 delay_ms: int = 250, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.db = db
+        self.query = query
+        self._pending_params = None
+        self._generation = 0
+        self._running_generation = None
+        self._lock = threading.Lock()
+        self._requests: "queue.Queue" = queue.Queue()
+        self._worker_db: Optional[Database] = None
+        self._thread: Optional[threading.Thread] = None
+        # База в памяти недоступна из другого подключения — тогда поиск идет синхронно
+        self._threaded = db.db_path not in ('', ':memory:') and not db.db_path.startswith('file::memory:')
+        self._journal_mode = db.get_connection_settings()['journal_mode'].upper() if self._threaded else None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._dispatch)
+
+        self._finished.connect(self._on_finished)
+
+    def request(self, params: Any = None, immediate: bool = False):
+        self._pending_params = params
+        if immediate:
+            self._timer.stop()
+            self._dispatch()
+        else:
+            self._timer.start()
+
+    def _dispatch(self):
+        params = self._pending_params
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        if not self._threaded:
+            self._run_sync(generation, params)
+            return
+        self._ensure_worker()
+        with self._lock:
+            self._requests.put((generation, params))
+            if self._running_generation is not None and self._running_generation < generation \
+                    and self._worker_db is not None:
+                self._worker_db.conn.interrupt()
+
+    def _run_sync(self, generation: int, params: Any):
+        try:
+            self._on_finished(generation, self.query(self.db, params), None)
+        except sqlite3.Error as e:
+            self._on_finished(generation, None, str(e))
+
+    def _ensure_worker(self):
+        # У каждого потока своя очередь: поток, не успевший завершиться после stop(),
+        # дочитает свой сигнал остановки и не заберет запросы нового потока
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                self._requests = queue.Queue()
+            self._thread = threading.Thread(target=self._work, args=(self._requests,),
+                                            name='search-worker', daemon=True)
+            self._thread.start()
+
+    def _work(self, requests: "queue.Queue"):
+        # Подключение потока хранится локально; self._worker_db публикуется и снимается под
+        # self._lock, поэтому interrupt() из _dispatch и stop() не попадает в закрытое подключение
+        try:
+            worker_db = Database(self.db.db_path, journal_mode=self._journal_mode)
+        except sqlite3.Error as e:
+            self._finished.emit(self._generation, None, str(e))
+            return
+        with self._lock:
+            # Устаревший поток, открывшийся позже нового, свое подключение не публикует
+            if requests is self._requests:
+                self._worker_db = worker_db
+        try:
+            while True:
+                request = requests.get()
+                if request is None:
+                    return
+                # Из накопившихся запросов выполняется только последний
+                while not requests.empty():
+                    request = requests.get_nowait()
+                    if request is None:
+                        return
+                generation, params = request
+                with self._lock:
+                    if generation != self._generation:
+                        continue
+                    self._running_generation = generation
+                try:
+                    result, error = self.query(worker_db, params), None
+                except sqlite3.OperationalError as e:
+                    result, error = None, None if 'interrupted' in str(e) else str(e)
+                except sqlite3.Error as e:
+                    result, error = None, str(e)
+                finally:
+                    with self._lock:
+                        if self._running_generation == generation:
+                            self._running_generation = None
+                self._finished.emit(generation, result, error)
+        finally:
+            with self._lock:
+                if self._worker_db is worker_db:
+                    self._worker_db = None
+                worker_db.close()
+
+    def _on_finished(self, generation: int, result: Any, error: Optional[str]):
+        if generation != self._generation:
+            return
+        if error:
+            self.search_failed.emit(error)
+        elif result is not None:
+            self.results_ready.emit(result)
+
+    def stop(self):
+        self._timer.stop()
+        with self._lock:
+            self._generation += 1
+            if self._worker_db is not None:
+                self._worker_db.conn.interrupt()
+        if self._thread is not None and self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join(timeout=1.0)
+        # Если поток не успел завершиться, следующий запрос запустит новый со своей очередью
+        self._thread = None
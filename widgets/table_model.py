@@ -0,0 +1,142 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QObject, Qt, QVariant
+
+PAGE_SIZE = 500
+
+# Колонка таблицы: заголовок и функция, превращающая строку выборки в текст ячейки
+Column = Tuple[str, Callable[[Dict], Any]]
+# Загрузка страницы: ключ последней загруженной строки (None для первой страницы) и размер страницы
+FetchPage = Callable[[Optional[Any], int], List[Dict]]
+# Ключ порядка строк; по умолчанию id
+RowKey = Callable[[Dict], Any]
+
+
+class PagedTableModel(QAbstractTableModel):
+    """Ленивая модель таблицы с постраничной загрузкой.
+
+    Строки подгружаются страницами по ключу последней строки (WHERE id > ? LIMIT n),
+    когда представление прокручивается к концу загруженной части (canFetchMore/fetchMore).
+    Текст ячеек формируется только при отрисовке видимых строк.
+    Строки упорядочены по уникальному ключу row_key (по умолчанию id; descending — по убыванию id),
+    поэтому отдельные строки можно обновлять, удалять и вставлять на место без перезагрузки (sync_rows).
+    """
+
+    def __init__(self, columns: Sequence[Column], page_size: int = PAGE_SIZE, descending: bool = False,
+                 row_key: Optional[RowKey] = None, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.page_size = page_size
+        self.descending = descending
+        self.row_key = row_key or (lambda row: row['id'])
+        self._rows: List[Dict] = []
+        # Ключи сортировки загруженных строк (row_key или -id), всегда по возрастанию
+        self._keys: List[Any] = []
+        # Ключ сортировки каждой загруженной строки по id: строка могла сменить место после изменения
+        self._key_by_id: Dict[int, Any] = {}
+        self._fetch_page: Optional[FetchPage] = None
+        self._exhausted = True
+
+    def reset(self, fetch_page: FetchPage, first_page: Optional[List[Dict]] = None):
+        # first_page — уже загруженная первая страница (например, результат фонового поиска)
+        self.beginResetModel()
+        self._fetch_page = fetch_page
+        self._rows = list(first_page) if first_page is not None else []
+        self._keys = [self._sort_key(row) for row in self._rows]
+        self._key_by_id = {row['id']: key for row, key in zip(self._rows, self._keys)}
+        self._exhausted = first_page is not None and len(first_page) < self.page_size
+        self.endResetModel()
+        # Представление запрашивает следующие страницы само, но только при прокрутке
+        if first_page is None:
+            self.fetchMore()
+
+    def _sort_key(self, row: Dict) -> Any:
+        key = self.row_key(row)
+        return -key if self.descending else key
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return QVariant()
+        value = self.columns[index.column()][1](self._rows[index.row()])
+        return '' if value is None else str(value)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self.columns[section][0]
+        return section + 1
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and self._fetch_page is not None and not self._exhausted
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        after = self.row_key(self._rows[-1]) if self._rows else None
+        page = self._fetch_page(after, self.page_size)
+        self._exhausted = len(page) < self.page_size
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+            for row in page:
+                key = self._sort_key(row)
+                self._rows.append(row)
+                self._keys.append(key)
+                self._key_by_id[row['id']] = key
+            self.endInsertRows()
+
+    def sync_rows(self, ids: Iterable[int], rows: List[Dict]):
+        """Применяет изменения строк с указанными id.
+
+        rows — актуальное состояние этих строк с учетом текущего фильтра: строки, которых
+        в rows нет, удаляются из модели; новые вставляются, если попадают в уже загруженный
+        диапазон (иначе придут со следующей страницей).
+        """
+        current = {row['id']: row for row in rows}
+        for row_id in sorted(set(ids)):
+            old_key = self._key_by_id.get(row_id)
+            row = current.get(row_id)
+            sort_key = self._sort_key(row) if row is not None else None
+            if old_key is not None:
+                position = bisect_left(self._keys, old_key)
+                if row is not None and sort_key == old_key:
+                    self._rows[position] = row
+                    self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.columns) - 1))
+                    continue
+                # Строка удалена, вышла из фильтра или сменила место в порядке
+                self.beginRemoveRows(QModelIndex(), position, position)
+                del self._rows[position]
+                del self._keys[position]
+                del self._key_by_id[row_id]
+                self.endRemoveRows()
+            if row is None:
+                continue
+            position = bisect_left(self._keys, sort_key)
+            if position < len(self._keys) or self._exhausted:
+                self.beginInsertRows(QModelIndex(), position, position)
+                self._rows.insert(position, row)
+                self._keys.insert(position, sort_key)
+                self._key_by_id[row_id] = sort_key
+                self.endInsertRows()
+
+    def loaded_ids(self, predicate: Callable[[Dict], bool]) -> List[int]:
+        return [row['id'] for row in self._rows if predicate(row)]
+
+    def row_data(self, row: int) -> Optional[Dict]:
+        return self._rows[row] if 0 <= row < len(self._rows) else None
+
+    def row_id(self, row: int) -> Optional[int]:
+        data = self.row_data(row)
+        return data['id'] if data else None